@@ -0,0 +1,158 @@
+"""Incrementally maintained admissions analytics.
+
+``admission_rollups`` holds one counter per (creation day, grade, status,
+source). Creating an enquiry increments its counter and a status change
+moves one count from the old status to the new one, so dashboards read a
+few hundred rollup rows instead of scanning ``admission_enquiries``.
+``rebuild_admission_rollups`` recomputes every counter from scratch with a
+single aggregation, which also repairs any drift.
+
+Rollups are derived data, so a failed counter update is logged and never
+fails the write that caused it; ``python migrations.py admission_rollups``
+repairs the counters afterwards.
+"""
+import logging
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+from pymongo import UpdateOne
+
+from retention import archive_name
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_DIMENSIONS = ("grade", "status", "source")
+DEFAULT_SOURCE = "website"
+
+
+def _day(value) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return datetime.combine(value.date(), time.min)
+
+
+def _rollup_key(doc: dict, status: str = None) -> tuple:
+    return (
+        _day(doc["created_at"]),
+        doc.get("grade") or "",
+        status or doc.get("status") or "pending",
+        doc.get("source") or DEFAULT_SOURCE,
+    )
+
+
+async def _apply(collection, deltas: Counter):
+    updates = [
+        ({"day": day, "grade": grade, "status": status, "source": source}, {"$inc": {"count": delta}})
+        for (day, grade, status, source), delta in deltas.items() if delta
+    ]
+    try:
+        # A single submission touches one counter; skip the bulk API for it
+        if len(updates) == 1:
+            await collection.update_one(*updates[0], upsert=True)
+        elif updates:
+            await collection.bulk_write(
+                [UpdateOne(query, update, upsert=True) for query, update in updates], ordered=False
+            )
+    except Exception as e:
+        logger.error(f"Failed to update admission rollups, rebuild them with migrations.py: {str(e)}")
+
+
+async def record_enquiries_created(collection, docs: list):
+    """Count newly inserted enquiries"""
+    await _apply(collection, Counter(_rollup_key(doc) for doc in docs))
+
+
+async def record_status_changes(collection, previous: dict, updates: list):
+    """Move counts for enquiries whose status changed
+
+    ``previous`` maps enquiry id to the document as it was before the update.
+    """
+    deltas = Counter()
+    for update in updates:
+        doc = previous.get(update.id)
+        if doc is None or doc.get("status") == update.status:
+            continue
+        deltas[_rollup_key(doc)] -= 1
+        deltas[_rollup_key(doc, update.status)] += 1
+        # Later updates of the same id in this batch start from the new status
+        previous[update.id] = {**doc, "status": update.status}
+    await _apply(collection, deltas)
+
+
+def _day_range(date_from: date = None, date_to: date = None) -> dict:
+    query = {}
+    if date_from or date_to:
+        query["day"] = {}
+        if date_from:
+            query["day"]["$gte"] = datetime.combine(date_from, time.min)
+        if date_to:
+            query["day"]["$lt"] = datetime.combine(date_to + timedelta(days=1), time.min)
+    return query
+
+
+async def daily_counts(collection, group_by: list, date_from: date = None, date_to: date = None) -> list:
+    """Enquiries created per day, split by the requested dimensions"""
+    group_id = {"day": "$day", **{dimension: f"${dimension}" for dimension in group_by}}
+    pipeline = [
+        {"$match": _day_range(date_from, date_to)},
+        {"$group": {"_id": group_id, "count": {"$sum": "$count"}}},
+        {"$match": {"count": {"$ne": 0}}},
+        {"$sort": {"_id.day": 1}},
+    ]
+    rows = []
+    async for row in collection.aggregate(pipeline):
+        rows.append({**row["_id"], "day": row["_id"]["day"].date().isoformat(), "count": row["count"]})
+    return rows
+
+
+async def admissions_summary(collection, date_from: date = None, date_to: date = None) -> dict:
+    """Totals per dimension and the pending-to-processed conversion rate"""
+    pipeline = [
+        {"$match": _day_range(date_from, date_to)},
+        {"$facet": {
+            dimension: [{"$group": {"_id": f"${dimension}", "count": {"$sum": "$count"}}}]
+            for dimension in ROLLUP_DIMENSIONS
+        }},
+    ]
+    facets = (await collection.aggregate(pipeline).to_list(1))[0]
+    summary = {
+        f"by_{dimension}": {row["_id"]: row["count"] for row in facets[dimension] if row["count"]}
+        for dimension in ROLLUP_DIMENSIONS
+    }
+    total = sum(summary["by_status"].values())
+    processed = summary["by_status"].get("processed", 0)
+    summary["total"] = total
+    summary["conversion_rate"] = round(processed / total, 4) if total else None
+    return summary
+
+
+async def rebuild_admission_rollups(db) -> int:
+    """Recompute every rollup counter from admission_enquiries and its archive in one aggregation"""
+    await db.admission_enquiries.aggregate([
+        # Archived enquiries still count towards the days they were submitted on
+        {"$unionWith": archive_name("admission_enquiries")},
+        # Older rows may still store created_at as an ISO string
+        {"$addFields": {"created_at": {"$toDate": "$created_at"}}},
+        {"$group": {
+            "_id": {
+                "day": {"$dateFromParts": {
+                    "year": {"$year": "$created_at"},
+                    "month": {"$month": "$created_at"},
+                    "day": {"$dayOfMonth": "$created_at"},
+                }},
+                "grade": {"$ifNull": ["$grade", ""]},
+                "status": {"$ifNull": ["$status", "pending"]},
+                "source": {"$ifNull": ["$source", DEFAULT_SOURCE]},
+            },
+            "count": {"$sum": 1},
+        }},
+        {"$project": {
+            "_id": 0, "day": "$_id.day", "grade": "$_id.grade", "status": "$_id.status",
+            "source": "$_id.source", "count": 1,
+        }},
+        # $out swaps the collection in atomically and keeps its indexes
+        {"$out": "admission_rollups"},
+    ]).to_list(None)
+    rows = await db.admission_rollups.count_documents({})
+    logger.info(f"Rebuilt admission rollups: {rows} rows")
+    return rows
@@ -0,0 +1,253 @@
+"""Multi-file gallery uploads streamed straight from the request body.
+
+``POST /api/photos/upload/batch`` takes many file parts in one multipart
+request. Rather than letting the form parser spool every part to disk
+before the handler runs, ``PhotoBatchReceiver`` feeds the raw body to
+python-multipart and writes each file into a ``ScratchFile`` as it
+arrives:
+
+* the first ``SNIFF_BYTES`` are matched against the JPEG, PNG and WebP
+  signatures, so the client's Content-Type is never trusted and a file
+  that is not an image is rejected before anything is written;
+* a file passing ``max_bytes`` is discarded at that point and the rest of
+  its part is skipped.
+
+Every file that finishes streaming is handed to ``store_staged`` (blob
+dedup, rendering in the image pool, storage) straight away, at most
+``PHOTO_BATCH_CONCURRENCY`` at a time, while later files are still being
+received. Rejected files are reported per file and never fail the batch.
+"""
+import asyncio
+import logging
+import os
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from images import SNIFF_BYTES, InvalidImageError, sniff_image_type
+from profiling import phase
+from storage import ScratchFile, UploadTooLargeError, release_blob, store_staged
+
+logger = logging.getLogger(__name__)
+
+PHOTO_BATCH_MAX_FILES = int(os.environ.get('PHOTO_BATCH_MAX_FILES', '100'))
+PHOTO_BATCH_CONCURRENCY = int(os.environ.get('PHOTO_BATCH_CONCURRENCY', '4'))
+# Text fields are a category, title and description
+MAX_FIELD_BYTES = 64 * 1024
+
+
+class BatchUploadError(ValueError):
+    """Raised when a batch request as a whole cannot be accepted"""
+
+
+class BatchTooLargeError(BatchUploadError):
+    """Raised when a batch request body exceeds its overall size limit"""
+
+
+class BatchFile:
+    """One file part of a batch and what became of it"""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.head = bytearray()
+        self.ext = None
+        self.scratch = None
+        self.task = None
+        self.blob = None
+        self.error = None
+
+
+class _Field:
+    def __init__(self, name: str):
+        self.name = name
+        self.value = bytearray()
+
+
+class _PartEvents:
+    """python-multipart callbacks queueing part events for the async receive loop"""
+
+    def __init__(self):
+        self.events = []
+        self._headers = {}
+        self._field = b""
+        self._value = b""
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field = b""
+        self._value = b""
+
+    def on_headers_finished(self):
+        self.events.append(("part", self._headers))
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        self.events.append(("data", data[start:end]))
+
+    def on_part_end(self):
+        self.events.append(("end", None))
+
+    def callbacks(self) -> dict:
+        return {
+            name: getattr(self, name) for name in (
+                "on_part_begin", "on_header_field", "on_header_value", "on_header_end",
+                "on_headers_finished", "on_part_data", "on_part_end",
+            )
+        }
+
+    def drain(self) -> list:
+        events, self.events = self.events, []
+        return events
+
+
+class PhotoBatchReceiver:
+    """Streams the files of a multipart batch into blob storage"""
+
+    def __init__(self, blobs, storage, allowed_types: dict, max_bytes: int, render,
+                 max_files: int = PHOTO_BATCH_MAX_FILES, concurrency: int = PHOTO_BATCH_CONCURRENCY):
+        self.blobs = blobs
+        self.storage = storage
+        self.allowed_types = allowed_types
+        self.max_bytes = max_bytes
+        self.render = render
+        self.max_files = max_files
+        self.fields = {}
+        self.files = []
+        self._part = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def receive(self, request):
+        """Read the whole request, returning (text fields, files in upload order)
+
+        Returns once every accepted file is stored or has failed.
+        """
+        _, params = parse_options_header(request.headers.get("content-type", ""))
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise BatchUploadError("Expected a multipart/form-data request")
+        # Room for part headers and text fields on top of the files themselves
+        max_body = (self.max_files + 1) * self.max_bytes
+
+        events = _PartEvents()
+        parser = MultipartParser(boundary, events.callbacks())
+        received = 0
+        try:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > max_body:
+                    raise BatchTooLargeError(f"Batch exceeds {max_body // (1024 * 1024)}MB")
+                parser.write(chunk)
+                for event, value in events.drain():
+                    await getattr(self, f"_on_{event}")(value)
+            parser.finalize()
+        except Exception as e:
+            await self.abort()
+            if isinstance(e, BatchUploadError):
+                raise
+            raise BatchUploadError("Invalid multipart data") from e
+        except BaseException:
+            await self.abort()
+            raise
+        await self._settle()
+        return self.fields, self.files
+
+    async def _on_part(self, headers: dict):
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        if filename is None:
+            self._part = _Field(name)
+            return
+        item = BatchFile(filename.decode("utf-8", "replace"))
+        self.files.append(item)
+        if len(self.files) > self.max_files:
+            item.error = f"A batch holds at most {self.max_files} files"
+        self._part = item
+
+    async def _on_data(self, data: bytes):
+        part = self._part
+        if isinstance(part, _Field):
+            part.value += data
+            if len(part.value) > MAX_FIELD_BYTES:
+                raise BatchUploadError(f"Field '{part.name}' is too long")
+            return
+        if part.error:
+            # The rest of a rejected file is read and dropped
+            return
+        if part.scratch is None:
+            part.head += data
+            if len(part.head) < SNIFF_BYTES or not await self._start_file(part):
+                return
+            data = bytes(part.head)
+        try:
+            with phase("file_io"):
+                await part.scratch.write(data)
+        except UploadTooLargeError:
+            part.error = f"File exceeds {self.max_bytes // (1024 * 1024)}MB limit"
+            await part.scratch.discard()
+            part.scratch = None
+
+    async def _start_file(self, part: BatchFile) -> bool:
+        content_type = sniff_image_type(bytes(part.head))
+        if content_type not in self.allowed_types:
+            part.error = "Not a JPG, PNG or WebP image"
+            return False
+        part.ext = self.allowed_types[content_type]
+        part.scratch = await ScratchFile.create(self.storage.scratch_dir, self.max_bytes)
+        return True
+
+    async def _on_end(self, _):
+        part, self._part = self._part, None
+        if isinstance(part, _Field):
+            self.fields[part.name] = part.value.decode("utf-8", "replace")
+            return
+        if part.error:
+            return
+        if part.scratch is None:
+            # Shorter than SNIFF_BYTES
+            if not await self._start_file(part):
+                return
+            await part.scratch.write(bytes(part.head))
+        scratch, part.scratch = part.scratch, None
+        digest = await scratch.close()
+        part.task = asyncio.create_task(self._store(part, scratch, digest))
+
+    async def _store(self, part: BatchFile, scratch: ScratchFile, digest: str):
+        try:
+            async with self._semaphore:
+                part.blob = await store_staged(
+                    self.blobs, self.storage, scratch.path, digest, scratch.size, part.ext, self.render
+                )
+        except InvalidImageError:
+            part.error = "Not a valid image"
+        except Exception as e:
+            logger.error(f"Error storing batch upload {part.filename}: {str(e)}")
+            part.error = "Failed to store file"
+        finally:
+            # store_staged removes it too, unless the batch was abandoned while this file waited
+            scratch.path.unlink(missing_ok=True)
+
+    async def _settle(self):
+        await asyncio.gather(*(item.task for item in self.files if item.task), return_exceptions=True)
+
+    async def abort(self):
+        """Give up on the batch: finish files in flight and drop every blob reference taken"""
+        if isinstance(self._part, BatchFile) and self._part.scratch is not None:
+            await self._part.scratch.discard()
+            self._part.scratch = None
+        await self._settle()
+        await self.release_stored()
+
+    async def release_stored(self):
+        """Drop the blob references of stored files whose photos will not be saved"""
+        for item in self.files:
+            if item.blob is not None:
+                await release_blob(self.blobs, item.blob["_id"], self.storage)
+                item.blob = None
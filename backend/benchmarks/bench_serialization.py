@@ -0,0 +1,86 @@
+"""Per-document cost of the list serialization paths.
+
+Compares the old GET /admission-enquiry path (ISO strings parsed with
+``datetime.fromisoformat``, re-validated through ``List[AdmissionEnquiry]``
+and encoded with ``jsonable_encoder`` + ``json``) with the fast path
+(native datetimes encoded directly with orjson).
+
+Run from the backend directory::
+
+    python -m benchmarks.bench_serialization [--docs 1000] [--rounds 20]
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from models import AdmissionEnquiry
+from serialization import dumps
+
+ENQUIRY_LIST = TypeAdapter(List[AdmissionEnquiry])
+
+
+def make_docs(count: int, iso_strings: bool) -> list:
+    start = datetime(2026, 1, 1)
+    docs = []
+    for i in range(count):
+        created_at = start + timedelta(minutes=i)
+        docs.append({
+            "id": str(uuid.uuid4()),
+            "student_name": f"Student {i}",
+            "parent_name": f"Parent {i}",
+            "email": f"parent{i}@example.com",
+            "phone": f"98765{i:05d}",
+            "grade": f"Grade {i % 12 + 1}",
+            "previous_school": "Springfield Public School",
+            "message": "Interested in admission for the next academic session.",
+            "status": "pending",
+            "created_at": created_at.isoformat() if iso_strings else created_at,
+        })
+    return docs
+
+
+def old_path(docs: list) -> bytes:
+    for doc in docs:
+        if isinstance(doc['created_at'], str):
+            doc['created_at'] = datetime.fromisoformat(doc['created_at'])
+    validated = ENQUIRY_LIST.validate_python(docs)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def fast_path(docs: list) -> bytes:
+    return dumps(docs)
+
+
+def measure(fn, make, count: int, rounds: int) -> float:
+    """Best per-document time in microseconds over several rounds"""
+    best = float("inf")
+    for _ in range(rounds):
+        docs = make()
+        started = time.perf_counter()
+        fn(docs)
+        best = min(best, time.perf_counter() - started)
+    return best / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    before = measure(old_path, lambda: make_docs(args.docs, iso_strings=True), args.docs, args.rounds)
+    after = measure(fast_path, lambda: make_docs(args.docs, iso_strings=False), args.docs, args.rounds)
+    print(f"{'path':<40}{'us/doc':>10}")
+    print(f"{'fromisoformat + response_model + json':<40}{before:>10.2f}")
+    print(f"{'native datetimes + orjson':<40}{after:>10.2f}")
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Cold-start time: from spawning the server to its first 200 response.
+
+Each run starts ``serve.py`` on a free port, polls ``GET /api/`` until it
+answers 200, then stops the server and times the shutdown as well. The
+server needs a reachable MongoDB, since startup builds indexes and warms
+the connection pool.
+
+Run from the backend directory::
+
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.cold_start \\
+        [--runs 5] [--workers 1] [--timeout 60]
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url: str, process: subprocess.Popen, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.02)
+    return False
+
+
+def measure(workers: int, timeout: float) -> dict:
+    port = free_port()
+    env = {**os.environ, "PORT": str(port), "HOST": "127.0.0.1", "WEB_CONCURRENCY": str(workers)}
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "serve.py"], cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        if not wait_until_ready(f"http://127.0.0.1:{port}/api/", process, timeout):
+            process.kill()
+            stderr = process.communicate()[1].decode(errors="replace")
+            sys.exit(f"Server did not become ready:\n{stderr[-2000:]}")
+        ready = time.perf_counter() - started
+        stopping = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=timeout)
+        return {"ready_ms": round(ready * 1000, 1), "shutdown_ms": round((time.perf_counter() - stopping) * 1000, 1)}
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for readiness")
+    args = parser.parse_args()
+
+    if not os.environ.get("MONGO_URL"):
+        sys.exit("Set MONGO_URL to a reachable MongoDB")
+    runs = [measure(args.workers, args.timeout) for _ in range(args.runs)]
+    ready = [run["ready_ms"] for run in runs]
+    print(json.dumps({
+        "workers": args.workers,
+        "runs": runs,
+        "ready_ms_median": round(statistics.median(ready), 1),
+        "ready_ms_max": max(ready),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
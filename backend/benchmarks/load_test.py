@@ -0,0 +1,316 @@
+"""Concurrent load test of the API, run in process.
+
+Boots ``server:app`` (including its lifespan) behind an in-process ASGI
+transport, against a local ``mongod`` (``--mongo-url``) or, by default, the
+in-memory ``mongomock_motor`` stand-in. Resend is replaced by a fake with
+configurable latency so the email outbox does real work without sending
+anything. Workers then drive a weighted mix of every route and the run
+ends with per-route p50/p95/p99 latency and throughput, written as JSON
+and optionally checked against regression thresholds.
+
+Run from the backend directory (extra dependencies are listed in
+``benchmarks/requirements.txt``)::
+
+    python -m benchmarks.load_test [--duration 30] [--concurrency 16] \\
+        [--mongo-url mongodb://localhost:27017] [--email-latency-ms 250] \\
+        [--output load-report.json] [--check benchmarks/load_thresholds.json]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent
+DEFAULT_THRESHOLDS = BENCH_DIR / "load_thresholds.json"
+# Just under the 5MB upload limit
+UPLOAD_BYTES = 5 * 1024 * 1024 - 64 * 1024
+CATEGORIES = ["events", "sports", "campus", "academics"]
+
+# (route name, weight) of the traffic mix; names match the thresholds file
+TRAFFIC_MIX = [
+    ("POST /api/admission-enquiry", 10),
+    ("POST /api/contact", 6),
+    ("GET /api/photos", 25),
+    ("GET /api/photos?category", 15),
+    ("GET /api/events", 15),
+    ("GET /api/admission-enquiry", 5),
+    ("GET /api/contact", 3),
+    ("POST /api/photos/upload", 2),
+    ("POST /api/events", 4),
+    ("PUT /api/events/{event_id}", 3),
+    ("DELETE /api/events/{event_id}", 2),
+]
+
+
+def configure_environment(args):
+    """Environment read by server.py and its modules at import time"""
+    os.environ.setdefault("MONGO_URL", args.mongo_url or "mongodb://localhost:27017")
+    os.environ["DB_NAME"] = args.db_name
+    # mongomock cannot explain queries or create collections with storage options
+    os.environ.setdefault("INDEX_CHECK", "strict" if args.mongo_url else "off")
+    if not args.mongo_url:
+        os.environ.setdefault("ARCHIVE_BLOCK_COMPRESSOR", "")
+    # Every simulated client shares one IP and a handful of emails; keep the limiters out of the way
+    for name in ("RATE_LIMIT_IP_BURST", "RATE_LIMIT_EMAIL_BURST"):
+        os.environ[name] = "1000000000"
+    os.environ.setdefault("RESEND_API_KEY", "re_load_test")
+
+
+def install_fake_resend(latency: float):
+    """Replace the Resend client with one that only sleeps"""
+    import resend
+
+    sent = []
+
+    def send(params):
+        time.sleep(latency)
+        sent.append(params["subject"])
+        return {"id": str(uuid.uuid4())}
+
+    resend.Emails.send = send
+    return sent
+
+
+def make_upload_image() -> bytes:
+    """A valid PNG of random noise padded to UPLOAD_BYTES"""
+    from PIL import Image
+
+    side = 1024
+    image = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+    data = buffer.getvalue()[:UPLOAD_BYTES]
+    return data + b"\0" * (UPLOAD_BYTES - len(data))
+
+
+class LoadTest:
+    def __init__(self, client, image: bytes):
+        self.client = client
+        self.image = image
+        self.event_ids = []
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def _enquiry(self):
+        n = uuid.uuid4().hex[:8]
+        return {
+            "student_name": f"Student {n}", "parent_name": f"Parent {n}", "email": f"parent{n}@example.com",
+            "phone": "9876543210", "grade": f"Grade {random.randint(1, 12)}", "message": f"Enquiry {n}",
+        }
+
+    def _message(self):
+        n = uuid.uuid4().hex[:8]
+        return {"name": f"Visitor {n}", "email": f"visitor{n}@example.com", "phone": "9876543210",
+                "subject": f"Question {n}", "message": "Please call back."}
+
+    def _event(self):
+        n = uuid.uuid4().hex[:8]
+        return {"title": f"Event {n}", "description": "Load test event", "date": f"2026-{random.randint(1, 12):02d}-15",
+                "time": "10:00", "category": random.choice(CATEGORIES)}
+
+    async def request(self, route: str):
+        client = self.client
+        if route == "POST /api/admission-enquiry":
+            return await client.post("/api/admission-enquiry", json=self._enquiry())
+        if route == "POST /api/contact":
+            return await client.post("/api/contact", json=self._message())
+        if route == "GET /api/photos":
+            return await client.get("/api/photos", params={"limit": 50})
+        if route == "GET /api/photos?category":
+            return await client.get("/api/photos", params={"category": random.choice(CATEGORIES), "limit": 50})
+        if route == "GET /api/events":
+            return await client.get("/api/events", params={"limit": 50})
+        if route == "GET /api/admission-enquiry":
+            return await client.get("/api/admission-enquiry", params={"limit": 50})
+        if route == "GET /api/contact":
+            return await client.get("/api/contact", params={"limit": 50})
+        if route == "POST /api/photos/upload":
+            # Unique trailing bytes give every upload its own blob, so each one is stored and rendered
+            data = self.image[:-16] + os.urandom(16)
+            return await client.post(
+                "/api/photos/upload",
+                files={"file": ("load.png", data, "image/png")},
+                data={"title": "Load test", "description": "", "category": random.choice(CATEGORIES)},
+            )
+        if route == "POST /api/events":
+            response = await client.post("/api/events", json=self._event())
+            if response.status_code == 200:
+                self.event_ids.append(response.json()["id"])
+            return response
+        if route == "PUT /api/events/{event_id}":
+            if not self.event_ids:
+                return None
+            event_id = random.choice(self.event_ids)
+            return await client.put(f"/api/events/{event_id}", json={**self._event(), "id": event_id})
+        if route == "DELETE /api/events/{event_id}":
+            if not self.event_ids:
+                return None
+            event_id = self.event_ids.pop(random.randrange(len(self.event_ids)))
+            return await client.delete(f"/api/events/{event_id}")
+        raise ValueError(route)
+
+    async def worker(self, deadline: float, rng: random.Random):
+        routes = [route for route, _ in TRAFFIC_MIX]
+        weights = [weight for _, weight in TRAFFIC_MIX]
+        while time.perf_counter() < deadline:
+            route = rng.choices(routes, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await self.request(route)
+            except Exception:
+                response = False
+            elapsed = time.perf_counter() - started
+            if response is None:
+                continue
+            self.latencies[route].append(elapsed)
+            if response is False or response.status_code >= 400:
+                self.errors[route] += 1
+
+
+async def seed(db, photos: int, events: int):
+    """Listing-sized data so list queries have pages to return"""
+    from models import Event, Photo
+
+    await db.school_photos.insert_many([
+        Photo(title=f"Seed {i}", description="", category=CATEGORIES[i % len(CATEGORIES)],
+              file_path="/dev/null", file_url=f"/uploads/photos/seed{i}.jpg").model_dump()
+        for i in range(photos)
+    ])
+    await db.events.insert_many([
+        Event(title=f"Seed {i}", description="", date=f"2026-{i % 12 + 1:02d}-01", time="09:00",
+              category=CATEGORIES[i % len(CATEGORIES)]).model_dump()
+        for i in range(events)
+    ])
+
+
+def percentile(cuts: list, p: int) -> float:
+    return cuts[p - 1] * 1000
+
+
+def summarize(test: LoadTest, duration: float) -> dict:
+    routes = {}
+    for route, _ in TRAFFIC_MIX:
+        samples = test.latencies.get(route, [])
+        if len(samples) < 2:
+            continue
+        cuts = statistics.quantiles(samples, n=100, method="inclusive")
+        routes[route] = {
+            "requests": len(samples),
+            "errors": test.errors.get(route, 0),
+            "error_rate": round(test.errors.get(route, 0) / len(samples), 4),
+            "throughput_rps": round(len(samples) / duration, 2),
+            "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+            "p50_ms": round(percentile(cuts, 50), 2),
+            "p95_ms": round(percentile(cuts, 95), 2),
+            "p99_ms": round(percentile(cuts, 99), 2),
+        }
+    total = sum(route["requests"] for route in routes.values())
+    return {"routes": routes, "total_requests": total, "throughput_rps": round(total / duration, 2)}
+
+
+def check_thresholds(report: dict, thresholds: dict) -> list:
+    """Every threshold a route exceeded, as human-readable strings"""
+    failures = []
+    for route, limits in thresholds.items():
+        result = report["routes"].get(route)
+        if result is None:
+            failures.append(f"{route}: no samples")
+            continue
+        for metric, limit in limits.items():
+            if result[metric] > limit:
+                failures.append(f"{route}: {metric} {result[metric]} > {limit}")
+    return failures
+
+
+async def run(args) -> dict:
+    import httpx
+
+    import server
+    from storage import LocalStorage
+
+    if args.mongo_url:
+        from database import create_client
+
+        mongo = create_client(args.mongo_url, event_listeners=[server.MongoCommandMetrics()])
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("Install mongomock-motor (see benchmarks/requirements.txt) or pass --mongo-url")
+        mongo = AsyncMongoMockClient()
+    server.db = mongo[args.db_name]
+    sent = install_fake_resend(args.email_latency_ms / 1000)
+
+    with tempfile.TemporaryDirectory() as upload_dir:
+        server.photo_storage = LocalStorage(Path(upload_dir))
+        image = make_upload_image()
+        transport = httpx.ASGITransport(app=server.app)
+        try:
+            async with server.app.router.lifespan_context(server.app):
+                await seed(server.db, args.seed_photos, args.seed_events)
+                async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+                    test = LoadTest(client, image)
+                    started = time.perf_counter()
+                    deadline = started + args.duration
+                    await asyncio.gather(*(
+                        test.worker(deadline, random.Random(args.seed + i)) for i in range(args.concurrency)
+                    ))
+                    elapsed = time.perf_counter() - started
+        finally:
+            if args.mongo_url:
+                await mongo.drop_database(args.db_name)
+                mongo.close()
+
+    report = summarize(test, elapsed)
+    report["config"] = {
+        "backend": "mongod" if args.mongo_url else "mongomock",
+        "duration_s": round(elapsed, 2),
+        "concurrency": args.concurrency,
+        "email_latency_ms": args.email_latency_ms,
+        "emails_sent": len(sent),
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=30, help="seconds of traffic")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mongo-url", help="local mongod to test against instead of mongomock")
+    parser.add_argument("--db-name", default=f"loadtest_{uuid.uuid4().hex[:8]}")
+    parser.add_argument("--email-latency-ms", type=float, default=250)
+    parser.add_argument("--seed-photos", type=int, default=500)
+    parser.add_argument("--seed-events", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the traffic mix")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--check", nargs="?", const=str(DEFAULT_THRESHOLDS),
+                        help="fail if any route exceeds the thresholds in this file")
+    args = parser.parse_args()
+
+    configure_environment(args)
+    report = asyncio.run(run(args))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+    if args.check:
+        failures = check_thresholds(report, json.loads(Path(args.check).read_text()))
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
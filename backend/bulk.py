@@ -0,0 +1,146 @@
+"""Bulk import and bulk status updates.
+
+Imports accept a CSV (header row required) or NDJSON upload. Rows are
+parsed and validated in a worker thread one chunk at a time, and each chunk
+is written with a single unordered ``insert_many``, so a 5,000 row file costs
+ten round trips instead of 5,000 and a bad row never blocks the good ones.
+Every rejected row is reported with its line number.
+"""
+import asyncio
+import csv
+import io
+import logging
+from datetime import datetime
+
+import orjson
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+BULK_CHUNK_SIZE = 500
+
+
+class UnsupportedFormatError(ValueError):
+    """Raised when an import file is neither CSV nor NDJSON"""
+
+
+def detect_format(filename: str, content_type: str) -> str:
+    name = (filename or "").lower()
+    content_type = (content_type or "").lower()
+    if name.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    raise UnsupportedFormatError("Upload a .csv file with a header row or an .ndjson file")
+
+
+def _iter_rows(binary_file, file_format: str):
+    """Yield (line number, row dict or error message) from an import file"""
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    if file_format == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Skip columns without a header and surrounding whitespace from spreadsheets
+            yield reader.line_num, {k.strip(): (v or "").strip() for k, v in row.items() if k}
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                yield line_number, f"Invalid JSON: {str(e)}"
+                continue
+            yield line_number, row if isinstance(row, dict) else "Each line must be a JSON object"
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'row'}: {item['msg']}" for item in error.errors()
+    )
+
+
+def _next_chunk(rows, build, size: int):
+    """Validate up to ``size`` rows, returning ([(line, doc)], [error]) and whether input remains"""
+    docs, errors = [], []
+    for line_number, row in rows:
+        if isinstance(row, str):
+            errors.append({"row": line_number, "error": row})
+        else:
+            try:
+                docs.append((line_number, build(row)))
+            except ValidationError as e:
+                errors.append({"row": line_number, "error": _format_validation_error(e)})
+        if len(docs) + len(errors) >= size:
+            return docs, errors, True
+    return docs, errors, False
+
+
+async def bulk_insert(collection, upload, build, chunk_size: int = BULK_CHUNK_SIZE, after_insert=None) -> dict:
+    """Validate and insert every row of an uploaded CSV/NDJSON file
+
+    ``build`` turns a raw row into the document to insert and raises
+    ``ValidationError`` for bad rows. ``after_insert``, if given, is awaited
+    with the documents of each chunk that were actually inserted.
+    """
+    file_format = detect_format(upload.filename, upload.content_type)
+    rows = _iter_rows(upload.file, file_format)
+
+    inserted, errors = 0, []
+    more = True
+    while more:
+        chunk, chunk_errors, more = await asyncio.to_thread(_next_chunk, rows, build, chunk_size)
+        errors.extend(chunk_errors)
+        if not chunk:
+            continue
+        failed_indexes = set()
+        try:
+            result = await collection.insert_many([doc for _, doc in chunk], ordered=False)
+            inserted += len(result.inserted_ids)
+        except BulkWriteError as e:
+            inserted += e.details.get("nInserted", 0)
+            for write_error in e.details.get("writeErrors", []):
+                failed_indexes.add(write_error["index"])
+                errors.append({"row": chunk[write_error["index"]][0], "error": write_error.get("errmsg", "Write failed")})
+        if after_insert is not None:
+            await after_insert([doc for index, (_, doc) in enumerate(chunk) if index not in failed_indexes])
+
+    errors.sort(key=lambda item: item["row"])
+    logger.info(f"Bulk import into {collection.name}: {inserted} inserted, {len(errors)} rejected")
+    return {"inserted": inserted, "failed": len(errors), "errors": errors}
+
+
+async def bulk_update_status(collection, updates: list, fields: tuple = ()) -> dict:
+    """Apply many {id, status} changes with one unordered bulk_write
+
+    Returns the per-item results plus the previous version (id, status and
+    any extra ``fields``) of every updated document, keyed by id.
+    """
+    ids = [update.id for update in updates]
+    projection = {"_id": 0, "id": 1, "status": 1, **{field: 1 for field in fields}}
+    previous = {
+        doc["id"]: doc
+        async for doc in collection.find({"id": {"$in": ids}}, projection)
+    }
+
+    now = datetime.utcnow()
+    operations, errors = [], []
+    for index, update in enumerate(updates):
+        if update.id not in previous:
+            errors.append({"index": index, "id": update.id, "error": "Not found"})
+            continue
+        operations.append(UpdateOne(
+            {"id": update.id},
+            {"$set": {"status": update.status, "status_updated_at": now}}
+        ))
+
+    modified = 0
+    if operations:
+        result = await collection.bulk_write(operations, ordered=False)
+        modified = result.modified_count
+
+    logger.info(f"Bulk status update on {collection.name}: {modified} modified, {len(errors)} rejected")
+    return {"matched": len(operations), "modified": modified, "failed": len(errors), "errors": errors,
+            "previous": previous}
@@ -0,0 +1,157 @@
+"""In-process response cache for the public gallery and event listings.
+
+Serialized response bodies are kept in an LRU with a TTL, keyed by
+namespace (``photos``, ``events``) and the request path plus query string.
+Every write to a namespace bumps a version counter stored in the
+``cache_versions`` collection; each worker re-reads the counter at most
+every ``RESPONSE_CACHE_VERSION_POLL_SECONDS``, so entries cached by other
+uvicorn workers stop being served shortly after a write, while the worker
+that handled the write drops them immediately.
+
+The same counters double as cheap collection versions for conditional GET:
+list responses carry an ETag derived from the namespace version and the
+request key, and a matching ``If-None-Match`` is answered with a bodyless
+304 before any query runs.
+"""
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from fastapi.responses import Response
+from pymongo import ReturnDocument
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '256'))
+CACHE_TTL_SECONDS = float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '300'))
+CACHE_VERSION_POLL_SECONDS = float(os.environ.get('RESPONSE_CACHE_VERSION_POLL_SECONDS', '2'))
+
+
+class ResponseCache:
+    """LRU + TTL cache of response bodies, invalidated by per-namespace versions"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS,
+                 version_poll: float = CACHE_VERSION_POLL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_poll = version_poll
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._checked_at = {}
+        self._collection = None
+
+    def bind(self, collection):
+        """Share version counters with other workers through a Mongo collection"""
+        self._collection = collection
+
+    async def version(self, namespace: str) -> int:
+        """Current version of a namespace, refreshed from Mongo at most every poll interval"""
+        now = time.monotonic()
+        if self._collection is not None and now - self._checked_at.get(namespace, float("-inf")) >= self.version_poll:
+            doc = await self._collection.find_one({"_id": namespace})
+            self._versions[namespace] = max(self._versions.get(namespace, 0), doc["version"] if doc else 0)
+            self._checked_at[namespace] = now
+        return self._versions.get(namespace, 0)
+
+    def lookup(self, namespace: str, key: str, version: int):
+        """Return the cached body for a key if it is fresh and current, else None"""
+        entry = self._entries.get((namespace, key))
+        if entry is None:
+            return None
+        expires_at, entry_version, body = entry
+        if entry_version != version or expires_at <= time.monotonic():
+            del self._entries[(namespace, key)]
+            return None
+        self._entries.move_to_end((namespace, key))
+        return body
+
+    def store(self, namespace: str, key: str, version: int, body: bytes):
+        """Cache a body under the version that was current before it was built"""
+        self._entries[(namespace, key)] = (time.monotonic() + self.ttl, version, body)
+        self._entries.move_to_end((namespace, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, namespace: str):
+        """Bump a namespace version and drop its local entries"""
+        if self._collection is not None:
+            doc = await self._collection.find_one_and_update(
+                {"_id": namespace},
+                {"$inc": {"version": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            version = doc["version"]
+        else:
+            version = self._versions.get(namespace, 0) + 1
+        self._versions[namespace] = max(self._versions.get(namespace, 0), version)
+        self._checked_at[namespace] = time.monotonic()
+
+        for key in [key for key in self._entries if key[0] == namespace]:
+            del self._entries[key]
+        logger.info(f"Invalidated {namespace} response cache (version {version})")
+
+    def clear(self):
+        self._entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+def cache_key(request) -> str:
+    """Route path plus sorted query parameters"""
+    params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{params}"
+
+
+def make_etag(namespace: str, version: int, key: str) -> str:
+    """Weak ETag for one representation of a namespace at a given version"""
+    digest = hashlib.blake2s(key.encode(), digest_size=8).hexdigest()
+    return f'W/"{namespace}-{version}-{digest}"'
+
+
+def etag_matches(request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return bare in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+async def current_etag(namespace: str, request) -> str:
+    """ETag of the current version of a namespace for this request"""
+    version = await response_cache.version(namespace)
+    return make_etag(namespace, version, cache_key(request))
+
+
+async def cached_json(namespace: str, request, build, cache: bool = True):
+    """Serve a JSON list body with ETag/304 support, from the cache when enabled"""
+    key = cache_key(request)
+    version = await response_cache.version(namespace)
+    etag = make_etag(namespace, version, key)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    body = response_cache.lookup(namespace, key, version) if cache else None
+    status = "HIT"
+    if body is None:
+        payload = await build()
+        body = dumps(payload)
+        if cache:
+            response_cache.store(namespace, key, version, body)
+        status = "MISS"
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache", "X-Cache": status}
+    )
@@ -0,0 +1,74 @@
+"""MongoDB client construction and warm-up.
+
+Pool size, timeouts and wire compression come from the environment so each
+deployment can size the pool to its worker count. ``warm_up`` opens the
+minimum number of pooled connections before the server accepts traffic,
+so the first requests after a deploy don't pay for TLS handshakes.
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import time
+
+import certifi
+from motor.motor_asyncio import AsyncIOMotorClient
+
+logger = logging.getLogger(__name__)
+
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '50'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '5'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '10000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '30000'))
+# Wait this long for a free pooled connection before failing the request
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000'))
+
+
+def available_compressors() -> list:
+    """Wire compressors in preference order, skipping those whose library is missing"""
+    configured = os.environ.get('MONGO_COMPRESSORS')
+    if configured is not None:
+        return [name.strip() for name in configured.split(',') if name.strip()]
+    compressors = []
+    if importlib.util.find_spec("zstandard"):
+        compressors.append("zstd")
+    if importlib.util.find_spec("snappy"):
+        compressors.append("snappy")
+    compressors.append("zlib")
+    return compressors
+
+
+def _uses_tls(mongo_url: str) -> bool:
+    """SRV (Atlas) URLs default to TLS; plain URLs only when they ask for it"""
+    lowered = mongo_url.lower()
+    return lowered.startswith("mongodb+srv://") or "tls=true" in lowered or "ssl=true" in lowered
+
+
+def create_client(mongo_url: str, event_listeners: list = None) -> AsyncIOMotorClient:
+    # A CA file implies TLS, which a local mongodb://localhost:27017 doesn't speak
+    tls_options = {"tlsCAFile": certifi.where()} if _uses_tls(mongo_url) else {}
+    return AsyncIOMotorClient(
+        mongo_url,
+        **tls_options,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        compressors=available_compressors(),
+        event_listeners=event_listeners or [],
+    )
+
+
+async def warm_up(client: AsyncIOMotorClient, connections: int = MONGO_MIN_POOL_SIZE):
+    """Ping the server, then open ``connections`` pooled connections concurrently"""
+    started = time.perf_counter()
+    await client.admin.command("ping")
+    if connections > 1:
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(connections)))
+    logger.info(f"MongoDB connection pool warmed with {connections} connections "
+                f"in {(time.perf_counter() - started) * 1000:.0f}ms")
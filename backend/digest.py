@@ -0,0 +1,162 @@
+"""Digest mode for admin notification emails.
+
+With ``NOTIFICATION_MODE=digest`` each notification is stored in the
+``notification_digest`` collection instead of becoming its own email. A
+background flusher groups pending items by kind and, once the oldest item
+is ``NOTIFICATION_DIGEST_WINDOW_SECONDS`` old or ``NOTIFICATION_DIGEST_MAX_ITEMS``
+have accumulated, renders them into one summary email and hands it to the
+outbox, which takes care of delivery and retries. Kinds listed in
+``NOTIFICATION_IMMEDIATE_KINDS`` always bypass the digest.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from outbox import enqueue_email
+
+logger = logging.getLogger(__name__)
+
+# immediate: one email per notification, digest: batched summaries
+NOTIFICATION_MODE = os.environ.get('NOTIFICATION_MODE', 'immediate').lower()
+DIGEST_WINDOW_SECONDS = float(os.environ.get('NOTIFICATION_DIGEST_WINDOW_SECONDS', '900'))
+DIGEST_MAX_ITEMS = int(os.environ.get('NOTIFICATION_DIGEST_MAX_ITEMS', '50'))
+# Comma-separated notification kinds that are never held back
+IMMEDIATE_KINDS = {
+    kind.strip() for kind in os.environ.get('NOTIFICATION_IMMEDIATE_KINDS', '').split(',') if kind.strip()
+}
+DIGEST_POLL_SECONDS = 30
+# A batch claimed by a worker that died is released after this long
+DIGEST_CLAIM_SECONDS = 300
+
+_collection = None
+_render = None
+_flusher = None
+_wakeup = None
+_added = 0
+
+
+def is_digested(kind: str) -> bool:
+    """Whether notifications of this kind are held for the next digest"""
+    return NOTIFICATION_MODE == "digest" and _collection is not None and kind not in IMMEDIATE_KINDS
+
+
+async def add_to_digest(kind: str, to_email: str, data: dict):
+    """Store a notification for the next digest of its kind"""
+    await _collection.insert_one({
+        "id": str(uuid.uuid4()),
+        "kind": kind,
+        "to": to_email,
+        "data": {k: v for k, v in data.items() if k != "_id"},
+        "batch_id": None,
+        "created_at": datetime.utcnow(),
+    })
+
+    global _added
+    _added += 1
+    if _added >= DIGEST_MAX_ITEMS:
+        _added = 0
+        _wakeup.set()
+
+
+async def _claim_batch(kind: str, to_email: str):
+    """Mark up to DIGEST_MAX_ITEMS pending items as one batch; returns them oldest first"""
+    query = {"kind": kind, "to": to_email, "batch_id": None}
+    ids = [
+        doc["id"] async for doc in
+        _collection.find(query, {"_id": 0, "id": 1}).sort("created_at", 1).limit(DIGEST_MAX_ITEMS)
+    ]
+    batch_id = str(uuid.uuid4())
+    await _collection.update_many(
+        {"id": {"$in": ids}, "batch_id": None},
+        {"$set": {"batch_id": batch_id, "claimed_at": datetime.utcnow()}}
+    )
+    # Another worker may have claimed some of the same items first
+    items = await _collection.find({"batch_id": batch_id}).sort("created_at", 1).to_list(None)
+    return batch_id, items
+
+
+async def _due_groups(now: datetime):
+    """(kind, recipient) pairs whose pending items fill a batch or have waited a full window"""
+    groups = []
+    pipeline = [
+        {"$match": {"batch_id": None}},
+        {"$group": {"_id": {"kind": "$kind", "to": "$to"}, "count": {"$sum": 1}, "oldest": {"$min": "$created_at"}}},
+    ]
+    async for group in _collection.aggregate(pipeline):
+        if group["count"] >= DIGEST_MAX_ITEMS or group["oldest"] <= now - timedelta(seconds=DIGEST_WINDOW_SECONDS):
+            groups.append((group["_id"]["kind"], group["_id"]["to"]))
+    return groups
+
+
+async def flush_digests(force: bool = False) -> int:
+    """Send a summary email for every due group; returns the number of digests queued"""
+    now = datetime.utcnow()
+    await _collection.update_many(
+        {"batch_id": {"$ne": None}, "claimed_at": {"$lte": now - timedelta(seconds=DIGEST_CLAIM_SECONDS)}},
+        {"$set": {"batch_id": None}, "$unset": {"claimed_at": ""}}
+    )
+
+    if force:
+        groups = [(g["kind"], g["to"]) async for g in _collection.aggregate([
+            {"$match": {"batch_id": None}},
+            {"$group": {"_id": {"kind": "$kind", "to": "$to"}}},
+            {"$replaceRoot": {"newRoot": "$_id"}},
+        ])]
+    else:
+        groups = await _due_groups(now)
+
+    sent = 0
+    for kind, to_email in groups:
+        batch_id, items = await _claim_batch(kind, to_email)
+        if not items:
+            continue
+        subject, body, html_body = _render(kind, [item["data"] for item in items])
+        await enqueue_email(to_email, subject, body, html_body, kind=f"{kind}_digest")
+        await _collection.delete_many({"batch_id": batch_id})
+        logger.info(f"Queued {kind} digest of {len(items)} notifications to {to_email}")
+        sent += 1
+    return sent
+
+
+async def _flush_loop():
+    """Flush due digests every poll interval or as soon as a batch fills up"""
+    while True:
+        try:
+            _wakeup.clear()
+            await flush_digests()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), DIGEST_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Notification digest flusher error: {str(e)}")
+            await asyncio.sleep(DIGEST_POLL_SECONDS)
+
+
+async def start_digest(collection, render):
+    """Start the digest flusher; ``render(kind, items)`` returns (subject, text, html)"""
+    global _collection, _render, _flusher, _wakeup
+    _collection = collection
+    _render = render
+    if NOTIFICATION_MODE != "digest":
+        return
+    _wakeup = asyncio.Event()
+    _flusher = asyncio.create_task(_flush_loop())
+    logger.info(
+        f"Notification digests every {DIGEST_WINDOW_SECONDS:.0f}s or {DIGEST_MAX_ITEMS} items"
+        f" (immediate: {', '.join(sorted(IMMEDIATE_KINDS)) or 'none'})"
+    )
+
+
+async def stop_digest():
+    """Stop the flusher; pending items stay stored for the next start"""
+    global _flusher
+    if _flusher is None:
+        return
+    _flusher.cancel()
+    await asyncio.gather(_flusher, return_exceptions=True)
+    _flusher = None
@@ -1,7 +1,16 @@
+import asyncio
 import logging
 import os
+import time
+from html import escape
+
 import resend
 
+from digest import add_to_digest, is_digested
+from metrics import record_email_send
+from outbox import DELIVERY_SKIPPED, enqueue_email
+from profiling import phase
+
 logger = logging.getLogger(__name__)
 
 # Resend Configuration
@@ -20,10 +29,12 @@ async def send_email(to_email: str, subject: str, body: str, html_body: str = No
     if not RESEND_API_KEY:
         logger.warning("RESEND_API_KEY not configured. Email not sent.")
         logger.info(f"Would have sent email to {to_email}: {subject}")
+        record_email_send("skipped", 0)
         return False
     
     logger.info(f"Attempting to send email to {to_email} via Resend API")
     
+    started = time.perf_counter()
     try:
         params = {
             "from": FROM_EMAIL,
@@ -35,18 +46,32 @@ async def send_email(to_email: str, subject: str, body: str, html_body: str = No
         if html_body:
             params["html"] = html_body
 
-        # Resend's library is synchronous, but we'll wrap it if needed. 
-        # For now, we'll just call it directly as it's a simple HTTPS post.
-        r = resend.Emails.send(params)
+        # Resend's library is synchronous, so run it off the event loop
+        with phase("email"):
+            r = await asyncio.to_thread(resend.Emails.send, params)
+        record_email_send("sent", time.perf_counter() - started)
         
         logger.info(f"Email sent successfully via Resend. ID: {r.get('id')}")
         return True
     except Exception as e:
+        record_email_send("failed", time.perf_counter() - started)
         logger.error(f"Failed to send email via Resend: {str(e)} (Type: {type(e).__name__})")
         return False
 
+async def deliver_email(to_email: str, subject: str, body: str, html_body: str = None):
+    """Outbox delivery: like send_email, but an unconfigured provider is a skip rather than a failure"""
+    if not RESEND_API_KEY:
+        logger.info(f"RESEND_API_KEY not configured. Skipped email to {to_email}: {subject}")
+        record_email_send("skipped", 0)
+        return DELIVERY_SKIPPED
+    return await send_email(to_email, subject, body, html_body)
+
 async def send_admission_enquiry_notification(enquiry_data: dict):
-    """Send notification email for admission enquiry"""
+    """Queue notification email for admission enquiry"""
+    if is_digested("admission_enquiry"):
+        await add_to_digest("admission_enquiry", ADMIN_EMAIL, enquiry_data)
+        return
+    
     subject = f"New Admission Enquiry - {enquiry_data['student_name']}"
     
     body = f"""
@@ -84,10 +109,14 @@ Submitted at: {enquiry_data['created_at']}
     </html>
     """
     
-    await send_email(ADMIN_EMAIL, subject, body, html_body)
+    await enqueue_email(ADMIN_EMAIL, subject, body, html_body, kind="admission_enquiry")
 
 async def send_contact_message_notification(message_data: dict):
-    """Send notification email for contact message"""
+    """Queue notification email for contact message"""
+    if is_digested("contact_message"):
+        await add_to_digest("contact_message", ADMIN_EMAIL, message_data)
+        return
+    
     subject = f"New Contact Message - {message_data['subject']}"
     
     body = f"""
@@ -121,4 +150,51 @@ Submitted at: {message_data['created_at']}
     </html>
     """
     
-    await send_email(ADMIN_EMAIL, subject, body, html_body)
+    await enqueue_email(ADMIN_EMAIL, subject, body, html_body, kind="contact_message")
+
+# Title and (label, field) columns of the digest summary for each notification kind
+DIGEST_LAYOUTS = {
+    "admission_enquiry": ("Admission Enquiries", [
+        ("Student", "student_name"), ("Parent", "parent_name"), ("Email", "email"), ("Phone", "phone"),
+        ("Grade", "grade"), ("Previous School", "previous_school"), ("Message", "message"), ("Submitted", "created_at"),
+    ]),
+    "contact_message": ("Contact Messages", [
+        ("Name", "name"), ("Email", "email"), ("Phone", "phone"), ("Subject", "subject"),
+        ("Message", "message"), ("Submitted", "created_at"),
+    ]),
+}
+
+def render_digest(kind: str, items: list):
+    """Render one summary email (subject, text, html) for a batch of notifications"""
+    title, columns = DIGEST_LAYOUTS[kind]
+    subject = f"{len(items)} New {title}"
+    
+    # The page and row markup are built once; only the cell values change per item
+    header = "".join(
+        f'<th style="text-align: left; padding: 8px; border-bottom: 2px solid #fbbf24;">{label}</th>'
+        for label, _ in columns
+    )
+    cell = '<td style="padding: 8px; border-bottom: 1px solid #e5e7eb; vertical-align: top;">{}</td>'
+    values = [[str(item.get(field) or 'N/A') for _, field in columns] for item in items]
+    rows = "".join("<tr>" + "".join(cell.format(escape(value)) for value in row) + "</tr>" for row in values)
+    
+    body = f"{subject}\n\n" + "\n\n".join(
+        "\n".join(f"{label}: {value}" for (label, _), value in zip(columns, row)) for row in values
+    )
+    
+    html_body = f"""
+    <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 960px; margin: 0 auto; padding: 20px; background-color: #f9f9f9;">
+                <h2 style="color: #3b82f6; border-bottom: 2px solid #fbbf24; padding-bottom: 10px;">{subject}</h2>
+                <div style="background-color: white; padding: 20px; border-radius: 8px; margin-top: 20px; overflow-x: auto;">
+                    <table style="border-collapse: collapse; width: 100%; font-size: 14px;">
+                        <thead><tr>{header}</tr></thead>
+                        <tbody>{rows}</tbody>
+                    </table>
+                </div>
+            </div>
+        </body>
+    </html>
+    """
+    return subject, body, html_body
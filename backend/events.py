@@ -0,0 +1,212 @@
+"""Event start times, range queries and the iCalendar feed.
+
+Events keep the ``date`` and ``time`` strings the admin form submits, plus
+``starts_at`` and ``ends_at`` datetimes derived from them in the school's
+timezone and stored in UTC like every other timestamp. Listings, range
+filters and the upcoming query all run on the ``starts_at`` index instead of
+sorting date strings; the upcoming query also drops events whose
+``ends_at`` has passed, so all-day events stay listed for their whole day.
+
+The ``.ics`` feed is rendered once per ``events`` cache version (the same
+counter the response cache uses), so it is rebuilt only after an event is
+created, changed or deleted, and every worker serves the same ETag.
+"""
+import hashlib
+import logging
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+EVENTS_TIMEZONE = ZoneInfo(os.environ.get('EVENTS_TIMEZONE', 'Asia/Kolkata'))
+UPCOMING_DEFAULT_LIMIT = 5
+MAX_UPCOMING_LIMIT = 50
+# Events without an end time are shown as lasting this long
+EVENT_DEFAULT_DURATION = timedelta(minutes=int(os.environ.get('EVENT_DEFAULT_DURATION_MINUTES', '60')))
+CALENDAR_NAME = os.environ.get('CALENDAR_NAME', 'Reyansh School Events')
+# Domain part of event UIDs; must stay stable so calendar apps update events in place
+CALENDAR_UID_DOMAIN = os.environ.get('CALENDAR_UID_DOMAIN', 'reyansh-school')
+CALENDAR_PAST_DAYS = int(os.environ.get('CALENDAR_PAST_DAYS', '180'))
+CALENDAR_MAX_AGE_SECONDS = int(os.environ.get('CALENDAR_MAX_AGE_SECONDS', '300'))
+
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%d %B %Y", "%d %b %Y", "%B %d, %Y", "%b %d, %Y")
+TIME_FORMATS = ("%H:%M", "%H:%M:%S", "%I:%M %p", "%I:%M%p", "%I %p", "%I%p")
+
+
+def parse_event_date(value: str) -> date:
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised event date {value!r}, expected YYYY-MM-DD")
+
+
+def parse_event_time(value: str) -> Optional[time]:
+    """Time of day, or None for all-day events (blank or free text such as 'All day')"""
+    value = (value or "").strip().upper()
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+    return None
+
+
+def to_utc(local: datetime) -> datetime:
+    """Naive school-local datetime to naive UTC, matching the other stored timestamps"""
+    return local.replace(tzinfo=EVENTS_TIMEZONE).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def event_start(date_value: str, time_value: str) -> datetime:
+    """UTC start of an event; all-day events start at local midnight"""
+    start = datetime.combine(parse_event_date(date_value), parse_event_time(time_value) or time.min)
+    return to_utc(start)
+
+
+def event_end(date_value: str, time_value: str) -> datetime:
+    """UTC end of an event: the next local midnight for all-day events"""
+    day, start_time = parse_event_date(date_value), parse_event_time(time_value)
+    if start_time is None:
+        return to_utc(datetime.combine(day + timedelta(days=1), time.min))
+    return to_utc(datetime.combine(day, start_time)) + EVENT_DEFAULT_DURATION
+
+
+def event_filter(date_from: date = None, date_to: date = None, category: str = None) -> dict:
+    """Category and inclusive local date range filters on starts_at"""
+    query = {}
+    if category:
+        query["category"] = category
+    if date_from or date_to:
+        starts_at = {}
+        if date_from:
+            starts_at["$gte"] = to_utc(datetime.combine(date_from, time.min))
+        if date_to:
+            starts_at["$lt"] = to_utc(datetime.combine(date_to + timedelta(days=1), time.min))
+        query["starts_at"] = starts_at
+    return query
+
+
+def upcoming_filter(category: str = None) -> dict:
+    """Events that haven't finished yet, so today's all-day events still show"""
+    now = datetime.utcnow()
+    today = to_utc(datetime.combine(datetime.now(EVENTS_TIMEZONE).date(), time.min))
+    query = {
+        # Nothing that started before today's local midnight is still running; keeps the index range tight
+        "starts_at": {"$gte": min(today, now - EVENT_DEFAULT_DURATION)},
+        "$or": [
+            {"ends_at": {"$gt": now}},
+            # Rows from before ends_at existed (see migrations.py event_starts_at)
+            {"ends_at": None, "starts_at": {"$gte": now - EVENT_DEFAULT_DURATION}},
+        ],
+    }
+    if category:
+        query["category"] = category
+    return query
+
+
+def _escape(text: str) -> str:
+    return (str(text or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _fold(line: str) -> str:
+    """Fold a content line to 75 octets as RFC 5545 requires"""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line
+    parts, start = [], 0
+    while start < len(encoded):
+        end = min(start + (75 if not parts else 74), len(encoded))
+        # Never split a UTF-8 sequence
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start = end
+    return "\r\n ".join(parts)
+
+
+def _utc_stamp(value: datetime) -> str:
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+
+def _created_at(event: dict) -> datetime:
+    value = event.get("created_at")
+    # Rows older than migrations.py timestamps may still hold an ISO string
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return event["starts_at"]
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value or event["starts_at"]
+
+
+def _vevent(event: dict) -> list:
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{event['id']}@{CALENDAR_UID_DOMAIN}",
+        f"DTSTAMP:{_utc_stamp(_created_at(event))}",
+    ]
+    if parse_event_time(event.get("time")) is None:
+        day = parse_event_date(event["date"])
+        lines += [f"DTSTART;VALUE=DATE:{day:%Y%m%d}", f"DTEND;VALUE=DATE:{day + timedelta(days=1):%Y%m%d}"]
+    else:
+        lines += [f"DTSTART:{_utc_stamp(event['starts_at'])}",
+                  f"DTEND:{_utc_stamp(event.get('ends_at') or event['starts_at'] + EVENT_DEFAULT_DURATION)}"]
+    lines += [
+        f"SUMMARY:{_escape(event.get('title'))}",
+        f"DESCRIPTION:{_escape(event.get('description'))}",
+        f"CATEGORIES:{_escape(event.get('category'))}",
+        "END:VEVENT",
+    ]
+    return lines
+
+
+def render_calendar(events: list) -> bytes:
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:-//{CALENDAR_UID_DOMAIN}//Events//EN",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(CALENDAR_NAME)}",
+        f"X-WR-TIMEZONE:{EVENTS_TIMEZONE.key}",
+    ]
+    for event in events:
+        try:
+            lines += _vevent(event)
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            # One malformed row must not take the whole feed down
+            logger.warning(f"Skipping event {event.get('id')} in calendar feed: {str(e)}")
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(_fold(line) for line in lines) + "\r\n").encode()
+
+
+class CalendarFeed:
+    """The rendered .ics body, rebuilt only when the events version changes"""
+
+    def __init__(self):
+        self._version = None
+        self._body = b""
+        self._etag = ""
+
+    async def get(self, collection, version: int):
+        """(body, etag) for the given events version"""
+        if version != self._version:
+            since = datetime.utcnow() - timedelta(days=CALENDAR_PAST_DAYS)
+            events = await collection.find(
+                {"starts_at": {"$gte": since}}, {"_id": 0}
+            ).sort([("starts_at", 1), ("id", 1)]).to_list(None)
+            self._body = render_calendar(events)
+            self._etag = f'"events-ics-{hashlib.blake2s(self._body, digest_size=8).hexdigest()}"'
+            self._version = version
+            logger.info(f"Rendered calendar feed with {len(events)} events (version {version})")
+        return self._body, self._etag
+
+
+calendar_feed = CalendarFeed()
@@ -0,0 +1,200 @@
+"""Streaming CSV and XLSX exports of enquiries and contact messages.
+
+Rows are read from an async cursor ``EXPORT_BATCH_SIZE`` documents at a
+time and encoded batch by batch, so an export of any size runs in constant
+memory and the first bytes go out as soon as the first batch is read.
+
+XLSX needs no extra dependency: the workbook is a zip archive written with
+``zipfile`` to an unseekable sink (entries then use data descriptors
+instead of rewriting headers), and the worksheet XML is compressed and
+flushed out row batch by row batch.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from retention import archive_name
+from search import search_filter
+
+EXPORT_BATCH_SIZE = 500
+
+# Columns of each export, in order: (header, document field)
+EXPORT_COLUMNS = {
+    "admission_enquiries": [
+        ("ID", "id"), ("Submitted", "created_at"), ("Status", "status"), ("Student", "student_name"),
+        ("Parent", "parent_name"), ("Email", "email"), ("Phone", "phone"), ("Grade", "grade"),
+        ("Previous School", "previous_school"), ("Message", "message"), ("Source", "source"),
+    ],
+    "contact_messages": [
+        ("ID", "id"), ("Submitted", "created_at"), ("Status", "status"), ("Name", "name"),
+        ("Email", "email"), ("Phone", "phone"), ("Subject", "subject"), ("Message", "message"),
+    ],
+}
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Characters that make spreadsheet apps treat a CSV cell as a formula
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+# Control characters XML 1.0 does not allow
+_XML_ILLEGAL = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def export_filter(status: str = None, grade: str = None, date_from=None, date_to=None) -> dict:
+    query = search_filter(status, date_from, date_to)
+    if grade:
+        query["grade"] = grade
+    return query
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)
+
+
+def _csv_cell(text: str) -> str:
+    # Submitted text must never run as a formula; phone numbers such as +91... stay as they are
+    if text.startswith(_FORMULA_PREFIXES) and not text.lstrip("+-").replace(" ", "").isdigit():
+        return "'" + text
+    return text
+
+
+async def _batches(db, collection_name: str, query: dict, include_archived: bool):
+    """Lists of row values, newest first, from the live collection then its archive"""
+    fields = [field for _, field in EXPORT_COLUMNS[collection_name]]
+    names = [collection_name, archive_name(collection_name)] if include_archived else [collection_name]
+    projection = {"_id": 0, **{field: 1 for field in fields}}
+    for name in names:
+        cursor = db[name].find(query, projection).sort(
+            [("created_at", -1), ("id", -1)]
+        ).batch_size(EXPORT_BATCH_SIZE)
+        batch = []
+        async for doc in cursor:
+            batch.append([_cell(doc.get(field)) for field in fields])
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+async def stream_csv(db, collection_name: str, query: dict, include_archived: bool = False):
+    """CSV with a UTF-8 BOM so Excel detects the encoding"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _ in EXPORT_COLUMNS[collection_name]])
+    yield "﻿".encode() + buffer.getvalue().encode()
+    async for batch in _batches(db, collection_name, query, include_archived):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_cell(value) for value in values] for values in batch)
+        yield buffer.getvalue().encode()
+
+
+class _Sink:
+    """Write-only, unseekable file object collecting zip output between yields"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _workbook_xml(sheet_name: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(sheet_name)}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+def _xlsx_row(values: list) -> str:
+    # Inline strings avoid a shared-strings table that would have to be held in memory;
+    # they are never evaluated, so no formula guard is needed here
+    cells = "".join(
+        f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_XML_ILLEGAL.sub("", value))}</t></is></c>'
+        for value in values
+    )
+    return f"<row>{cells}</row>"
+
+
+async def stream_xlsx(db, collection_name: str, query: dict, include_archived: bool = False):
+    """Single-sheet workbook, compressed and sent batch by batch"""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr("xl/workbook.xml", _workbook_xml(collection_name.replace("_", " ").title()))
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row([header for header, _ in EXPORT_COLUMNS[collection_name]]).encode())
+            yield sink.drain()
+            async for batch in _batches(db, collection_name, query, include_archived):
+                sheet.write("".join(_xlsx_row(values) for values in batch).encode())
+                yield sink.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
+
+
+def export_stream(db, collection_name: str, export_format: str, query: dict, include_archived: bool = False):
+    if export_format == "xlsx":
+        return stream_xlsx(db, collection_name, query, include_archived)
+    return stream_csv(db, collection_name, query, include_archived)
+
+
+def export_filename(prefix: str, export_format: str) -> str:
+    return f"{prefix}-{datetime.utcnow():%Y%m%d-%H%M}.{export_format}"
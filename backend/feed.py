@@ -0,0 +1,227 @@
+"""Live admin feed of new submissions and status changes over Server-Sent Events.
+
+Events go through an in-process ``FeedHub``. Each subscriber gets a bounded
+queue; a subscriber that falls ``FEED_QUEUE_SIZE`` events behind is
+disconnected instead of buffering without limit, and its browser reconnects
+with ``Last-Event-ID``. The most recent ``FEED_BUFFER_SIZE`` events are kept
+in a ring buffer so reconnecting clients replay what they missed, and
+clients whose last event is no longer buffered get a ``reset`` event
+telling them to reload their lists.
+
+With ``FEED_SOURCE=local`` (the default) the request handlers publish
+directly, which covers a single worker. With ``FEED_SOURCE=changestream``
+every worker instead follows a MongoDB change stream (replica sets only),
+so each one sees every worker's writes and event ids are the change
+stream resume tokens shared by all workers.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import signal
+import threading
+import uuid
+from collections import deque
+
+from pymongo.errors import PyMongoError
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+FEED_SOURCE = os.environ.get('FEED_SOURCE', 'local').lower()
+FEED_QUEUE_SIZE = int(os.environ.get('FEED_QUEUE_SIZE', '100'))
+FEED_BUFFER_SIZE = int(os.environ.get('FEED_BUFFER_SIZE', '500'))
+FEED_HEARTBEAT_SECONDS = 15
+FEED_RETRY_MS = 3000
+
+# Collection watched for each event prefix
+FEED_COLLECTIONS = {"admission_enquiries": "enquiry", "contact_messages": "message"}
+
+_CLOSED = object()
+
+
+class FeedHub:
+    """Fan-out of feed events to bounded subscriber queues, with a replay buffer"""
+
+    def __init__(self, queue_size: int = FEED_QUEUE_SIZE, buffer_size: int = FEED_BUFFER_SIZE):
+        self.queue_size = queue_size
+        self._buffer = deque(maxlen=buffer_size)
+        self._subscribers = set()
+        # Local event ids from an earlier process must not match this one's
+        self._prefix = uuid.uuid4().hex[:8]
+        self._counter = itertools.count(1)
+
+    def publish(self, event_type: str, data: dict, event_id: str = None):
+        """Buffer an event and hand it to every subscriber"""
+        if event_id is None:
+            event_id = f"{self._prefix}-{next(self._counter)}"
+        event = (event_id, event_type, dumps(data))
+        self._buffer.append(event)
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too slow to keep up: drop the connection, it resumes from the buffer
+                self._subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(_CLOSED)
+                logger.warning("Dropped a feed subscriber that fell behind")
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def replay(self, last_event_id: str):
+        """Events after last_event_id, or None when that id is no longer buffered"""
+        events = list(self._buffer)
+        for index, (event_id, _, _) in enumerate(events):
+            if event_id == last_event_id:
+                return events[index + 1:]
+        return None
+
+    def close(self):
+        """End every open stream"""
+        for queue in list(self._subscribers):
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(_CLOSED)
+        self._subscribers.clear()
+
+
+feed_hub = FeedHub()
+
+
+def publish_local(event_type: str, data: dict):
+    """Publish from a request handler; change stream mode picks the write up instead"""
+    if FEED_SOURCE != "changestream":
+        feed_hub.publish(event_type, {k: v for k, v in data.items() if k != "_id"})
+
+
+def publish_status_changes(prefix: str, previous: dict, updates: list):
+    """Publish a status event for every update that changed a document's status"""
+    current = {doc_id: doc.get("status") for doc_id, doc in previous.items()}
+    for update in updates:
+        if update.id in current and current[update.id] != update.status:
+            current[update.id] = update.status
+            publish_local(f"{prefix}.status", {"id": update.id, "status": update.status})
+
+
+def _format(event) -> bytes:
+    event_id, event_type, data = event
+    return f"id: {event_id}\nevent: {event_type}\ndata: ".encode() + data + b"\n\n"
+
+
+async def event_stream(last_event_id: str = None):
+    """SSE byte stream: missed events first, then live events with heartbeats"""
+    queue = feed_hub.subscribe()
+    try:
+        yield f"retry: {FEED_RETRY_MS}\n\n".encode()
+
+        replayed = set()
+        if last_event_id:
+            missed = feed_hub.replay(last_event_id)
+            if missed is None:
+                yield b"event: reset\ndata: {}\n\n"
+            else:
+                for event in missed:
+                    replayed.add(event[0])
+                    yield _format(event)
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), FEED_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": heartbeat\n\n"
+                continue
+            if event is _CLOSED:
+                return
+            # Published between subscribing and the replay snapshot
+            if event[0] in replayed:
+                continue
+            yield _format(event)
+    finally:
+        feed_hub.unsubscribe(queue)
+
+
+def _event_from_change(change: dict):
+    """(event type, data) for an insert or status update, else None"""
+    prefix = FEED_COLLECTIONS.get(change["ns"]["coll"])
+    document = change.get("fullDocument")
+    if prefix is None or document is None:
+        return None
+    document = {k: v for k, v in document.items() if k != "_id"}
+    if change["operationType"] == "insert":
+        return f"{prefix}.created", document
+    if "status" in change.get("updateDescription", {}).get("updatedFields", {}):
+        return f"{prefix}.status", {"id": document["id"], "status": document["status"]}
+    return None
+
+
+async def _watch(db):
+    """Publish inserts and status changes from a change stream, resuming after errors"""
+    pipeline = [{"$match": {
+        "ns.coll": {"$in": list(FEED_COLLECTIONS)},
+        "operationType": {"$in": ["insert", "update"]},
+    }}]
+    resume_token = None
+    while True:
+        try:
+            async with db.watch(pipeline, full_document="updateLookup", resume_after=resume_token) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    event = _event_from_change(change)
+                    if event is not None:
+                        feed_hub.publish(*event, event_id=change["_id"]["_data"])
+        except asyncio.CancelledError:
+            raise
+        except PyMongoError as e:
+            logger.error(f"Admin feed change stream error: {str(e)}")
+            await asyncio.sleep(5)
+
+
+_watcher = None
+
+
+def start_feed(db):
+    """Follow the change stream when FEED_SOURCE=changestream"""
+    global _watcher
+    if FEED_SOURCE == "changestream":
+        _watcher = asyncio.create_task(_watch(db))
+        logger.info("Admin feed follows the MongoDB change stream")
+
+
+def end_streams_on_shutdown_signal():
+    """Close every stream as soon as the server is told to stop
+
+    uvicorn waits for open responses before running the lifespan shutdown
+    and a feed stream never ends by itself, so without this every shutdown
+    would wait out the graceful timeout. Clients reconnect to another worker.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            loop.call_soon_threadsafe(feed_hub.close)
+            previous(signum, frame)
+
+        signal.signal(sig, handler)
+
+
+async def stop_feed():
+    global _watcher
+    feed_hub.close()
+    if _watcher is not None:
+        _watcher.cancel()
+        await asyncio.gather(_watcher, return_exceptions=True)
+        _watcher = None
+
@@ -0,0 +1,145 @@
+"""Duplicate-submission suppression for the public form endpoints.
+
+A submission is identified by its ``Idempotency-Key`` header or, when the
+client sends none, by a fingerprint of the validated payload. The first
+request with a given key runs normally; repeats within
+``IDEMPOTENCY_WINDOW_SECONDS`` get the stored result back without another
+insert or notification email. Results are remembered in process, concurrent
+repeats in the same worker wait for the first one, and the
+``idempotency_keys`` collection (TTL-indexed on ``created_at``) extends the
+guarantee across workers.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import orjson
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_WINDOW_SECONDS = int(os.environ.get('IDEMPOTENCY_WINDOW_SECONDS', '600'))
+IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get('IDEMPOTENCY_MAX_ENTRIES', '2048'))
+# How long a repeat waits for another worker to finish the original request
+IDEMPOTENCY_WAIT_SECONDS = 10
+IDEMPOTENCY_POLL_SECONDS = 0.2
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+class IdempotencyConflictError(Exception):
+    """Raised when the original request for a key is still running elsewhere"""
+
+
+def submission_key(scope: str, request, payload) -> str:
+    """Key for a submission: the client's Idempotency-Key, else a payload fingerprint"""
+    header = request.headers.get(IDEMPOTENCY_HEADER)
+    if header:
+        return f"{scope}:key:{hashlib.sha256(header.encode()).hexdigest()}"
+    body = orjson.dumps(payload.model_dump(mode="json"), option=orjson.OPT_SORT_KEYS)
+    return f"{scope}:body:{hashlib.sha256(body).hexdigest()}"
+
+
+class IdempotencyStore:
+    """Remembers the result of each submission key for the idempotency window"""
+
+    def __init__(self, window: int = IDEMPOTENCY_WINDOW_SECONDS, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.window = window
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._pending = {}
+        self._collection = None
+
+    def bind(self, collection):
+        """Share claims and results with other workers through a Mongo collection"""
+        self._collection = collection
+
+    def _lookup(self, key: str):
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self._results[key]
+            return None
+        return result
+
+    def _remember(self, key: str, result):
+        self._results[key] = (time.monotonic() + self.window, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    async def run(self, key: str, create):
+        """Run ``create`` once per key; returns (result, replayed)
+
+        ``create`` must return a JSON-compatible dict.
+        """
+        result = self._lookup(key)
+        if result is not None:
+            return result, True
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            result, replayed = await self._run_shared(key, create)
+        except BaseException as e:
+            future.set_exception(e)
+            # Concurrent repeats re-raise it; don't warn when there are none
+            future.exception()
+            raise
+        finally:
+            del self._pending[key]
+        self._remember(key, result)
+        future.set_result(result)
+        return result, replayed
+
+    async def _run_shared(self, key: str, create):
+        if self._collection is None:
+            return await create(), False
+
+        for _ in range(3):
+            try:
+                await self._collection.insert_one({"_id": key, "state": "pending", "created_at": datetime.utcnow()})
+            except DuplicateKeyError:
+                result = await self._wait_for(key)
+                if result is not None:
+                    return result, True
+                continue  # The claim was released or expired; try to take it
+
+            try:
+                result = await create()
+            except BaseException:
+                await self._collection.delete_one({"_id": key, "state": "pending"})
+                raise
+            await self._collection.update_one({"_id": key}, {"$set": {"state": "done", "result": result}})
+            return result, False
+        raise IdempotencyConflictError(key)
+
+    async def _wait_for(self, key: str):
+        """Stored result for a key claimed by another worker, or None once the claim is gone"""
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            doc = await self._collection.find_one({"_id": key})
+            if doc is None:
+                return None
+            if doc["created_at"] < datetime.utcnow() - timedelta(seconds=self.window):
+                # The TTL monitor only runs once a minute
+                await self._collection.delete_one({"_id": key, "created_at": doc["created_at"]})
+                return None
+            if doc["state"] == "done":
+                return doc["result"]
+            if time.monotonic() >= deadline:
+                raise IdempotencyConflictError(key)
+            await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,193 @@
+"""Responsive image derivatives for gallery uploads.
+
+Each upload is decoded once in a worker process, rotated according to its
+EXIF orientation and re-encoded as WebP at several widths without any of
+the original metadata. A tiny blurred WebP is returned as a data URI so the
+frontend can show a placeholder while the real image lazy-loads.
+
+The original is published too. One carrying EXIF, XMP, comments or other
+metadata is re-encoded in its own format with the orientation applied and
+only its ICC profile kept, so camera details and GPS coordinates never
+reach the stored file; one without any is stored byte for byte.
+"""
+import asyncio
+import base64
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image, ImageFilter, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Longest edge, in pixels, of each derivative
+VARIANT_SIZES = {"thumb": 320, "medium": 960, "large": 1920}
+WEBP_QUALITY = int(os.environ.get('WEBP_QUALITY', '80'))
+# Re-encoded originals stay close to the upload
+ORIGINAL_QUALITY = int(os.environ.get('ORIGINAL_QUALITY', '95'))
+# Decoder info that says how the pixels are encoded rather than where they came from
+SAFE_INFO_KEYS = {
+    "icc_profile", "dpi", "gamma", "transparency", "aspect", "interlace", "srgb", "chromaticity",
+    "jfif", "jfif_version", "jfif_unit", "jfif_density", "adobe", "adobe_transform",
+    "progressive", "progression", "loop", "background", "duration",
+}
+SAFE_JPEG_SEGMENTS = {"APP0": (b"JFIF",), "APP2": (b"ICC_PROFILE",), "APP14": (b"Adobe",)}
+PLACEHOLDER_SIZE = 16
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', '2'))
+# Enough leading bytes to recognise every accepted format
+SNIFF_BYTES = 12
+
+_executor = None
+
+
+class InvalidImageError(ValueError):
+    """Raised when an upload cannot be decoded as an image"""
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Content type of an image from its leading bytes, None if it is not JPEG, PNG or WebP"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    # WebP is a RIFF container with a WEBP form type after the chunk size
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def _normalize(img):
+    """Apply EXIF orientation and convert to a mode WebP can encode"""
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        return img.convert("RGBA")
+    return img.convert("RGB")
+
+
+def _placeholder(img) -> str:
+    tiny = img.copy()
+    tiny.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    tiny = tiny.filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    tiny.save(buffer, "WEBP", quality=30)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def _has_metadata(original) -> bool:
+    """Whether an image carries anything beyond its pixels, ICC profile and encoding details"""
+    if original.getexif() or set(original.info) - SAFE_INFO_KEYS:
+        return True
+    # JPEG APP segments Pillow does not surface in info (XMP, IPTC, maker data)
+    return any(
+        not any(data.startswith(prefix) for prefix in SAFE_JPEG_SEGMENTS.get(marker, ()))
+        for marker, data in getattr(original, "applist", [])
+    )
+
+
+def _decode(src_path: str):
+    """(normalized image, original format, ICC profile, has metadata) of an image file"""
+    try:
+        with Image.open(src_path) as original:
+            original.load()
+            return (
+                _normalize(original), original.format, original.info.get("icc_profile"), _has_metadata(original)
+            )
+    except Exception as e:
+        raise InvalidImageError(f"Could not decode image: {str(e)}")
+
+
+def _save_original(src_path: str, decoded: tuple, target: Path):
+    """Copy an upload without metadata as is, else re-encode it in its format with only its ICC profile"""
+    img, image_format, icc_profile, has_metadata = decoded
+    if not has_metadata:
+        shutil.copyfile(src_path, target)
+        return
+    clean = img.copy()
+    # Encoders write some metadata (XMP, PNG text chunks) straight from info
+    clean.info = {}
+    options = {"icc_profile": icc_profile} if icc_profile else {}
+    if image_format == "JPEG":
+        if clean.mode != "RGB":
+            clean = clean.convert("RGB")
+        clean.save(target, "JPEG", quality=ORIGINAL_QUALITY, optimize=True, **options)
+    elif image_format == "WEBP":
+        clean.save(target, "WEBP", quality=ORIGINAL_QUALITY, method=4, **options)
+    else:
+        clean.save(target, "PNG", **options)
+
+
+def strip_metadata(src_path: str, dest_path: str):
+    """Write a metadata-free copy of an image; runs inside the process pool"""
+    temp = Path(f"{dest_path}.{os.getpid()}.tmp")
+    _save_original(src_path, _decode(src_path), temp)
+    os.replace(temp, dest_path)
+
+
+def render_variants(src_path: str, dest_dir: str, stem: str) -> dict:
+    """Write WebP derivatives and a metadata-free original of an image; runs inside the process pool
+
+    The original is written as ``<stem>_original`` and named by the
+    returned ``original`` key.
+    """
+    decoded = _decode(src_path)
+    img = decoded[0]
+
+    variants = {}
+    for name, size in VARIANT_SIZES.items():
+        resized = img.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        filename = f"{stem}_{name}.webp"
+        target = Path(dest_dir) / filename
+        temp = target.with_name(f"{filename}.{os.getpid()}.tmp")
+        # Saving without exif/icc arguments drops all of the original metadata
+        resized.save(temp, "WEBP", quality=WEBP_QUALITY, method=4)
+        os.replace(temp, target)
+        variants[name] = {"file": filename, "width": resized.width, "height": resized.height}
+
+    original = f"{stem}_original"
+    _save_original(src_path, decoded, Path(dest_dir) / original)
+
+    return {
+        "original": original,
+        "width": img.width,
+        "height": img.height,
+        "variants": variants,
+        "placeholder": _placeholder(img),
+    }
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # spawn keeps the workers free of the event loop and Mongo client threads
+        _executor = ProcessPoolExecutor(
+            max_workers=IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+async def generate_variants(src_path: Path, dest_dir: Path, stem: str) -> dict:
+    """Render derivatives in the process pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), render_variants, str(src_path), str(dest_dir), stem)
+
+
+async def strip_image_metadata(src_path: Path, dest_path: Path):
+    """Write a metadata-free copy of an image in the process pool"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_get_executor(), strip_metadata, str(src_path), str(dest_path))
+
+
+def shutdown_image_pool():
+    """Stop the worker processes, waiting for renders already in progress"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+        logger.info("Stopped image processing pool")
@@ -0,0 +1,195 @@
+"""Declarative index registry applied at startup.
+
+``INDEXES`` lists the indexes every collection needs for the queries in
+``server.py``. ``HOT_QUERIES`` lists those query shapes; after the indexes
+are built each one is explained and any that would still run as a
+collection scan is logged as an error. ``INDEX_CHECK=strict`` makes that
+fail startup instead, for CI and load tests against a real ``mongod``; it
+is not the default because a plan can fall back to a scan for reasons
+that should not stop production from booting (an index build still in
+progress, a server version choosing another plan).
+"""
+import logging
+import os
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+
+from idempotency import IDEMPOTENCY_WINDOW_SECONDS
+from outbox import OUTBOX_SENT_RETENTION_SECONDS
+from retention import ARCHIVE_SUFFIX, SPAM_RETENTION_DAYS
+from search import SEARCH_WEIGHTS
+
+logger = logging.getLogger(__name__)
+
+# strict: raise on COLLSCAN, warn: log only, off: skip the explain report
+INDEX_CHECK = os.environ.get('INDEX_CHECK', 'warn').lower()
+
+
+def _unique_id():
+    return IndexModel([("id", ASCENDING)], unique=True, name="id_unique")
+
+
+def _newest_first(field: str):
+    return IndexModel([(field, DESCENDING), ("id", DESCENDING)], name=f"{field}_id")
+
+
+def _search_indexes(collection_name: str):
+    """Weighted text index plus phone/email indexes for prefix lookups"""
+    weights = SEARCH_WEIGHTS[collection_name]
+    return [
+        IndexModel([(field, TEXT) for field in weights], weights=weights, name="text_search"),
+        IndexModel([("phone", ASCENDING)], name="phone"),
+        IndexModel([("email", ASCENDING)], name="email"),
+    ]
+
+
+def _retention_indexes():
+    return [
+        # Candidates for the next archive pass
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        # Hard-delete spam some days after it was flagged
+        IndexModel(
+            [("status_updated_at", ASCENDING)],
+            expireAfterSeconds=SPAM_RETENTION_DAYS * 86400,
+            partialFilterExpression={"status": "spam"},
+            name="spam_ttl"
+        ),
+    ]
+
+
+def _photo_indexes():
+    return [
+        _unique_id(),
+        IndexModel(
+            [("is_active", ASCENDING), ("category", ASCENDING), ("uploaded_at", DESCENDING), ("id", DESCENDING)],
+            name="active_category_uploaded_at"
+        ),
+        IndexModel(
+            [("is_active", ASCENDING), ("uploaded_at", DESCENDING), ("id", DESCENDING)],
+            name="active_uploaded_at"
+        ),
+    ]
+
+
+INDEXES = {
+    "admission_enquiries": [
+        _unique_id(), _newest_first("created_at"), *_search_indexes("admission_enquiries"), *_retention_indexes()
+    ],
+    "contact_messages": [
+        _unique_id(), _newest_first("created_at"), *_search_indexes("contact_messages"), *_retention_indexes()
+    ],
+    # Archived records are only looked up by id or listed newest first
+    "admission_enquiries" + ARCHIVE_SUFFIX: [_unique_id(), _newest_first("created_at")],
+    "contact_messages" + ARCHIVE_SUFFIX: [_unique_id(), _newest_first("created_at")],
+    "school_photos": _photo_indexes(),
+    # Legacy gallery collection written by earlier versions of the upload handler
+    "photos": _photo_indexes(),
+    "events": [
+        _unique_id(),
+        IndexModel([("starts_at", ASCENDING), ("id", ASCENDING)], name="starts_at_id"),
+        IndexModel([("category", ASCENDING), ("starts_at", ASCENDING), ("id", ASCENDING)], name="category_starts_at_id"),
+    ],
+    "admission_rollups": [
+        IndexModel(
+            [("day", ASCENDING), ("grade", ASCENDING), ("status", ASCENDING), ("source", ASCENDING)],
+            unique=True, name="day_grade_status_source"
+        ),
+    ],
+    "email_outbox": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt_at"),
+        IndexModel([("status", ASCENDING), ("locked_until", ASCENDING)], name="status_locked_until"),
+        IndexModel([("sent_at", ASCENDING)], expireAfterSeconds=OUTBOX_SENT_RETENTION_SECONDS, name="sent_at_ttl"),
+    ],
+    "notification_digest": [
+        IndexModel(
+            [("batch_id", ASCENDING), ("kind", ASCENDING), ("to", ASCENDING), ("created_at", ASCENDING)],
+            name="batch_kind_to_created_at"
+        ),
+        IndexModel([("batch_id", ASCENDING), ("claimed_at", ASCENDING)], name="batch_claimed_at"),
+    ],
+    "idempotency_keys": [
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=IDEMPOTENCY_WINDOW_SECONDS, name="created_at_ttl"),
+    ],
+    # Idle buckets are full again long before a day has passed
+    "rate_limits": [
+        IndexModel([("updated_at", ASCENDING)], expireAfterSeconds=86400, name="updated_at_ttl"),
+    ],
+}
+
+# (name, collection, filter, sort) for every query shape on a request path
+HOT_QUERIES = [
+    ("enquiry_list", "admission_enquiries", {}, [("created_at", -1), ("id", -1)]),
+    ("message_list", "contact_messages", {}, [("created_at", -1), ("id", -1)]),
+    ("enquiry_text_search", "admission_enquiries", {"$text": {"$search": "_"}}, None),
+    ("enquiry_phone_prefix", "admission_enquiries", {"phone": {"$regex": "^_"}}, [("created_at", -1), ("id", -1)]),
+    ("enquiry_email_prefix", "admission_enquiries", {"email": {"$regex": "^_"}}, [("created_at", -1), ("id", -1)]),
+    ("message_text_search", "contact_messages", {"$text": {"$search": "_"}}, None),
+    ("message_phone_prefix", "contact_messages", {"phone": {"$regex": "^_"}}, [("created_at", -1), ("id", -1)]),
+    ("message_email_prefix", "contact_messages", {"email": {"$regex": "^_"}}, [("created_at", -1), ("id", -1)]),
+    ("photo_by_id", "school_photos", {"id": "_", "is_active": True}, None),
+    ("photo_list", "school_photos", {"is_active": True}, [("uploaded_at", -1), ("id", -1)]),
+    ("photo_list_by_category", "school_photos", {"is_active": True, "category": "_"}, [("uploaded_at", -1), ("id", -1)]),
+    ("event_by_id", "events", {"id": "_"}, None),
+    ("event_list", "events", {}, [("starts_at", 1), ("id", 1)]),
+    ("event_range", "events", {"starts_at": {"$gte": datetime(1970, 1, 1)}}, [("starts_at", 1), ("id", 1)]),
+    ("event_range_by_category", "events", {"category": "_", "starts_at": {"$gte": datetime(1970, 1, 1)}},
+     [("starts_at", 1), ("id", 1)]),
+    ("enquiry_retention", "admission_enquiries",
+     {"status": {"$in": ["processed"]}, "created_at": {"$lt": datetime(1970, 1, 1)}}, [("created_at", 1), ("id", 1)]),
+    ("message_retention", "contact_messages",
+     {"status": {"$in": ["responded"]}, "created_at": {"$lt": datetime(1970, 1, 1)}}, [("created_at", 1), ("id", 1)]),
+    ("admission_rollup_range", "admission_rollups", {"day": {"$gte": datetime(1970, 1, 1)}}, None),
+    ("outbox_claim", "email_outbox", {"$or": [
+        {"status": "pending", "next_attempt_at": {"$lte": datetime(1970, 1, 1)}},
+        {"status": "sending", "locked_until": {"$lte": datetime(1970, 1, 1)}},
+    ]}, [("next_attempt_at", 1)]),
+]
+
+
+async def ensure_indexes(db):
+    """Create every registered index; existing identical indexes are a no-op"""
+    for collection_name, models in INDEXES.items():
+        names = await db[collection_name].create_indexes(models)
+        logger.info(f"Indexes ready on {collection_name}: {', '.join(names)}")
+
+
+def _plan_stages(plan, stages=None):
+    """Collect (stage, index name) pairs from an explain plan tree"""
+    if stages is None:
+        stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append((plan["stage"], plan.get("indexName")))
+        for value in plan.values():
+            _plan_stages(value, stages)
+    elif isinstance(plan, list):
+        for item in plan:
+            _plan_stages(item, stages)
+    return stages
+
+
+async def check_query_plans(db):
+    """Explain every hot query shape and fail if any of them scans a whole collection"""
+    if INDEX_CHECK == "off":
+        return []
+
+    report = []
+    for name, collection_name, query, sort in HOT_QUERIES:
+        cursor = db[collection_name].find(query).limit(1)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        collscan = any(stage == "COLLSCAN" for stage, _ in stages)
+        indexes = sorted({index for _, index in stages if index})
+        report.append({"query": name, "collection": collection_name, "collscan": collscan, "indexes": indexes})
+        logger.info(f"Query plan {name} on {collection_name}: {'COLLSCAN' if collscan else ', '.join(indexes)}")
+
+    offenders = [row["query"] for row in report if row["collscan"]]
+    if offenders:
+        message = f"Hot queries still run as collection scans: {', '.join(offenders)}"
+        if INDEX_CHECK == "strict":
+            raise RuntimeError(message)
+        logger.error(message)
+    return report
@@ -0,0 +1,125 @@
+"""Prometheus metrics for the API.
+
+``MetricsMiddleware`` records request latency and status codes per route
+template, plus in-flight requests. ``MongoCommandMetrics`` is a PyMongo
+command listener that times every command by collection and command name.
+``record_email_send`` and ``record_upload`` are called by the email service
+and the upload handler. ``render_metrics`` produces the text exposition
+format for ``/api/metrics``; when ``PROMETHEUS_MULTIPROC_DIR`` is set the
+values of every uvicorn worker are aggregated.
+"""
+import logging
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Request latencies range from cached listings (~1ms) to 5MB uploads (seconds)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served",
+    ["method"], multiprocess_mode="livesum"
+)
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency by collection and command",
+    ["collection", "command"], buckets=LATENCY_BUCKETS
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures", "MongoDB commands that returned an error",
+    ["collection", "command"]
+)
+EMAIL_SEND_SECONDS = Histogram(
+    "email_send_duration_seconds", "Resend API call latency by outcome",
+    ["outcome"], buckets=LATENCY_BUCKETS
+)
+PHOTO_UPLOAD_BYTES = Counter("photo_upload_bytes", "Bytes received by the photo upload endpoint")
+PHOTO_UPLOADS = Counter("photo_uploads", "Photo uploads received")
+
+
+class MetricsMiddleware:
+    """Records latency, status code and concurrency of every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            # The router stores the matched route in the scope; label by its template, never the raw path
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.labels(method, route, str(status)).observe(time.perf_counter() - started)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command issued by the client it is registered on"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        # Most commands name their collection as the value of the command key
+        collection = event.command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = (
+            collection if isinstance(collection, str) else ""
+        )
+
+    def _collection(self, event) -> str:
+        return self._collections.pop((event.connection_id, event.request_id), "")
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.labels(self._collection(event), event.command_name).observe(
+            event.duration_micros / 1e6
+        )
+
+    def failed(self, event):
+        collection = self._collection(event)
+        MONGO_COMMAND_SECONDS.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(collection, event.command_name).inc()
+
+
+def record_email_send(outcome: str, seconds: float):
+    """Record one Resend call: outcome is sent, failed or skipped"""
+    EMAIL_SEND_SECONDS.labels(outcome).observe(seconds)
+
+
+def record_upload(size: int):
+    PHOTO_UPLOAD_BYTES.inc(size)
+    PHOTO_UPLOADS.inc()
+
+
+def render_metrics():
+    """Return (body, content type) of the current metrics in text format"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
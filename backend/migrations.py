@@ -0,0 +1,184 @@
+"""One-off data migrations.
+
+Run from the backend directory with the same ``.env`` as the server::
+
+    python migrations.py timestamps
+    python migrations.py admission_rollups
+    python migrations.py event_starts_at
+    python migrations.py photos_to_gridfs
+    python migrations.py strip_photo_metadata
+"""
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from pymongo import UpdateOne
+
+from analytics import rebuild_admission_rollups
+from events import event_end, event_start
+from images import InvalidImageError, shutdown_image_pool, strip_image_metadata
+from storage import create_storage, migrate_photos_to_gridfs, original_relpath, photo_url
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = 500
+UPLOAD_DIR = Path(__file__).parent / "uploads" / "photos"
+
+# Timestamp field of every collection that used to store ISO strings
+TIMESTAMP_FIELDS = {
+    "admission_enquiries": "created_at",
+    "contact_messages": "created_at",
+    "events": "created_at",
+    "school_photos": "uploaded_at",
+    "photos": "uploaded_at",
+}
+
+
+async def _flush(collection, batch: list) -> int:
+    if not batch:
+        return 0
+    result = await collection.bulk_write(batch, ordered=False)
+    return result.modified_count
+
+
+async def migrate_string_timestamps(db) -> dict:
+    """Convert ISO-string timestamps into native BSON datetimes"""
+    converted = {}
+    for collection_name, field in TIMESTAMP_FIELDS.items():
+        collection = db[collection_name]
+        batch, count = [], 0
+        cursor = collection.find({field: {"$type": "string"}}, {field: 1}).batch_size(MIGRATION_BATCH_SIZE)
+        async for doc in cursor:
+            try:
+                value = datetime.fromisoformat(doc[field])
+            except ValueError:
+                logger.warning(f"Skipping {collection_name} {doc['_id']}: unparseable {field} {doc[field]!r}")
+                continue
+            # Matching on the old value keeps the update a no-op if the row changed meanwhile
+            batch.append(UpdateOne({"_id": doc["_id"], field: doc[field]}, {"$set": {field: value}}))
+            if len(batch) >= MIGRATION_BATCH_SIZE:
+                count += await _flush(collection, batch)
+                batch = []
+        count += await _flush(collection, batch)
+        converted[collection_name] = count
+        logger.info(f"Converted {count} {collection_name}.{field} values to datetimes")
+
+    # Invalidate cached listings and ETags on every worker
+    await db.cache_versions.update_many({}, {"$inc": {"version": 1}})
+    return converted
+
+
+async def migrate_event_starts_at(db) -> int:
+    """Derive starts_at and ends_at for events stored before they existed"""
+    batch, count = [], 0
+    cursor = db.events.find(
+        {"$or": [{"starts_at": None}, {"ends_at": None}]}, {"date": 1, "time": 1}
+    ).batch_size(MIGRATION_BATCH_SIZE)
+    async for doc in cursor:
+        try:
+            starts_at = event_start(doc.get("date") or "", doc.get("time") or "")
+            ends_at = event_end(doc.get("date") or "", doc.get("time") or "")
+        except ValueError as e:
+            logger.warning(f"Skipping event {doc['_id']}: {str(e)}")
+            continue
+        batch.append(UpdateOne(
+            {"_id": doc["_id"], "date": doc.get("date"), "time": doc.get("time")},
+            {"$set": {"starts_at": starts_at, "ends_at": ends_at}}
+        ))
+        if len(batch) >= MIGRATION_BATCH_SIZE:
+            count += await _flush(db.events, batch)
+            batch = []
+    count += await _flush(db.events, batch)
+    logger.info(f"Set starts_at and ends_at on {count} events")
+
+    await db.cache_versions.update_one({"_id": "events"}, {"$inc": {"version": 1}}, upsert=True)
+    return count
+
+
+async def migrate_photos_to_gridfs_from_uploads(db) -> dict:
+    """Move local uploads into GridFS before switching to PHOTO_STORAGE=gridfs"""
+    return await migrate_photos_to_gridfs(db, UPLOAD_DIR)
+
+
+async def strip_photo_metadata(db) -> int:
+    """Re-encode originals stored before uploads were stripped of EXIF and GPS data
+
+    A stripped original is stored under the hash of its new bytes and every
+    photo is pointed at it before the old file is deleted: originals are
+    served as immutable, so rewriting one in place would never reach caches
+    that already hold the copy with metadata.
+    """
+    storage = create_storage(UPLOAD_DIR)
+    storage.bind(db)
+    storage.scratch_dir.mkdir(parents=True, exist_ok=True)
+    count = 0
+    try:
+        async for blob in db.photo_blobs.find({"refcount": {"$gt": 0}, "deleting_at": None}, {"path": 1}):
+            source = storage.scratch_dir / f"{blob['_id']}.migrating"
+            target = storage.scratch_dir / f"{blob['_id']}.stripped"
+            try:
+                await storage.fetch(blob["path"], source)
+                await strip_image_metadata(source, target)
+                path = await original_relpath(blob["path"], target)
+                if path == blob["path"]:
+                    continue
+                await storage.save(path, target)
+                await db.photo_blobs.update_one({"_id": blob["_id"], "path": blob["path"]}, {"$set": {"path": path}})
+                for collection_name in ("school_photos", "photos"):
+                    await db[collection_name].update_many(
+                        {"content_hash": blob["_id"]},
+                        {"$set": {"file_path": storage.stored_path(path), "file_url": photo_url(path)}}
+                    )
+                await storage.delete([blob["path"]])
+                count += 1
+            except (FileNotFoundError, InvalidImageError) as e:
+                logger.warning(f"Skipping blob {blob['_id']}: {str(e)}")
+            finally:
+                source.unlink(missing_ok=True)
+                target.unlink(missing_ok=True)
+    finally:
+        shutdown_image_pool()
+    if count:
+        # Cached gallery listings still carry the old URLs
+        await db.cache_versions.update_one({"_id": "photos"}, {"$inc": {"version": 1}}, upsert=True)
+    logger.info(f"Stripped metadata from {count} stored originals")
+    return count
+
+
+MIGRATIONS = {
+    "timestamps": migrate_string_timestamps,
+    "admission_rollups": rebuild_admission_rollups,
+    "event_starts_at": migrate_event_starts_at,
+    "photos_to_gridfs": migrate_photos_to_gridfs_from_uploads,
+    "strip_photo_metadata": strip_photo_metadata,
+}
+
+
+async def main(names: list):
+    from database import create_client
+
+    client = create_client(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        for name in names:
+            logger.info(f"Running migration {name}")
+            await MIGRATIONS[name](db)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    unknown = [name for name in sys.argv[1:] if name not in MIGRATIONS]
+    if not sys.argv[1:] or unknown:
+        sys.exit(f"Usage: python migrations.py {{{'|'.join(MIGRATIONS)}}} ...")
+    asyncio.run(main(sys.argv[1:]))
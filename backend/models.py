@@ -1,8 +1,14 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field, model_validator
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
 import uuid
 
+from events import event_end, event_start
+
+# Workflow statuses
+EnquiryStatus = Literal["pending", "contacted", "processed", "spam"]
+MessageStatus = Literal["unread", "read", "responded", "spam"]
+
 # Admission Enquiry Models
 class AdmissionEnquiryCreate(BaseModel):
     student_name: str
@@ -16,6 +22,7 @@ class AdmissionEnquiryCreate(BaseModel):
 class AdmissionEnquiry(AdmissionEnquiryCreate):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     status: str = "pending"
+    source: str = "website"
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 # Contact Message Models
@@ -32,6 +39,11 @@ class ContactMessage(ContactMessageCreate):
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 # Photo Models
+class PhotoVariant(BaseModel):
+    url: str
+    width: int
+    height: int
+
 class PhotoCreate(BaseModel):
     title: str
     description: Optional[str] = ""
@@ -44,6 +56,11 @@ class Photo(PhotoCreate):
     uploaded_by: str = "admin"
     uploaded_at: datetime = Field(default_factory=datetime.utcnow)
     is_active: bool = True
+    content_hash: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    variants: Dict[str, PhotoVariant] = Field(default_factory=dict)
+    placeholder: Optional[str] = None
 
 # Event Models
 class EventCreate(BaseModel):
@@ -56,3 +73,27 @@ class EventCreate(BaseModel):
 class Event(EventCreate):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # UTC start and end derived from date and time; never trusted from the client
+    starts_at: Optional[datetime] = None
+    ends_at: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def derive_starts_at(self):
+        self.starts_at = event_start(self.date, self.time)
+        self.ends_at = event_end(self.date, self.time)
+        return self
+
+# Bulk Status Update Models
+class EnquiryStatusUpdate(BaseModel):
+    id: str
+    status: EnquiryStatus
+
+class MessageStatusUpdate(BaseModel):
+    id: str
+    status: MessageStatus
+
+class BulkEnquiryStatusUpdate(BaseModel):
+    updates: List[EnquiryStatusUpdate]
+
+class BulkMessageStatusUpdate(BaseModel):
+    updates: List[MessageStatusUpdate]
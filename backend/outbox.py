@@ -0,0 +1,208 @@
+"""Durable email outbox backed by MongoDB.
+
+Notification emails are inserted into the ``email_outbox`` collection and
+delivered by a bounded pool of background workers started from the app
+lifespan, so request handlers only wait for the insert to be acknowledged.
+Failed deliveries are retried with exponential backoff and dead-lettered
+after ``EMAIL_OUTBOX_MAX_ATTEMPTS`` attempts. A delivery function returns
+``DELIVERY_SKIPPED`` when no email provider is configured; such jobs are
+marked skipped instead of being retried into the dead letters.
+"""
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Outbox Configuration
+OUTBOX_WORKERS = int(os.environ.get('EMAIL_OUTBOX_WORKERS', '2'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', '6'))
+OUTBOX_BACKOFF_SECONDS = float(os.environ.get('EMAIL_OUTBOX_BACKOFF_SECONDS', '30'))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.environ.get('EMAIL_OUTBOX_BACKOFF_MAX_SECONDS', '3600'))
+OUTBOX_LEASE_SECONDS = 120
+OUTBOX_POLL_SECONDS = 5
+# Delivered jobs are kept for a week so their status can still be inspected
+OUTBOX_SENT_RETENTION_SECONDS = 7 * 24 * 3600
+
+# Delivery statuses
+STATUS_PENDING = "pending"
+STATUS_SENDING = "sending"
+STATUS_SENT = "sent"
+STATUS_DEAD = "dead"
+STATUS_SKIPPED = "skipped"
+
+# Returned by a delivery function that deliberately sent nothing
+DELIVERY_SKIPPED = "skipped"
+
+_collection = None
+_deliver = None
+_workers = []
+_wakeup = None
+_stopping = False
+
+
+async def enqueue_email(to_email: str, subject: str, body: str, html_body: str = None, kind: str = "generic"):
+    """Insert an email into the outbox and wake a delivery worker"""
+    if _collection is None:
+        raise RuntimeError("Email outbox has not been started")
+
+    now = datetime.utcnow()
+    job = {
+        "id": str(uuid.uuid4()),
+        "kind": kind,
+        "to": to_email,
+        "subject": subject,
+        "text": body,
+        "html": html_body,
+        "status": STATUS_PENDING,
+        "attempts": 0,
+        "last_error": None,
+        "created_at": now,
+        "updated_at": now,
+        "next_attempt_at": now,
+    }
+    await _collection.insert_one(job)
+    logger.info(f"Queued {kind} email to {to_email} (outbox ID: {job['id']})")
+
+    if _wakeup is not None:
+        _wakeup.set()
+    return job["id"]
+
+
+def _backoff(attempts: int) -> float:
+    """Exponential backoff with jitter for the given attempt number"""
+    delay = min(OUTBOX_BACKOFF_SECONDS * (2 ** (attempts - 1)), OUTBOX_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+async def _claim_next():
+    """Atomically lease the next due job, including jobs whose lease expired"""
+    now = datetime.utcnow()
+    return await _collection.find_one_and_update(
+        {"$or": [
+            {"status": STATUS_PENDING, "next_attempt_at": {"$lte": now}},
+            {"status": STATUS_SENDING, "locked_until": {"$lte": now}},
+        ]},
+        {
+            "$set": {
+                "status": STATUS_SENDING,
+                "locked_until": now + timedelta(seconds=OUTBOX_LEASE_SECONDS),
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _process(job: dict):
+    """Deliver a leased job and record the outcome"""
+    try:
+        delivered = await _deliver(job["to"], job["subject"], job["text"], job.get("html"))
+        error = None if delivered else "Email provider reported a failed delivery"
+    except Exception as e:
+        delivered, error = False, f"{type(e).__name__}: {str(e)}"
+
+    now = datetime.utcnow()
+    if delivered == DELIVERY_SKIPPED:
+        # sent_at lets the retention TTL expire it like a delivered job
+        update = {"status": STATUS_SKIPPED, "sent_at": now, "updated_at": now, "last_error": None}
+    elif delivered:
+        update = {"status": STATUS_SENT, "sent_at": now, "updated_at": now, "last_error": None}
+    elif job["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+        update = {"status": STATUS_DEAD, "dead_at": now, "updated_at": now, "last_error": error}
+        logger.error(f"Email {job['id']} dead-lettered after {job['attempts']} attempts: {error}")
+    else:
+        delay = _backoff(job["attempts"])
+        update = {
+            "status": STATUS_PENDING,
+            "next_attempt_at": now + timedelta(seconds=delay),
+            "updated_at": now,
+            "last_error": error,
+        }
+        logger.warning(f"Email {job['id']} attempt {job['attempts']} failed, retrying in {delay:.0f}s: {error}")
+
+    await _collection.update_one(
+        {"_id": job["_id"]},
+        {"$set": update, "$unset": {"locked_until": ""}}
+    )
+
+
+async def _worker(worker_id: int):
+    """Claim and deliver jobs until the outbox is stopped"""
+    while not _stopping:
+        try:
+            _wakeup.clear()
+            job = await _claim_next()
+            if job is None:
+                try:
+                    await asyncio.wait_for(_wakeup.wait(), OUTBOX_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await _process(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Email outbox worker {worker_id} error: {str(e)}")
+            await asyncio.sleep(OUTBOX_POLL_SECONDS)
+
+
+async def start_outbox(collection, deliver, workers: int = OUTBOX_WORKERS):
+    """Start the delivery worker pool (indexes come from the index registry)"""
+    global _collection, _deliver, _wakeup, _stopping
+    _collection = collection
+    _deliver = deliver
+    _wakeup = asyncio.Event()
+    _stopping = False
+
+    for worker_id in range(workers):
+        _workers.append(asyncio.create_task(_worker(worker_id)))
+    logger.info(f"Started {workers} email outbox workers")
+
+
+async def stop_outbox(timeout: float = 10):
+    """Let in-flight deliveries finish, then cancel the worker pool"""
+    global _stopping
+    if not _workers:
+        return
+    _stopping = True
+    _wakeup.set()
+
+    _, pending = await asyncio.wait(_workers, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    _workers.clear()
+    logger.info("Stopped email outbox workers")
+
+
+async def outbox_stats(dead_limit: int = 20):
+    """Return job counts per delivery status and the most recent dead letters"""
+    counts = {status: 0 for status in (STATUS_PENDING, STATUS_SENDING, STATUS_SENT, STATUS_DEAD, STATUS_SKIPPED)}
+    async for row in _collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+        counts[row["_id"]] = row["count"]
+
+    dead = await _collection.find(
+        {"status": STATUS_DEAD},
+        {"_id": 0, "html": 0, "text": 0}
+    ).sort("dead_at", -1).to_list(dead_limit)
+    return {"counts": counts, "dead": dead}
+
+
+async def retry_dead():
+    """Move every dead-lettered job back to pending with a fresh attempt budget"""
+    now = datetime.utcnow()
+    result = await _collection.update_many(
+        {"status": STATUS_DEAD},
+        {"$set": {"status": STATUS_PENDING, "attempts": 0, "next_attempt_at": now, "updated_at": now}}
+    )
+    if result.modified_count and _wakeup is not None:
+        _wakeup.set()
+    return result.modified_count
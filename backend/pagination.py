@@ -0,0 +1,111 @@
+"""Keyset pagination and NDJSON streaming for list endpoints.
+
+Pages are ordered by a sort field plus ``id`` as a tie-breaker. The cursor
+handed back to clients encodes the sort value and id of the last document
+on the page, so the next page is a range query on an index instead of a
+growing ``skip``.
+"""
+import base64
+import json
+import os
+from datetime import datetime
+
+from fastapi.responses import StreamingResponse
+
+from serialization import dumps
+
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', '100'))
+MAX_PAGE_SIZE = 1000
+NDJSON_BATCH_SIZE = 200
+
+
+def encode_cursor(doc: dict, sort_field: str) -> str:
+    """Encode the position of a document as an opaque cursor string"""
+    value = doc.get(sort_field)
+    if isinstance(value, datetime):
+        payload = {"t": "date", "v": value.isoformat()}
+    else:
+        payload = {"t": "raw", "v": value}
+    payload["id"] = doc.get("id")
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Decode a cursor into its (sort value, id) pair, raising ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        value = payload["v"]
+        if payload["t"] == "date":
+            value = datetime.fromisoformat(value)
+        return value, payload["id"]
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+
+def keyset_filter(sort_field: str, direction: int, after: str) -> dict:
+    """Build the filter selecting documents strictly after the cursor position"""
+    value, last_id = decode_cursor(after)
+    op = "$lt" if direction < 0 else "$gt"
+    # Null (or missing) sorts before every other value, and no range operator matches it
+    if value is None:
+        clauses = [{sort_field: None, "id": {op: last_id}}]
+        if direction > 0:
+            clauses.append({sort_field: {"$ne": None}})
+        return {"$or": clauses}
+    clauses = [
+        {sort_field: {op: value}},
+        {sort_field: value, "id": {op: last_id}},
+    ]
+    if direction < 0:
+        clauses.append({sort_field: None})
+    # Older handlers stored timestamps as ISO strings, and BSON orders strings
+    # before dates, so crossing from one type to the other must be explicit
+    if direction < 0 and isinstance(value, datetime):
+        clauses.append({sort_field: {"$type": "string"}})
+    elif direction > 0 and isinstance(value, str):
+        clauses.append({sort_field: {"$type": "date"}})
+    return {"$or": clauses}
+
+
+def _build_query(query: dict, sort_field: str, direction: int, after: str = None) -> dict:
+    if not after:
+        return query
+    return {"$and": [query, keyset_filter(sort_field, direction, after)]}
+
+
+async def fetch_page(collection, query: dict, sort_field: str, direction: int = -1,
+                     limit: int = DEFAULT_PAGE_SIZE, after: str = None):
+    """Fetch one page of documents and the cursor for the next page (None on the last page)"""
+    cursor = collection.find(
+        _build_query(query, sort_field, direction, after),
+        {"_id": 0}
+    ).sort([(sort_field, direction), ("id", direction)]).limit(limit + 1)
+    docs = await cursor.to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort_field)
+    return docs, next_cursor
+
+
+async def stream_ndjson(collection, query: dict, sort_field: str, direction: int = -1, after: str = None):
+    """Yield every matching document as one JSON line, reading the cursor in small batches"""
+    cursor = collection.find(
+        _build_query(query, sort_field, direction, after),
+        {"_id": 0}
+    ).sort([(sort_field, direction), ("id", direction)]).batch_size(NDJSON_BATCH_SIZE)
+    async for doc in cursor:
+        yield dumps(doc) + b"\n"
+
+
+def ndjson_response(collection, query: dict, sort_field: str, direction: int = -1, after: str = None):
+    """Stream a list endpoint as NDJSON, validating the cursor before the response starts"""
+    if after:
+        decode_cursor(after)
+    return StreamingResponse(
+        stream_ndjson(collection, query, sort_field, direction, after),
+        media_type="application/x-ndjson"
+    )
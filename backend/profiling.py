@@ -0,0 +1,356 @@
+"""Per-request profiling and slow-request capture.
+
+``ProfilingMiddleware`` gives every API request a ``RequestTrace`` held in a
+context variable, and the hot paths report into it:
+
+* ``CommandProfiler``, a PyMongo command listener, adds every command with
+  its round-trip time to the ``db`` phase. Motor runs PyMongo in executor
+  threads with a copy of the caller's context, so the listener sees the
+  trace of the request that issued the command.
+* ``send_email`` times the Resend call as ``email``, ``store_upload`` its
+  scratch and storage writes as ``file_io`` and variant rendering as
+  ``render``, and ``dumps`` its encoding as ``serialization``.
+* ``ProfiledRoute`` adds the time FastAPI spends validating and encoding a
+  handler's return value to ``serialization``.
+
+Phases are measured independently and may overlap (a GridFS write is both
+``file_io`` and ``db``), so they need not add up to the request duration.
+
+A request is also sampled when it carries ``X-Profile: <PROFILING_TOKEN>``
+or, with ``PROFILING_SAMPLE_RATE`` above 0, at random. ``StackSampler`` is a
+thread that reads the event loop thread's stack every
+``PROFILING_INTERVAL_MS`` and counts it as a folded stack
+(``frame;frame;frame count``, the input of flamegraph.pl and speedscope)
+when the sampled request's task is the one running, and as
+``(awaiting I/O)`` or ``(other tasks)`` when it is not, so the flame graph
+shows wall-clock time.
+
+Requests slower than ``SLOW_REQUEST_MS`` are logged with their phase
+timings and slowest commands. Sampled and slow requests are kept in a ring
+buffer of the last ``PROFILING_BUFFER_SIZE`` captures per worker, listed by
+``GET /api/admin/profiles``.
+"""
+import asyncio
+import functools
+import hmac
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'true').lower() == 'true'
+# Empty disables header-triggered profiling
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_INTERVAL_MS = float(os.environ.get('PROFILING_INTERVAL_MS', '5'))
+PROFILING_BUFFER_SIZE = int(os.environ.get('PROFILING_BUFFER_SIZE', '50'))
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '1000'))
+# Commands kept per request; a runaway loop of queries must not grow a trace without limit
+PROFILING_MAX_COMMANDS = 200
+SLOW_LOG_COMMANDS = 10
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+AWAITING_FRAME = "(awaiting I/O)"
+OTHER_TASKS_FRAME = "(other tasks)"
+
+_current = ContextVar("request_trace", default=None)
+
+# Frames above the task step (event loop internals) are the same in every sample
+_HANDLE_RUN = asyncio.events.Handle._run.__code__
+
+
+class RequestTrace:
+    """Phase timings, Mongo commands and sampled stacks of one request"""
+
+    def __init__(self, method: str, path: str, sampled: bool = False):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.route = None
+        self.status = None
+        self.started_at = datetime.utcnow()
+        self.duration = None
+        self.sampled = sampled
+        self.phases = {}
+        self.commands = []
+        self.dropped_commands = 0
+        self.stacks = Counter()
+        self.endpoint_returned = None
+        # The Mongo listener reports from executor threads
+        self._lock = threading.Lock()
+
+    def add_phase(self, name: str, seconds: float):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_command(self, command: str, collection: str, seconds: float, failed: bool):
+        with self._lock:
+            self.phases["db"] = self.phases.get("db", 0.0) + seconds
+            if len(self.commands) >= PROFILING_MAX_COMMANDS:
+                self.dropped_commands += 1
+                return
+            self.commands.append((command, collection, seconds, failed))
+
+    def folded(self) -> str:
+        """Sampled stacks in folded format, rooted at the route"""
+        root = f"{self.method} {self.route or self.path}"
+        return "\n".join(f"{root};{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> str:
+        phases = " ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in sorted(self.phases.items()))
+        slowest = sorted(self.commands, key=lambda c: c[2], reverse=True)[:SLOW_LOG_COMMANDS]
+        commands = ", ".join(
+            f"{command} {collection or '-'} {seconds * 1000:.1f}ms{' failed' if failed else ''}"
+            for command, collection, seconds, failed in slowest
+        )
+        total = len(self.commands) + self.dropped_commands
+        return f"{phases or 'no phases'}; {total} commands" + (f" (slowest: {commands})" if commands else "")
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()},
+            "commands": [
+                {"command": command, "collection": collection, "duration_ms": round(seconds * 1000, 3),
+                 "failed": failed}
+                for command, collection, seconds, failed in self.commands
+            ],
+            "dropped_commands": self.dropped_commands,
+            "sampled": self.sampled,
+            "samples": sum(self.stacks.values()),
+            "folded": self.folded(),
+        }
+
+
+@contextmanager
+def phase(name: str):
+    """Add the time spent in the block to a phase of the current request"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_phase(name, time.perf_counter() - started)
+
+
+def _label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _fold(frame) -> str:
+    labels = []
+    while frame is not None and frame.f_code is not _HANDLE_RUN:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Samples the event loop thread's stack for every request being profiled
+
+    One daemon thread serves all sampled requests of the worker and exits
+    when none are left.
+    """
+
+    def __init__(self, interval_ms: float = PROFILING_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, trace: RequestTrace):
+        target = (asyncio.current_task(), asyncio.get_running_loop(), threading.get_ident())
+        with self._lock:
+            self._active[trace] = target
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+
+    def stop(self, trace: RequestTrace):
+        with self._lock:
+            self._active.pop(trace, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active.items())
+            frames = sys._current_frames()
+            running = {}
+            for trace, (task, loop, thread_id) in active:
+                if thread_id not in running:
+                    current = asyncio.current_task(loop)
+                    frame = frames.get(thread_id)
+                    running[thread_id] = (current, _fold(frame) if current is not None and frame else None)
+                current, stack = running[thread_id]
+                if current is task:
+                    trace.stacks[stack] += 1
+                elif current is None:
+                    trace.stacks[AWAITING_FRAME] += 1
+                else:
+                    trace.stacks[OTHER_TASKS_FRAME] += 1
+
+
+class ProfileStore:
+    """Ring buffer of the most recent sampled and slow requests"""
+
+    def __init__(self, size: int = PROFILING_BUFFER_SIZE):
+        self._traces = deque(maxlen=size)
+
+    def add(self, trace: RequestTrace):
+        self._traces.append(trace)
+
+    def recent(self, limit: int) -> list:
+        """Newest first"""
+        return list(self._traces)[::-1][:limit]
+
+
+sampler = StackSampler()
+profile_store = ProfileStore()
+
+
+class CommandProfiler(monitoring.CommandListener):
+    """Attributes every MongoDB command to the request that issued it"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        if _current.get() is None:
+            return
+        collection = event.command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = (
+            collection if isinstance(collection, str) else ""
+        )
+
+    def _record(self, event, failed: bool):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        trace = _current.get()
+        if trace is not None:
+            trace.add_command(event.command_name, collection, event.duration_micros / 1e6, failed)
+
+    def succeeded(self, event):
+        self._record(event, failed=False)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute that counts response validation and encoding as serialization"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        endpoint = self.dependant.call
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def timed_endpoint(*args, **kwargs):
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    trace = _current.get()
+                    if trace is not None:
+                        trace.endpoint_returned = time.perf_counter()
+
+            # The request handler built by APIRoute looks the call up on the dependant
+            self.dependant.call = timed_endpoint
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            trace = _current.get()
+            if trace is not None and trace.endpoint_returned is not None:
+                trace.add_phase("serialization", time.perf_counter() - trace.endpoint_returned)
+                trace.endpoint_returned = None
+            return response
+
+        return timed_handler
+
+
+def _requested(headers: list) -> bool:
+    if not PROFILING_TOKEN:
+        return False
+    for name, value in headers:
+        if name == PROFILE_HEADER:
+            return hmac.compare_digest(value, PROFILING_TOKEN.encode())
+    return False
+
+
+class ProfilingMiddleware:
+    """Traces API requests, samples the selected ones and captures slow ones"""
+
+    def __init__(self, app, exclude_paths: tuple = ()):
+        self.app = app
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (
+            not PROFILING_ENABLED or scope["type"] != "http" or not path.startswith("/api")
+            or path.startswith(self.exclude_paths)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        sampled = _requested(scope["headers"]) or random.random() < PROFILING_SAMPLE_RATE
+        trace = RequestTrace(scope["method"], path, sampled)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                if sampled:
+                    message["headers"] = [*message.get("headers", []), (PROFILE_ID_HEADER, trace.id.encode())]
+            await send(message)
+
+        token = _current.set(trace)
+        if sampled:
+            sampler.start(trace)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            trace.duration = time.perf_counter() - started
+            if sampled:
+                sampler.stop(trace)
+            _current.reset(token)
+            route = scope.get("route")
+            trace.route = getattr(route, "path", None)
+            self._capture(trace)
+
+    def _capture(self, trace: RequestTrace):
+        slow = trace.duration * 1000 >= SLOW_REQUEST_MS
+        if slow:
+            logger.warning(
+                f"Slow request {trace.method} {trace.path} ({trace.status}) took "
+                f"{trace.duration * 1000:.0f}ms: {trace.summary()} [profile {trace.id}]"
+            )
+        if slow or trace.sampled:
+            profile_store.add(trace)
@@ -0,0 +1,137 @@
+"""Token-bucket rate limiting for the public form endpoints.
+
+``RateLimitMiddleware`` limits the form routes per client IP before the
+request body is even parsed, and ``enforce_rate_limit`` lets handlers add
+per-email limits once the payload is validated. Buckets live in process
+memory by default; with ``RATE_LIMIT_BACKEND=mongo`` they are kept in the
+``rate_limits`` collection and refilled atomically with a pipeline update,
+so every uvicorn worker shares the same budget.
+"""
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory').lower()
+# Per client IP: burst size and tokens regained per hour
+RATE_LIMIT_IP_BURST = int(os.environ.get('RATE_LIMIT_IP_BURST', '10'))
+RATE_LIMIT_IP_PER_HOUR = float(os.environ.get('RATE_LIMIT_IP_PER_HOUR', '30'))
+# Per submitted email address
+RATE_LIMIT_EMAIL_BURST = int(os.environ.get('RATE_LIMIT_EMAIL_BURST', '3'))
+RATE_LIMIT_EMAIL_PER_HOUR = float(os.environ.get('RATE_LIMIT_EMAIL_PER_HOUR', '6'))
+RATE_LIMIT_MAX_KEYS = 10000
+
+# (method, path) pairs limited per client IP by the middleware
+RATE_LIMITED_ROUTES = {
+    ("POST", "/api/admissions/enquiry"),
+    ("POST", "/api/admission-enquiry"),
+    ("POST", "/api/contact/message"),
+    ("POST", "/api/contact"),
+}
+
+
+class MemoryTokenBuckets:
+    """Token buckets for one worker process, bounded to the most recent keys"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    async def take(self, key: str, burst: int, per_second: float):
+        """Take one token; returns (allowed, seconds until the next token)"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * per_second)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, 0 if allowed else (1 - tokens) / per_second
+
+
+class MongoTokenBuckets:
+    """Token buckets shared by every worker through a Mongo collection"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def take(self, key: str, burst: int, per_second: float):
+        now = datetime.utcnow()
+        refilled = {"$min": [burst, {"$add": [
+            {"$ifNull": ["$tokens", burst]},
+            {"$multiply": [{"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}, per_second]},
+        ]}]}
+        bucket = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": now}},
+                {"$set": {
+                    "allowed": {"$gte": ["$tokens", 1]},
+                    "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        allowed = bucket["allowed"]
+        return allowed, 0 if allowed else (1 - bucket["tokens"]) / per_second
+
+
+_buckets = MemoryTokenBuckets()
+
+
+def configure_rate_limits(db):
+    """Select the bucket store according to RATE_LIMIT_BACKEND"""
+    global _buckets
+    if RATE_LIMIT_BACKEND == "mongo":
+        _buckets = MongoTokenBuckets(db.rate_limits)
+    else:
+        _buckets = MemoryTokenBuckets()
+    logger.info(f"Rate limiting uses the {RATE_LIMIT_BACKEND} backend")
+
+
+async def enforce_rate_limit(key: str, burst: int = RATE_LIMIT_EMAIL_BURST,
+                             per_hour: float = RATE_LIMIT_EMAIL_PER_HOUR):
+    """Raise a 429 HTTPException when the bucket for key is empty"""
+    allowed, retry_after = await _buckets.take(key, burst, per_hour / 3600)
+    if not allowed:
+        logger.warning(f"Rate limit exceeded for {key}")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many submissions. Please try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+
+class RateLimitMiddleware:
+    """Per-IP token bucket in front of the public form routes"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and (scope["method"], scope["path"]) in RATE_LIMITED_ROUTES:
+            client_ip = scope["client"][0] if scope.get("client") else "unknown"
+            allowed, retry_after = await _buckets.take(
+                f"ip:{client_ip}", RATE_LIMIT_IP_BURST, RATE_LIMIT_IP_PER_HOUR / 3600
+            )
+            if not allowed:
+                logger.warning(f"Rate limit exceeded for ip:{client_ip} on {scope['path']}")
+                response = JSONResponse(
+                    {"detail": "Too many submissions. Please try again later."},
+                    status_code=429,
+                    headers={"Retry-After": str(math.ceil(retry_after))}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
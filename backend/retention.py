@@ -0,0 +1,195 @@
+"""Tiered retention for admission enquiries and contact messages.
+
+Records in a terminal status (``processed`` enquiries, ``responded``
+messages) older than ``RETENTION_*_DAYS`` are moved into
+``<collection>_archive`` collections, created with a stronger WiredTiger
+block compressor (``ARCHIVE_BLOCK_COMPRESSOR``, zstd by default), so list
+queries, sorts and indexes on the live collections only cover recent and
+open records.
+
+A background task started from the lifespan runs a pass every
+``RETENTION_INTERVAL_SECONDS``. A pass moves ``RETENTION_BATCH_SIZE``
+records at a time: upserting them into the archive with one unordered
+``bulk_write``, then deleting them from the live collection, and yields
+between batches so request handling never waits on it. Copies are
+upserts keyed by ``id``, so a pass interrupted between the two steps is
+simply finished by the next one. A lease in ``job_leases`` keeps
+concurrent workers from running passes at the same time.
+
+Spam is not archived: each pass deletes records marked ``spam`` once they
+are within two intervals of ``SPAM_RETENTION_DAYS``, before the partial TTL
+index (see ``indexes.py``) would, so the deletion is seen by the listing
+caches. The TTL index remains as a backstop, e.g. with retention disabled.
+
+Every batch moved or deleted bumps the matching response cache namespace,
+so cached listings and ETags never keep showing rows that are gone.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+
+from pymongo import ReplaceOne
+from pymongo.errors import CollectionInvalid, DuplicateKeyError
+
+from cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+RETENTION_ENABLED = os.environ.get('RETENTION_ENABLED', 'true').lower() == 'true'
+RETENTION_ENQUIRY_DAYS = int(os.environ.get('RETENTION_ENQUIRY_DAYS', '365'))
+RETENTION_MESSAGE_DAYS = int(os.environ.get('RETENTION_MESSAGE_DAYS', '180'))
+SPAM_RETENTION_DAYS = int(os.environ.get('SPAM_RETENTION_DAYS', '30'))
+RETENTION_INTERVAL_SECONDS = float(os.environ.get('RETENTION_INTERVAL_SECONDS', '3600'))
+RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', '500'))
+# Pause between batches so a large first pass doesn't monopolise the connection pool
+RETENTION_BATCH_PAUSE_SECONDS = 0.05
+RETENTION_LEASE_SECONDS = 600
+# Empty to leave archives on the server's default compressor
+ARCHIVE_BLOCK_COMPRESSOR = os.environ.get('ARCHIVE_BLOCK_COMPRESSOR', 'zstd')
+
+ARCHIVE_SUFFIX = "_archive"
+
+# Live collection -> (terminal statuses, age in days)
+RETENTION_POLICIES = {
+    "admission_enquiries": (("processed",), RETENTION_ENQUIRY_DAYS),
+    "contact_messages": (("responded",), RETENTION_MESSAGE_DAYS),
+}
+
+# Response cache namespace listing each collection
+CACHE_NAMESPACES = {"admission_enquiries": "enquiries", "contact_messages": "messages"}
+
+_db = None
+_runner = None
+
+
+def archive_name(collection_name: str) -> str:
+    return collection_name + ARCHIVE_SUFFIX
+
+
+async def ensure_archive_collections(db):
+    """Create the archive collections with the archive block compressor
+
+    Must run before their indexes are built, which would otherwise create
+    them implicitly with the server's default compressor.
+    """
+    if not ARCHIVE_BLOCK_COMPRESSOR:
+        return
+    existing = set(await db.list_collection_names())
+    for collection_name in RETENTION_POLICIES:
+        name = archive_name(collection_name)
+        if name in existing:
+            continue
+        try:
+            await db.create_collection(
+                name, storageEngine={"wiredTiger": {"configString": f"block_compressor={ARCHIVE_BLOCK_COMPRESSOR}"}}
+            )
+            logger.info(f"Created {name} with {ARCHIVE_BLOCK_COMPRESSOR} block compression")
+        except CollectionInvalid:
+            # Created by another worker meanwhile
+            pass
+
+
+async def _acquire_lease(db, now: datetime) -> bool:
+    try:
+        await db.job_leases.find_one_and_update(
+            {"_id": "retention", "locked_until": {"$lte": now}},
+            {"$set": {"locked_until": now + timedelta(seconds=RETENTION_LEASE_SECONDS)}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def _release_lease(db):
+    await db.job_leases.update_one({"_id": "retention"}, {"$set": {"locked_until": datetime.utcnow()}})
+
+
+async def archive_collection(db, collection_name: str, statuses: tuple, days: int) -> int:
+    """Move terminal records older than ``days`` into the archive, one batch at a time"""
+    collection, archive = db[collection_name], db[archive_name(collection_name)]
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    query = {"status": {"$in": list(statuses)}, "created_at": {"$lt": cutoff}}
+    moved = 0
+    while True:
+        batch = await collection.find(query).sort([("created_at", 1), ("id", 1)]).to_list(RETENTION_BATCH_SIZE)
+        if not batch:
+            break
+        archived_at = datetime.utcnow()
+        await archive.bulk_write(
+            [ReplaceOne({"id": doc["id"]}, {**doc, "archived_at": archived_at}, upsert=True) for doc in batch],
+            ordered=False,
+        )
+        # Re-check the filter so a record reopened meanwhile stays live
+        result = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}, **query})
+        moved += result.deleted_count
+        if result.deleted_count:
+            await response_cache.invalidate(CACHE_NAMESPACES[collection_name])
+        if len(batch) < RETENTION_BATCH_SIZE:
+            break
+        await asyncio.sleep(RETENTION_BATCH_PAUSE_SECONDS)
+    if moved:
+        logger.info(f"Archived {moved} {collection_name} older than {days} days")
+    return moved
+
+
+async def expire_spam(db, collection_name: str) -> int:
+    """Delete spam that the TTL index would delete before the next pass"""
+    cutoff = (
+        datetime.utcnow() - timedelta(days=SPAM_RETENTION_DAYS) + timedelta(seconds=2 * RETENTION_INTERVAL_SECONDS)
+    )
+    result = await db[collection_name].delete_many({"status": "spam", "status_updated_at": {"$lt": cutoff}})
+    if result.deleted_count:
+        await response_cache.invalidate(CACHE_NAMESPACES[collection_name])
+        logger.info(f"Deleted {result.deleted_count} {collection_name} marked as spam")
+    return result.deleted_count
+
+
+async def run_retention(db, force: bool = False) -> dict:
+    """One retention pass over every policy; None if another worker holds the lease"""
+    if not force and not await _acquire_lease(db, datetime.utcnow()):
+        return None
+    try:
+        archived = {}
+        for collection_name, (statuses, days) in RETENTION_POLICIES.items():
+            archived[collection_name] = await archive_collection(db, collection_name, statuses, days)
+            await expire_spam(db, collection_name)
+        return archived
+    finally:
+        if not force:
+            await _release_lease(db)
+
+
+async def _retention_loop():
+    while True:
+        try:
+            await run_retention(_db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Retention pass failed: {str(e)}")
+        await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+
+
+async def start_retention(db):
+    """Schedule retention passes"""
+    global _db, _runner
+    _db = db
+    if not RETENTION_ENABLED:
+        return
+    _runner = asyncio.create_task(_retention_loop())
+    logger.info(
+        f"Archiving processed enquiries after {RETENTION_ENQUIRY_DAYS} days and responded messages after "
+        f"{RETENTION_MESSAGE_DAYS} days; spam is deleted after {SPAM_RETENTION_DAYS} days"
+    )
+
+
+async def stop_retention():
+    """Stop scheduled passes; a batch in flight is finished by the next pass"""
+    global _runner
+    if _runner is None:
+        return
+    _runner.cancel()
+    await asyncio.gather(_runner, return_exceptions=True)
+    _runner = None
@@ -0,0 +1,85 @@
+"""Search over admission enquiries and contact messages.
+
+Free text is answered from a weighted text index (names weigh most, then
+subjects and email, then message bodies) and ranked by text score. Queries
+that look like a phone number or contain ``@`` become anchored prefix
+matches on the ``phone``/``email`` indexes instead. Both kinds of query
+use keyset pagination, so deep pages cost the same as the first one.
+"""
+import re
+from datetime import date, datetime, time, timedelta
+
+from pagination import encode_cursor, fetch_page, keyset_filter
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+# Text index weights per collection
+SEARCH_WEIGHTS = {
+    "admission_enquiries": {"student_name": 10, "parent_name": 10, "email": 4, "previous_school": 2, "message": 1},
+    "contact_messages": {"name": 10, "subject": 5, "email": 4, "message": 1},
+}
+
+_PHONE_QUERY = re.compile(r"^\+?[\d\s()-]+$")
+
+
+def classify_query(q: str) -> str:
+    """Which lookup a query needs: email, phone or text"""
+    if "@" in q:
+        return "email"
+    if _PHONE_QUERY.match(q) and sum(c.isdigit() for c in q) >= 3:
+        return "phone"
+    return "text"
+
+
+def search_filter(status: str = None, date_from: date = None, date_to: date = None) -> dict:
+    """Status and inclusive created_at date range filters"""
+    query = {}
+    if status:
+        query["status"] = status
+    if date_from or date_to:
+        created_at = {}
+        if date_from:
+            created_at["$gte"] = datetime.combine(date_from, time.min)
+        if date_to:
+            created_at["$lt"] = datetime.combine(date_to + timedelta(days=1), time.min)
+        query["created_at"] = created_at
+    return query
+
+
+async def _text_page(collection, q: str, query: dict, limit: int, after: str = None):
+    """One page of text matches ordered by relevance, then id"""
+    pipeline = [
+        {"$match": {"$text": {"$search": q}, **query}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+    ]
+    if after:
+        pipeline.append({"$match": keyset_filter("score", -1, after)})
+    pipeline += [
+        {"$sort": {"score": -1, "id": -1}},
+        {"$limit": limit + 1},
+        {"$project": {"_id": 0}},
+    ]
+    docs = await collection.aggregate(pipeline).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], "score")
+    return docs, next_cursor
+
+
+async def search_collection(collection, q: str, query: dict, limit: int = SEARCH_PAGE_SIZE, after: str = None):
+    """Return (match type, documents, next cursor) for a search query
+
+    Raises ValueError for a malformed cursor.
+    """
+    q = q.strip()
+    match = classify_query(q)
+    if match == "text":
+        docs, next_cursor = await _text_page(collection, q, query, limit, after)
+    else:
+        # Anchored, case-sensitive prefixes are answered from the index range alone
+        prefix = {match: {"$regex": f"^{re.escape(q)}"}}
+        docs, next_cursor = await fetch_page(collection, {**query, **prefix}, "created_at", -1, limit, after)
+    return match, docs, next_cursor
@@ -0,0 +1,23 @@
+"""Fast JSON serialization for trusted Mongo documents.
+
+List handlers read documents with ``_id`` projected out and native BSON
+datetimes, so the rows can be encoded with orjson directly instead of being
+re-validated through the Pydantic response model and ``jsonable_encoder``.
+"""
+import orjson
+from fastapi.responses import JSONResponse
+
+from profiling import phase
+
+
+def dumps(content) -> bytes:
+    """Encode plain dicts/lists with datetimes as ISO-8601 strings"""
+    with phase("serialization"):
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
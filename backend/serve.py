@@ -0,0 +1,102 @@
+"""Production launcher for the API.
+
+Runs ``server:app`` under uvicorn with uvloop and httptools when they are
+installed and a bounded graceful shutdown that lets in-flight uploads
+finish. ``X-Forwarded-For`` is only honoured from the proxies listed in
+``FORWARDED_ALLOW_IPS``, so per-IP rate limits see the real client address
+there and the peer address everywhere else; a client cannot pick its own.
+
+One worker runs unless ``WEB_CONCURRENCY`` asks for more. Several workers
+need the cross-worker backends: the admin feed follows a change stream and
+rate limits live in Mongo. They are selected automatically when
+``FEED_SOURCE`` and ``RATE_LIMIT_BACKEND`` are unset, and the launcher
+refuses to start when either is explicitly set to a process-local backend.
+Prometheus metrics are then aggregated through a shared directory.
+
+    python serve.py
+"""
+import importlib.util
+import logging
+import os
+import shutil
+import tempfile
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+HOST = os.environ.get('HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', '8000'))
+# Seconds in-flight requests get to finish after SIGTERM
+GRACEFUL_SHUTDOWN_SECONDS = int(os.environ.get('GRACEFUL_SHUTDOWN_SECONDS', '30'))
+KEEP_ALIVE_SECONDS = int(os.environ.get('KEEP_ALIVE_SECONDS', '5'))
+# Addresses or CIDRs of the hosting platform's proxy; empty ignores forwarded headers
+FORWARDED_ALLOW_IPS = os.environ.get('FORWARDED_ALLOW_IPS', '').strip()
+
+
+# Settings whose default only works inside one process: (variable, local value, shared value)
+PROCESS_LOCAL_SETTINGS = (
+    ("FEED_SOURCE", "local", "changestream"),
+    ("RATE_LIMIT_BACKEND", "memory", "mongo"),
+)
+
+
+def worker_count() -> int:
+    return max(1, int(os.environ.get('WEB_CONCURRENCY') or '1'))
+
+
+def use_shared_backends(workers: int):
+    """Point every worker at the cross-worker backends, or exit if configured otherwise"""
+    if workers == 1:
+        return
+    for name, local, shared in PROCESS_LOCAL_SETTINGS:
+        value = os.environ.get(name, '').lower()
+        if value == local:
+            raise SystemExit(
+                f"{name}={local} only works with one worker; set {name}={shared} or WEB_CONCURRENCY=1"
+            )
+        if not value:
+            # Workers inherit the environment, so this is what each of them reads on import
+            os.environ[name] = shared
+            logger.info(f"Using {name}={shared} for {workers} workers")
+
+
+def prepare_metrics_dir(workers: int):
+    """Give every worker the same, empty prometheus_client multiprocess directory"""
+    if workers == 1:
+        return
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR') or os.path.join(tempfile.gettempdir(), "reyansh-metrics")
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = path
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    workers = worker_count()
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    use_shared_backends(workers)
+    prepare_metrics_dir(workers)
+    if FORWARDED_ALLOW_IPS == "*":
+        logger.warning("FORWARDED_ALLOW_IPS=* lets any client set the address rate limits see")
+    elif not FORWARDED_ALLOW_IPS:
+        logger.info("FORWARDED_ALLOW_IPS is unset; X-Forwarded-For is ignored")
+    logger.info(f"Starting {workers} worker(s) on {HOST}:{PORT} with {loop} and {http}")
+
+    uvicorn.run(
+        "server:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        loop=loop,
+        http=http,
+        proxy_headers=bool(FORWARDED_ALLOW_IPS),
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS or None,
+        timeout_keep_alive=KEEP_ALIVE_SECONDS,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_SECONDS,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, APIRouter, UploadFile, File, Form, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from pathlib import Path
 import os
@@ -9,38 +9,161 @@ ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import logging
-import certifi
-from typing import List, Optional
-from datetime import datetime
-import uuid
-import shutil
+from typing import List, Literal, Optional
+from datetime import date
+from contextlib import asynccontextmanager
 
 from models import (
     AdmissionEnquiryCreate, AdmissionEnquiry,
     ContactMessageCreate, ContactMessage,
-    Photo, Event
+    Photo, EventCreate, Event,
+    BulkEnquiryStatusUpdate, BulkMessageStatusUpdate, EnquiryStatus, MessageStatus
+)
+from email_service import (
+    deliver_email, send_admission_enquiry_notification, send_contact_message_notification, render_digest
+)
+from digest import start_digest, stop_digest, flush_digests
+from retention import ensure_archive_collections, start_retention, stop_retention, run_retention
+from outbox import start_outbox, stop_outbox, outbox_stats, retry_dead
+from indexes import ensure_indexes, check_query_plans
+from images import SNIFF_BYTES, InvalidImageError, generate_variants, shutdown_image_pool, sniff_image_type
+from batch_upload import BatchTooLargeError, BatchUploadError, PhotoBatchReceiver
+from storage import (
+    UploadTooLargeError, GridFSFiles, GridFSStorage, create_storage, photo_url, sibling_relpath,
+    store_upload, release_blob
+)
+from static_files import APICompressionMiddleware, CachedStaticFiles, SPAStaticFiles
+from cache import response_cache, cached_json, current_etag, etag_matches, not_modified
+from serialization import ORJSONResponse
+from bulk import UnsupportedFormatError, bulk_insert, bulk_update_status
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, fetch_page, ndjson_response
+from search import SEARCH_PAGE_SIZE, MAX_SEARCH_PAGE_SIZE, search_collection, search_filter
+from exports import MEDIA_TYPES, export_filename, export_filter, export_stream
+from feed import (
+    event_stream, publish_local, publish_status_changes, start_feed, stop_feed, end_streams_on_shutdown_signal
+)
+from analytics import (
+    ROLLUP_DIMENSIONS, record_enquiries_created, record_status_changes,
+    daily_counts, admissions_summary, rebuild_admission_rollups
+)
+from ratelimit import RateLimitMiddleware, configure_rate_limits, enforce_rate_limit
+from idempotency import REPLAYED_HEADER, IdempotencyConflictError, idempotency_store, submission_key
+from metrics import MetricsMiddleware, MongoCommandMetrics, record_upload, render_metrics
+from profiling import PROFILING_BUFFER_SIZE, CommandProfiler, ProfiledRoute, ProfilingMiddleware, profile_store
+from database import create_client, warm_up
+from events import (
+    UPCOMING_DEFAULT_LIMIT, MAX_UPCOMING_LIMIT, CALENDAR_MAX_AGE_SECONDS,
+    calendar_feed, event_filter, upcoming_filter
 )
-from email_service import send_admission_enquiry_notification, send_contact_message_notification
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url, tlsCAFile=certifi.where())
-db = client[os.environ['DB_NAME']]
+# MongoDB connection, opened by the lifespan; tests and benchmarks may set db beforehand
+client = None
+db = None
 
 # Create uploads directory
+# Serve the React production build from this app as well (one container for the whole site)
+SERVE_FRONTEND = os.environ.get('SERVE_FRONTEND', 'false').lower() == 'true'
+FRONTEND_BUILD_DIR = Path(os.environ.get('FRONTEND_BUILD_DIR', str(ROOT_DIR.parent / "frontend" / "build")))
+
 UPLOAD_DIR = ROOT_DIR / "uploads" / "photos"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+# Local disk or GridFS, per PHOTO_STORAGE
+photo_storage = create_storage(UPLOAD_DIR)
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024  # 5MB
+
+# Accepted upload content types and the extension stored for each
+ALLOWED_IMAGE_TYPES = {
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+}
+
+def photo_from_blob(blob: dict, title: str, description: str, category: str) -> Photo:
+    """Photo document for a stored blob and its rendered variants"""
+    rendered = blob["rendered"]
+    return Photo(
+        title=title,
+        description=description,
+        category=category,
+        file_path=photo_storage.stored_path(blob["path"]),
+        file_url=photo_url(blob["path"]),
+        content_hash=blob["_id"],
+        width=rendered["width"],
+        height=rendered["height"],
+        variants={
+            name: {
+                "url": photo_url(sibling_relpath(blob["path"], variant["file"])),
+                "width": variant["width"], "height": variant["height"]
+            }
+            for name, variant in rendered["variants"].items()
+        },
+        placeholder=rendered["placeholder"]
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db
+    if db is None:
+        client = create_client(os.environ['MONGO_URL'], event_listeners=[MongoCommandMetrics(), CommandProfiler()])
+        db = client[os.environ['DB_NAME']]
+        await warm_up(client)
+    
+    # Build indexes and verify hot queries before accepting traffic
+    await ensure_archive_collections(db)
+    await ensure_indexes(db)
+    await check_query_plans(db)
+    # Share listing cache versions across workers
+    response_cache.bind(db.cache_versions)
+    photo_storage.bind(db)
+    # Share rate limits (when configured) and submission results across workers
+    configure_rate_limits(db)
+    idempotency_store.bind(db.idempotency_keys)
+    # Deliver queued notification emails in the background
+    await start_outbox(db.email_outbox, deliver_email)
+    await start_digest(db.notification_digest, render_digest)
+    # Archive old closed records in the background
+    await start_retention(db)
+    # Push new submissions to connected admin dashboards
+    start_feed(db)
+    end_streams_on_shutdown_signal()
+    
+    yield
+    
+    # uvicorn has already let in-flight requests such as uploads finish;
+    # now finish queued background work before closing the pool
+    await stop_feed()
+    await stop_digest()
+    await stop_retention()
+    await stop_outbox()
+    shutdown_image_pool()
+    if client is not None:
+        client.close()
 
 # Create the main app without a prefix
-app = FastAPI()
-
-# Mount uploads directory for serving files
-app.mount("/uploads", StaticFiles(directory=str(ROOT_DIR / "uploads")), name="uploads")
+app = FastAPI(lifespan=lifespan)
+
+# Mount uploads for serving files; upload names never change, so they are
+# served with strong ETags and immutable caching
+if isinstance(photo_storage, GridFSStorage):
+    app.mount("/uploads/photos", GridFSFiles(photo_storage), name="uploads")
+else:
+    app.mount(
+        "/uploads",
+        CachedStaticFiles(directory=str(ROOT_DIR / "uploads"), sendfile_root=str(ROOT_DIR / "uploads")),
+        name="uploads"
+    )
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=ProfiledRoute)
+
+# ========== METRICS ==========
+@api_router.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics in text exposition format"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 # ========== TEST ENDPOINTS ==========
 @api_router.get("/test-email")
@@ -61,67 +184,185 @@ async def test_email():
         logger.error(f"Error in test-email endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/email/outbox")
+async def get_email_outbox():
+    """Get delivery status counts and recent dead-lettered emails"""
+    try:
+        return await outbox_stats()
+    except Exception as e:
+        logger.error(f"Error fetching email outbox: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch email outbox")
 
+@api_router.post("/email/outbox/retry")
+async def retry_dead_emails():
+    """Requeue every dead-lettered email for delivery"""
+    try:
+        requeued = await retry_dead()
+        logger.info(f"Requeued {requeued} dead-lettered emails")
+        return {"success": True, "requeued": requeued}
+    except Exception as e:
+        logger.error(f"Error retrying dead emails: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retry dead emails")
+
+@api_router.post("/email/digest/flush")
+async def flush_notification_digests():
+    """Send every pending notification digest now instead of waiting for its window"""
+    try:
+        sent = await flush_digests(force=True)
+        return {"success": True, "digests": sent}
+    except Exception as e:
+        logger.error(f"Error flushing notification digests: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to flush notification digests")
+
+@api_router.post("/retention/run")
+async def run_retention_now():
+    """Archive old processed enquiries and responded messages now"""
+    try:
+        archived = await run_retention(db, force=True)
+        return {"success": True, "archived": archived}
+    except Exception as e:
+        logger.error(f"Error running retention: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to run retention")
+
+@api_router.get("/admin/profiles")
+async def list_profiles(
+    limit: int = Query(20, ge=1, le=PROFILING_BUFFER_SIZE),
+    format: Literal["json", "folded"] = "json"
+):
+    """Most recent sampled and slow requests of this worker, newest first"""
+    traces = profile_store.recent(limit)
+    if format == "folded":
+        # Concatenated stacks, ready for flamegraph.pl or speedscope
+        body = "\n".join(trace.folded() for trace in traces if trace.stacks)
+        return Response(content=body + "\n" if body else "", media_type="text/plain; charset=utf-8")
+    return ORJSONResponse([trace.to_dict() for trace in traces])
+
+
+# ========== ADMIN FEED ==========
+@api_router.get("/admin/feed")
+async def admin_feed(request: Request, last_event_id: Optional[str] = None):
+    """Stream new submissions and status changes as Server-Sent Events"""
+    # EventSource sends Last-Event-ID on reconnect; the query parameter is for polyfills
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        event_stream(resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # ========== ADMISSION ENQUIRIES ==========
 @api_router.post("/admissions/enquiry")
-async def create_admission_enquiry(enquiry: AdmissionEnquiryCreate):
+async def create_admission_enquiry(enquiry: AdmissionEnquiryCreate, request: Request, response: Response):
     try:
-        enquiry_obj = AdmissionEnquiry(**enquiry.dict())
-        enquiry_dict = enquiry_obj.dict()
-        
-        # Save to database
-        await db.admission_enquiries.insert_one(enquiry_dict)
-        
-        # Send email notification
-        await send_admission_enquiry_notification(enquiry_dict)
-        
-        logger.info(f"New admission enquiry from {enquiry.parent_name}")
-        return {
-            "success": True,
-            "message": "Admission enquiry submitted successfully! We will contact you soon.",
-            "enquiry_id": enquiry_obj.id
-        }
+        async def create():
+            await enforce_rate_limit(f"email:{enquiry.email.lower()}")
+            enquiry_obj = AdmissionEnquiry(**enquiry.dict())
+            enquiry_dict = enquiry_obj.dict()
+            
+            # Save to database
+            await db.admission_enquiries.insert_one(enquiry_dict)
+            await record_enquiries_created(db.admission_rollups, [enquiry_dict])
+            publish_local("enquiry.created", enquiry_dict)
+            await response_cache.invalidate("enquiries")
+            
+            # Send email notification
+            await send_admission_enquiry_notification(enquiry_dict)
+            
+            logger.info(f"New admission enquiry from {enquiry.parent_name}")
+            return {
+                "success": True,
+                "message": "Admission enquiry submitted successfully! We will contact you soon.",
+                "enquiry_id": enquiry_obj.id
+            }
+        
+        # A repeated submission gets the original answer instead of a second insert and email
+        result, replayed = await idempotency_store.run(submission_key("admissions/enquiry", request, enquiry), create)
+        if replayed:
+            response.headers[REPLAYED_HEADER] = "true"
+        return result
+    except HTTPException:
+        raise
+    except IdempotencyConflictError:
+        raise HTTPException(status_code=409, detail="This submission is still being processed.")
     except Exception as e:
         logger.error(f"Error creating admission enquiry: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/admissions/enquiries")
-async def get_admission_enquiries():
+async def get_admission_enquiries(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    response_format: Optional[str] = Query(None, alias="format")
+):
     try:
-        enquiries = await db.admission_enquiries.find().sort("created_at", -1).to_list(1000)
-        return {"enquiries": enquiries}
+        if response_format == "ndjson":
+            return ndjson_response(db.admission_enquiries, {}, "created_at", -1, after)
+        
+        async def build():
+            enquiries, next_cursor = await fetch_page(db.admission_enquiries, {}, "created_at", -1, limit, after)
+            return {"enquiries": enquiries, "next_cursor": next_cursor}
+        
+        return await cached_json("enquiries", request, build, cache=False)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching enquiries: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ========== CONTACT MESSAGES ==========
 @api_router.post("/contact/message")
-async def create_contact_message(message: ContactMessageCreate):
+async def create_contact_message(message: ContactMessageCreate, request: Request, response: Response):
     try:
-        message_obj = ContactMessage(**message.dict())
-        message_dict = message_obj.dict()
-        
-        # Save to database
-        await db.contact_messages.insert_one(message_dict)
-        
-        # Send email notification
-        await send_contact_message_notification(message_dict)
-        
-        logger.info(f"New contact message from {message.name}")
-        return {
-            "success": True,
-            "message": "Message sent successfully! We will get back to you soon."
-        }
+        async def create():
+            await enforce_rate_limit(f"email:{message.email.lower()}")
+            message_obj = ContactMessage(**message.dict())
+            message_dict = message_obj.dict()
+            
+            # Save to database
+            await db.contact_messages.insert_one(message_dict)
+            publish_local("message.created", message_dict)
+            await response_cache.invalidate("messages")
+            
+            # Send email notification
+            await send_contact_message_notification(message_dict)
+            
+            logger.info(f"New contact message from {message.name}")
+            return {
+                "success": True,
+                "message": "Message sent successfully! We will get back to you soon."
+            }
+        
+        result, replayed = await idempotency_store.run(submission_key("contact/message", request, message), create)
+        if replayed:
+            response.headers[REPLAYED_HEADER] = "true"
+        return result
+    except HTTPException:
+        raise
+    except IdempotencyConflictError:
+        raise HTTPException(status_code=409, detail="This submission is still being processed.")
     except Exception as e:
         logger.error(f"Error creating contact message: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/contact/messages")
-async def get_contact_messages():
+async def get_contact_messages(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    response_format: Optional[str] = Query(None, alias="format")
+):
     try:
-        messages = await db.contact_messages.find().sort("created_at", -1).to_list(1000)
-        return {"messages": messages}
+        if response_format == "ndjson":
+            return ndjson_response(db.contact_messages, {}, "created_at", -1, after)
+        
+        async def build():
+            messages, next_cursor = await fetch_page(db.contact_messages, {}, "created_at", -1, limit, after)
+            return {"messages": messages, "next_cursor": next_cursor}
+        
+        return await cached_json("messages", request, build, cache=False)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching messages: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -135,50 +376,36 @@ async def upload_photo(
     category: str = Form(...)
 ):
     try:
-        # Validate file type
-        allowed_types = ["image/jpeg", "image/jpg", "image/png", "image/webp"]
-        if file.content_type not in allowed_types:
+        # Validate file type from its leading bytes; the client's Content-Type is not trusted
+        content_type = sniff_image_type(await file.read(SNIFF_BYTES))
+        await file.seek(0)
+        if content_type not in ALLOWED_IMAGE_TYPES:
             raise HTTPException(status_code=400, detail="Invalid file type. Only JPG, PNG, and WebP are allowed.")
         
-        # Validate file size (5MB)
-        file_size = 0
-        chunk_size = 1024 * 1024  # 1MB
-        temp_file = f"/tmp/{file.filename}"
-        
-        with open(temp_file, "wb") as buffer:
-            while chunk := await file.read(chunk_size):
-                file_size += len(chunk)
-                if file_size > 5 * 1024 * 1024:  # 5MB
-                    os.remove(temp_file)
-                    raise HTTPException(status_code=400, detail="File size exceeds 5MB limit.")
-                buffer.write(chunk)
-        
-        # Generate unique filename
-        file_ext = Path(file.filename).suffix
-        unique_filename = f"{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}{file_ext}"
-        file_path = UPLOAD_DIR / unique_filename
-        
-        # Move file to uploads directory
-        shutil.move(temp_file, str(file_path))
-        
-        # Create photo object
-        file_url = f"/uploads/photos/{unique_filename}"
-        photo = Photo(
-            title=title,
-            description=description,
-            category=category,
-            file_path=str(file_path),
-            file_url=file_url
-        )
+        # Stream into content-addressed storage, hashing while writing, and
+        # render responsive WebP derivatives the first time a blob is seen
+        try:
+            blob = await store_upload(
+                db.photo_blobs, photo_storage, file, ALLOWED_IMAGE_TYPES[content_type], MAX_UPLOAD_BYTES,
+                generate_variants
+            )
+        except UploadTooLargeError:
+            raise HTTPException(status_code=400, detail="File size exceeds 5MB limit.")
+        except InvalidImageError:
+            raise HTTPException(status_code=400, detail="Uploaded file is not a valid image.")
+        record_upload(blob["size"])
+        photo = photo_from_blob(blob, title, description, category)
         
         # Save to database
         await db.school_photos.insert_one(photo.dict())
+        await response_cache.invalidate("photos")
         
         logger.info(f"Photo uploaded: {title}")
         return {
             "success": True,
             "photo_id": photo.id,
-            "url": file_url,
+            "url": photo.file_url,
+            "variants": photo.dict()["variants"],
             "message": "Photo uploaded successfully!"
         }
     except HTTPException:
@@ -187,15 +414,91 @@ async def upload_photo(
         logger.error(f"Error uploading photo: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/photos/upload/batch")
+async def upload_photo_batch(request: Request):
+    """Upload many photos in one multipart request
+
+    Form fields: one or more ``files``, ``category``, and optionally a
+    ``title`` (each file's name otherwise) and ``description`` shared by
+    every photo.
+    """
+    receiver = PhotoBatchReceiver(
+        db.photo_blobs, photo_storage, ALLOWED_IMAGE_TYPES, MAX_UPLOAD_BYTES, generate_variants
+    )
+    try:
+        try:
+            fields, files = await receiver.receive(request)
+        except BatchTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except BatchUploadError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        category = fields.get("category", "").strip()
+        if not category or not files:
+            await receiver.release_stored()
+            raise HTTPException(status_code=400, detail="A category and at least one file are required.")
+
+        photos, results = [], []
+        for item in files:
+            if item.blob is None:
+                results.append({"filename": item.filename, "success": False, "error": item.error})
+                continue
+            record_upload(item.blob["size"])
+            title = fields.get("title", "").strip() or Path(item.filename).stem
+            photo = photo_from_blob(item.blob, title, fields.get("description", ""), category)
+            photos.append(photo)
+            results.append({
+                "filename": item.filename,
+                "success": True,
+                "photo_id": photo.id,
+                "url": photo.file_url,
+                "variants": photo.dict()["variants"],
+            })
+
+        if photos:
+            try:
+                await db.school_photos.insert_many([photo.dict() for photo in photos])
+            except Exception:
+                await receiver.release_stored()
+                raise
+            await response_cache.invalidate("photos")
+
+        logger.info(f"Batch upload to {category}: {len(photos)} stored, {len(files) - len(photos)} rejected")
+        return {
+            "success": bool(photos),
+            "uploaded": len(photos),
+            "failed": len(files) - len(photos),
+            "results": results,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error uploading photo batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to upload photos")
+
 @api_router.get("/photos")
-async def get_photos(category: Optional[str] = None):
+async def get_photos(
+    request: Request,
+    category: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    response_format: Optional[str] = Query(None, alias="format")
+):
     try:
         query = {"is_active": True}
         if category:
             query["category"] = category
         
-        photos = await db.school_photos.find(query).sort("uploaded_at", -1).to_list(1000)
-        return {"photos": photos}
+        if response_format == "ndjson":
+            return ndjson_response(db.school_photos, query, "uploaded_at", -1, after)
+        
+        async def build():
+            photos, next_cursor = await fetch_page(db.school_photos, query, "uploaded_at", -1, limit, after)
+            return {"photos": photos, "next_cursor": next_cursor}
+        
+        return await cached_json("photos", request, build)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching photos: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -216,14 +519,18 @@ async def get_photo(photo_id: str):
 @api_router.delete("/photos/{photo_id}")
 async def delete_photo(photo_id: str):
     try:
-        result = await db.school_photos.update_one(
-            {"id": photo_id},
+        photo = await db.school_photos.find_one_and_update(
+            {"id": photo_id, "is_active": True},
             {"$set": {"is_active": False}}
         )
         
-        if result.modified_count == 0:
+        if photo is None:
             raise HTTPException(status_code=404, detail="Photo not found")
         
+        # Free the stored file once no active photo references it
+        await release_blob(db.photo_blobs, photo.get("content_hash"), photo_storage)
+        await response_cache.invalidate("photos")
+        
         logger.info(f"Photo deleted: {photo_id}")
         return {"success": True, "message": "Photo deleted successfully"}
     except HTTPException:
@@ -234,14 +541,63 @@ async def delete_photo(photo_id: str):
 
 # ========== EVENTS ==========
 @api_router.get("/events")
-async def get_events():
+async def get_events(
+    request: Request,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    category: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    response_format: Optional[str] = Query(None, alias="format")
+):
     try:
-        events = await db.events.find().sort("date", 1).to_list(1000)
-        return {"events": events}
+        query = event_filter(date_from, date_to, category)
+        if response_format == "ndjson":
+            return ndjson_response(db.events, query, "starts_at", 1, after)
+        
+        async def build():
+            events, next_cursor = await fetch_page(db.events, query, "starts_at", 1, limit, after)
+            return {"events": events, "next_cursor": next_cursor}
+        
+        return await cached_json("events", request, build)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching events: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/events/upcoming")
+async def get_upcoming_events(
+    category: Optional[str] = None,
+    limit: int = Query(UPCOMING_DEFAULT_LIMIT, ge=1, le=MAX_UPCOMING_LIMIT)
+):
+    """The next few events, for the homepage"""
+    try:
+        events, _ = await fetch_page(db.events, upcoming_filter(category), "starts_at", 1, limit)
+        # "Upcoming" moves with the clock as well as with writes, so version ETags don't apply
+        return ORJSONResponse({"events": events}, headers={"Cache-Control": "public, max-age=60"})
+    except Exception as e:
+        logger.error(f"Error fetching upcoming events: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/events/calendar.ics")
+async def get_events_calendar(request: Request):
+    """Subscribable iCalendar feed of recent and future events"""
+    try:
+        version = await response_cache.version("events")
+        body, etag = await calendar_feed.get(db.events, version)
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={CALENDAR_MAX_AGE_SECONDS}"}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(
+            content=body,
+            media_type="text/calendar; charset=utf-8",
+            headers={**headers, "Content-Disposition": 'inline; filename="events.ics"'}
+        )
+    except Exception as e:
+        logger.error(f"Error rendering events calendar: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to render events calendar")
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -256,174 +612,304 @@ async def root():
 
 # Admission Enquiry Endpoints
 @api_router.post("/admission-enquiry", response_model=AdmissionEnquiry)
-async def create_admission_enquiry(enquiry: AdmissionEnquiryCreate):
+async def create_admission_enquiry(enquiry: AdmissionEnquiryCreate, request: Request, response: Response):
     """Create a new admission enquiry"""
     try:
-        enquiry_dict = enquiry.model_dump()
-        enquiry_obj = AdmissionEnquiry(**enquiry_dict)
-        
-        # Convert to dict for MongoDB
-        doc = enquiry_obj.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        
-        # Insert into database
-        _ = await db.admission_enquiries.insert_one(doc)
-        logger.info(f"Created admission enquiry with ID: {enquiry_obj.id}")
-        
-        # Send notification email
-        await send_admission_enquiry_notification(doc)
-        
-        return enquiry_obj
+        async def create():
+            await enforce_rate_limit(f"email:{enquiry.email.lower()}")
+            enquiry_dict = enquiry.model_dump()
+            enquiry_obj = AdmissionEnquiry(**enquiry_dict)
+            
+            # Convert to dict for MongoDB
+            doc = enquiry_obj.model_dump()
+            
+            # Insert into database
+            _ = await db.admission_enquiries.insert_one(doc)
+            await record_enquiries_created(db.admission_rollups, [doc])
+            publish_local("enquiry.created", doc)
+            await response_cache.invalidate("enquiries")
+            logger.info(f"Created admission enquiry with ID: {enquiry_obj.id}")
+            
+            # Send notification email
+            await send_admission_enquiry_notification(doc)
+            
+            return enquiry_obj.model_dump(mode="json")
+        
+        result, replayed = await idempotency_store.run(submission_key("admission-enquiry", request, enquiry), create)
+        if replayed:
+            response.headers[REPLAYED_HEADER] = "true"
+        return result
+    except HTTPException:
+        raise
+    except IdempotencyConflictError:
+        raise HTTPException(status_code=409, detail="This submission is still being processed.")
     except Exception as e:
         logger.error(f"Error creating admission enquiry: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to create admission enquiry")
 
 @api_router.get("/admission-enquiry", response_model=List[AdmissionEnquiry])
-async def get_admission_enquiries():
-    """Get all admission enquiries"""
+async def get_admission_enquiries(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    """Get a page of admission enquiries, newest first"""
     try:
-        enquiries = await db.admission_enquiries.find({}, {"_id": 0}).to_list(1000)
-        
-        # Convert ISO string timestamps back to datetime objects
-        for enquiry in enquiries:
-            if isinstance(enquiry['created_at'], str):
-                enquiry['created_at'] = datetime.fromisoformat(enquiry['created_at'])
-        
-        return enquiries
+        etag = await current_etag("enquiries", request)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        
+        enquiries, next_cursor = await fetch_page(db.admission_enquiries, {}, "created_at", -1, limit, after)
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        
+        # Rows come straight from our own inserts, so skip response_model re-validation
+        return ORJSONResponse(enquiries, headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching admission enquiries: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch admission enquiries")
 
+@api_router.get("/admission-enquiry/search")
+async def search_admission_enquiries(
+    q: str = Query(..., min_length=1, max_length=200),
+    status: Optional[EnquiryStatus] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    """Search admission enquiries by name or message text, or by phone/email prefix"""
+    try:
+        match, results, next_cursor = await search_collection(
+            db.admission_enquiries, q, search_filter(status, date_from, date_to), limit, after
+        )
+        return ORJSONResponse({"match": match, "results": results, "next_cursor": next_cursor})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error searching admission enquiries: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to search admission enquiries")
+
+@api_router.get("/admission-enquiry/export")
+async def export_admission_enquiries(
+    export_format: Literal["csv", "xlsx"] = Query("csv", alias="format"),
+    status: Optional[EnquiryStatus] = None,
+    grade: Optional[str] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    include_archived: bool = False
+):
+    """Download admission enquiries as CSV or XLSX, streamed straight from the cursor"""
+    try:
+        query = export_filter(status, grade, date_from, date_to)
+        return StreamingResponse(
+            export_stream(db, "admission_enquiries", export_format, query, include_archived),
+            media_type=MEDIA_TYPES[export_format],
+            headers={"Content-Disposition": f'attachment; filename="{export_filename("enquiries", export_format)}"'}
+        )
+    except Exception as e:
+        logger.error(f"Error exporting admission enquiries: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to export admission enquiries")
+
+@api_router.post("/admission-enquiry/bulk")
+async def bulk_import_admission_enquiries(file: UploadFile = File(...)):
+    """Import admission enquiries from a CSV or NDJSON file without sending notification emails"""
+    try:
+        def build(row):
+            enquiry = AdmissionEnquiryCreate.model_validate(row)
+            return AdmissionEnquiry(**enquiry.model_dump(), source="import").model_dump()
+        
+        async def after_insert(docs):
+            await record_enquiries_created(db.admission_rollups, docs)
+        
+        result = await bulk_insert(db.admission_enquiries, file, build, after_insert=after_insert)
+        if result["inserted"]:
+            await response_cache.invalidate("enquiries")
+            publish_local("enquiry.imported", {"inserted": result["inserted"]})
+        return result
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error importing admission enquiries: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to import admission enquiries")
+
+@api_router.patch("/admission-enquiry/status")
+async def bulk_update_admission_enquiry_status(payload: BulkEnquiryStatusUpdate):
+    """Update the status of many admission enquiries at once"""
+    try:
+        result = await bulk_update_status(
+            db.admission_enquiries, payload.updates, fields=("grade", "source", "created_at")
+        )
+        previous = result.pop("previous")
+        publish_status_changes("enquiry", previous, payload.updates)
+        await record_status_changes(db.admission_rollups, previous, payload.updates)
+        if result["modified"]:
+            await response_cache.invalidate("enquiries")
+        return result
+    except Exception as e:
+        logger.error(f"Error updating admission enquiry statuses: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to update admission enquiry statuses")
+
+# Admissions Analytics Endpoints
+@api_router.get("/analytics/admissions/daily")
+async def get_daily_admissions(
+    group_by: List[str] = Query([]),
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to")
+):
+    """Enquiries created per day, optionally split by grade, status and/or source"""
+    try:
+        unknown = [dimension for dimension in group_by if dimension not in ROLLUP_DIMENSIONS]
+        if unknown:
+            raise HTTPException(
+                status_code=400, detail=f"group_by must be one of: {', '.join(ROLLUP_DIMENSIONS)}"
+            )
+        return ORJSONResponse(await daily_counts(db.admission_rollups, group_by, date_from, date_to))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching daily admissions: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch daily admissions")
+
+@api_router.get("/analytics/admissions/summary")
+async def get_admissions_summary(
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to")
+):
+    """Enquiry totals by grade, status and source plus the conversion rate"""
+    try:
+        return await admissions_summary(db.admission_rollups, date_from, date_to)
+    except Exception as e:
+        logger.error(f"Error fetching admissions summary: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch admissions summary")
+
+@api_router.post("/analytics/admissions/rebuild")
+async def rebuild_admissions_analytics():
+    """Recompute the admissions rollups from every enquiry"""
+    try:
+        rows = await rebuild_admission_rollups(db)
+        return {"success": True, "rows": rows}
+    except Exception as e:
+        logger.error(f"Error rebuilding admissions rollups: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to rebuild admissions rollups")
+
 # Contact Message Endpoints
 @api_router.post("/contact", response_model=ContactMessage)
-async def create_contact_message(message: ContactMessageCreate):
+async def create_contact_message(message: ContactMessageCreate, request: Request, response: Response):
     """Create a new contact message"""
     try:
-        message_dict = message.model_dump()
-        message_obj = ContactMessage(**message_dict)
-        
-        # Convert to dict for MongoDB
-        doc = message_obj.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        
-        # Insert into database
-        _ = await db.contact_messages.insert_one(doc)
-        logger.info(f"Created contact message with ID: {message_obj.id}")
-        
-        # Send notification email
-        await send_contact_message_notification(doc)
-        
-        return message_obj
+        async def create():
+            await enforce_rate_limit(f"email:{message.email.lower()}")
+            message_dict = message.model_dump()
+            message_obj = ContactMessage(**message_dict)
+            
+            # Convert to dict for MongoDB
+            doc = message_obj.model_dump()
+            
+            # Insert into database
+            _ = await db.contact_messages.insert_one(doc)
+            publish_local("message.created", doc)
+            await response_cache.invalidate("messages")
+            logger.info(f"Created contact message with ID: {message_obj.id}")
+            
+            # Send notification email
+            await send_contact_message_notification(doc)
+            
+            return message_obj.model_dump(mode="json")
+        
+        result, replayed = await idempotency_store.run(submission_key("contact", request, message), create)
+        if replayed:
+            response.headers[REPLAYED_HEADER] = "true"
+        return result
+    except HTTPException:
+        raise
+    except IdempotencyConflictError:
+        raise HTTPException(status_code=409, detail="This submission is still being processed.")
     except Exception as e:
         logger.error(f"Error creating contact message: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to create contact message")
 
 @api_router.get("/contact", response_model=List[ContactMessage])
-async def get_contact_messages():
-    """Get all contact messages"""
+async def get_contact_messages(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    """Get a page of contact messages, newest first"""
     try:
-        messages = await db.contact_messages.find({}, {"_id": 0}).to_list(1000)
-        
-        # Convert ISO string timestamps back to datetime objects
-        for message in messages:
-            if isinstance(message['created_at'], str):
-                message['created_at'] = datetime.fromisoformat(message['created_at'])
-        
-        return messages
+        etag = await current_etag("messages", request)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        
+        messages, next_cursor = await fetch_page(db.contact_messages, {}, "created_at", -1, limit, after)
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        
+        # Rows come straight from our own inserts, so skip response_model re-validation
+        return ORJSONResponse(messages, headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching contact messages: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch contact messages")
 
-# Photo Gallery Endpoints
-@api_router.post("/photos/upload")
-async def upload_photo(
-    file: UploadFile = File(...),
-    title: str = Form(...),
-    description: str = Form(""),
-    category: str = Form(...)
+@api_router.get("/contact/search")
+async def search_contact_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    status: Optional[MessageStatus] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    after: Optional[str] = None
 ):
-    """Upload a new photo to the gallery"""
-    try:
-        # Validate file type
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Generate unique filename
-        file_extension = file.filename.split('.')[-1]
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-        file_path = UPLOAD_DIR / unique_filename
-        
-        # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Create photo object
-        photo_data = {
-            "title": title,
-            "description": description,
-            "category": category,
-            "file_path": str(file_path),
-            "file_url": f"/uploads/photos/{unique_filename}"
-        }
-        
-        photo_obj = Photo(**photo_data)
-        
-        # Convert to dict for MongoDB
-        doc = photo_obj.model_dump()
-        doc['uploaded_at'] = doc['uploaded_at'].isoformat()
-        
-        # Insert into database
-        _ = await db.photos.insert_one(doc)
-        logger.info(f"Uploaded photo with ID: {photo_obj.id}")
-        
-        return photo_obj
+    """Search contact messages by name, subject or message text, or by phone/email prefix"""
+    try:
+        match, results, next_cursor = await search_collection(
+            db.contact_messages, q, search_filter(status, date_from, date_to), limit, after
+        )
+        return ORJSONResponse({"match": match, "results": results, "next_cursor": next_cursor})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error uploading photo: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to upload photo")
-
-@api_router.get("/photos", response_model=List[Photo])
-async def get_photos(category: Optional[str] = None):
-    """Get all photos or photos by category"""
+        logger.error(f"Error searching contact messages: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to search contact messages")
+
+@api_router.get("/contact/export")
+async def export_contact_messages(
+    export_format: Literal["csv", "xlsx"] = Query("csv", alias="format"),
+    status: Optional[MessageStatus] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    include_archived: bool = False
+):
+    """Download contact messages as CSV or XLSX, streamed straight from the cursor"""
     try:
-        query = {"is_active": True}
-        if category:
-            query["category"] = category
-        
-        photos = await db.photos.find(query, {"_id": 0}).to_list(1000)
-        
-        # Convert ISO string timestamps back to datetime objects
-        for photo in photos:
-            if isinstance(photo['uploaded_at'], str):
-                photo['uploaded_at'] = datetime.fromisoformat(photo['uploaded_at'])
-        
-        return photos
+        query = export_filter(status, None, date_from, date_to)
+        return StreamingResponse(
+            export_stream(db, "contact_messages", export_format, query, include_archived),
+            media_type=MEDIA_TYPES[export_format],
+            headers={"Content-Disposition": f'attachment; filename="{export_filename("messages", export_format)}"'}
+        )
     except Exception as e:
-        logger.error(f"Error fetching photos: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to fetch photos")
+        logger.error(f"Error exporting contact messages: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to export contact messages")
 
-@api_router.delete("/photos/{photo_id}")
-async def delete_photo(photo_id: str):
-    """Delete a photo from the gallery"""
+@api_router.patch("/contact/status")
+async def bulk_update_contact_message_status(payload: BulkMessageStatusUpdate):
+    """Update the status of many contact messages at once"""
     try:
-        # Find the photo
-        photo = await db.photos.find_one({"id": photo_id}, {"_id": 0})
-        if not photo:
-            raise HTTPException(status_code=404, detail="Photo not found")
-        
-        # Mark as inactive instead of deleting
-        result = await db.photos.update_one(
-            {"id": photo_id},
-            {"$set": {"is_active": False}}
-        )
-        
-        if result.modified_count == 0:
-            raise HTTPException(status_code=404, detail="Photo not found")
-        
-        logger.info(f"Deleted photo with ID: {photo_id}")
-        return {"message": "Photo deleted successfully"}
+        result = await bulk_update_status(db.contact_messages, payload.updates)
+        publish_status_changes("message", result.pop("previous"), payload.updates)
+        if result["modified"]:
+            await response_cache.invalidate("messages")
+        return result
     except Exception as e:
-        logger.error(f"Error deleting photo: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to delete photo")
+        logger.error(f"Error updating contact message statuses: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to update contact message statuses")
 
 # Events Endpoints
 @api_router.post("/events", response_model=Event)
@@ -432,10 +918,10 @@ async def create_event(event: Event):
     try:
         # Convert to dict for MongoDB
         doc = event.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
         
         # Insert into database
         _ = await db.events.insert_one(doc)
+        await response_cache.invalidate("events")
         logger.info(f"Created event with ID: {event.id}")
         
         return event
@@ -443,21 +929,22 @@ async def create_event(event: Event):
         logger.error(f"Error creating event: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to create event")
 
-@api_router.get("/events", response_model=List[Event])
-async def get_events():
-    """Get all events"""
+@api_router.post("/events/bulk")
+async def bulk_import_events(file: UploadFile = File(...)):
+    """Import a term's events from a CSV or NDJSON file"""
     try:
-        events = await db.events.find({}, {"_id": 0}).to_list(1000)
-        
-        # Convert ISO string timestamps back to datetime objects
-        for event in events:
-            if isinstance(event['created_at'], str):
-                event['created_at'] = datetime.fromisoformat(event['created_at'])
-        
-        return events
+        def build(row):
+            return Event(**EventCreate.model_validate(row).model_dump()).model_dump()
+        
+        result = await bulk_insert(db.events, file, build)
+        if result["inserted"]:
+            await response_cache.invalidate("events")
+        return result
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error fetching events: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to fetch events")
+        logger.error(f"Error importing events: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to import events")
 
 @api_router.put("/events/{event_id}", response_model=Event)
 async def update_event(event_id: str, event_update: Event):
@@ -465,7 +952,6 @@ async def update_event(event_id: str, event_update: Event):
     try:
         # Convert to dict for MongoDB
         doc = event_update.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
         
         # Update in database
         result = await db.events.update_one(
@@ -475,6 +961,7 @@ async def update_event(event_id: str, event_update: Event):
         
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Event not found")
+        await response_cache.invalidate("events")
         
         logger.info(f"Updated event with ID: {event_id}")
         return event_update
@@ -490,6 +977,7 @@ async def delete_event(event_id: str):
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Event not found")
+        await response_cache.invalidate("events")
         
         logger.info(f"Deleted event with ID: {event_id}")
         return {"message": "Event deleted successfully"}
@@ -500,14 +988,30 @@ async def delete_event(event_id: str):
 # Include the router in the main app
 app.include_router(api_router)
 
+# Registered last so API routes and uploads take precedence over the SPA fallback
+if SERVE_FRONTEND:
+    if (FRONTEND_BUILD_DIR / "index.html").is_file():
+        app.mount("/", SPAStaticFiles(directory=str(FRONTEND_BUILD_DIR)), name="frontend")
+    else:
+        logger.warning(f"SERVE_FRONTEND is set but {FRONTEND_BUILD_DIR} has no index.html; run yarn build")
+
+# Per-IP limits on the public forms; added before CORS so 429s still carry CORS headers
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After", REPLAYED_HEADER],
 )
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+# Compress large API payloads such as list pages; the admin feed must not be buffered
+app.add_middleware(APICompressionMiddleware, exclude_paths=("/api/admin/feed",))
+
+# Phase timings, sampled stacks and slow-request capture; streams would always look slow
+app.add_middleware(ProfilingMiddleware, exclude_paths=("/api/admin/feed", "/api/admin/profiles"))
+
+# Outermost, so rejected and CORS preflight requests are measured too
+app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,225 @@
+"""Cache-friendly static file serving.
+
+``CachedStaticFiles`` extends Starlette's ``StaticFiles`` with strong ETags,
+long-lived ``Cache-Control`` for immutable files and precompressed
+``.br``/``.gz`` sidecars for text-like assets. Range requests and
+``If-None-Match`` are answered by ``FileResponse``/``StaticFiles`` using the
+ETag set here. Large files can be handed to a fronting proxy (nginx
+``X-Accel-Redirect`` or ``X-Sendfile``) so the kernel sends them with
+zero-copy ``sendfile`` instead of streaming them through Python.
+
+``SPAStaticFiles`` serves the React production build: fingerprinted
+assets under ``static/`` are immutable, everything else revalidates, and
+unknown paths fall back to ``index.html`` for client-side routes. Writing
+the Brotli/gzip sidecars is a backend deploy step, run after ``yarn build``
+(``python static_files.py ../frontend/build``), so the frontend build never
+needs Python. API responses are compressed on the fly by
+``APICompressionMiddleware`` instead.
+"""
+import gzip
+import logging
+import os
+import re
+import shutil
+from mimetypes import guess_type
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:  # Brotli sidecars are optional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Hand files of at least this size to the proxy named by SENDFILE_HEADER
+SENDFILE_HEADER = os.environ.get('SENDFILE_HEADER', '')
+SENDFILE_PREFIX = os.environ.get('SENDFILE_PREFIX', '/protected-uploads')
+SENDFILE_MIN_BYTES = int(os.environ.get('SENDFILE_MIN_BYTES', str(256 * 1024)))
+
+# Dynamic gzip for API responses at least this large
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', '6'))
+
+# Sidecar extension for each supported content coding, in preference order
+SIDECAR_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+COMPRESSIBLE_MIN_BYTES = 1024
+_CONTENT_HASH = re.compile(r"^[0-9a-f]{64}")
+
+
+def _accepted_encodings(headers: Headers) -> set:
+    accepted = set()
+    for part in headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            accepted.add(coding.lower())
+    return accepted
+
+
+def is_compressible(media_type: str) -> bool:
+    """Whether a media type benefits from gzip/Brotli (images are already compressed)"""
+    return not media_type.startswith(("image/", "video/", "audio/")) and media_type not in (
+        "application/zip", "application/gzip", "font/woff", "font/woff2"
+    )
+
+
+def precompress_file(path: Path) -> list:
+    """Write .gz (and .br when Brotli is installed) sidecars next to a file"""
+    written = []
+    data = path.read_bytes()
+    if len(data) < COMPRESSIBLE_MIN_BYTES:
+        return written
+
+    gz_path = path.with_name(path.name + ".gz")
+    with open(path, "rb") as source, gzip.open(gz_path, "wb", compresslevel=9) as target:
+        shutil.copyfileobj(source, target)
+    written.append(gz_path)
+
+    if brotli is not None:
+        br_path = path.with_name(path.name + ".br")
+        br_path.write_bytes(brotli.compress(data, quality=11))
+        written.append(br_path)
+    return written
+
+
+def strong_etag(full_path: str, stat_result: os.stat_result, encoding: str = None) -> str:
+    """Content hash for content-addressed files, size and mtime otherwise"""
+    name = os.path.basename(full_path)
+    match = _CONTENT_HASH.match(name)
+    if match:
+        tag = name.rsplit(".", 1)[0]
+    else:
+        tag = f"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"
+    if encoding:
+        tag = f"{tag}-{encoding}"
+    return f'"{tag}"'
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with strong ETags, configurable caching and precompressed sidecars"""
+
+    def __init__(self, *args, cache_control=IMMUTABLE_CACHE_CONTROL, sendfile_root: str = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Either a fixed header value or a callable taking the file path
+        self.cache_control = cache_control
+        self.sendfile_root = sendfile_root
+
+    def lookup_path(self, path: str):
+        # Never expose temporary or hidden files such as in-progress uploads
+        if any(part.startswith(".") for part in Path(path).parts):
+            return "", None
+        return super().lookup_path(path)
+
+    def _cache_control_for(self, full_path: str) -> str:
+        if callable(self.cache_control):
+            return self.cache_control(full_path)
+        return self.cache_control
+
+    def _sidecar(self, full_path: str, request_headers: Headers):
+        accepted = _accepted_encodings(request_headers)
+        for encoding, suffix in SIDECAR_ENCODINGS:
+            if encoding in accepted:
+                try:
+                    return full_path + suffix, encoding, os.stat(full_path + suffix)
+                except FileNotFoundError:
+                    continue
+        return None
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        media_type = guess_type(full_path)[0] or "application/octet-stream"
+
+        served_path, encoding = full_path, None
+        headers = {"cache-control": self._cache_control_for(full_path)}
+        if is_compressible(media_type):
+            headers["vary"] = "Accept-Encoding"
+            sidecar = self._sidecar(full_path, request_headers)
+            if sidecar:
+                served_path, encoding, stat_result = sidecar
+                headers["content-encoding"] = encoding
+        headers["etag"] = strong_etag(full_path, stat_result, encoding)
+
+        response = FileResponse(
+            served_path, status_code=status_code, stat_result=stat_result, media_type=media_type, headers=headers
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        if SENDFILE_HEADER and self.sendfile_root and stat_result.st_size >= SENDFILE_MIN_BYTES:
+            relative = os.path.relpath(served_path, self.sendfile_root).replace(os.sep, "/")
+            headers[SENDFILE_HEADER] = f"{SENDFILE_PREFIX}/{relative}"
+            return Response(status_code=status_code, headers=headers, media_type=media_type)
+        return response
+
+
+class SPAStaticFiles(CachedStaticFiles):
+    """A single-page app build with index.html as the fallback for client-side routes"""
+
+    def __init__(self, *, directory: str, reserved_prefixes: tuple = ("api/", "uploads/"), **kwargs):
+        super().__init__(directory=directory, html=True, cache_control=self._build_cache_control, **kwargs)
+        self.build_root = os.path.realpath(directory)
+        # Unknown API and upload paths must stay 404s rather than return the app shell
+        self.reserved_prefixes = reserved_prefixes
+
+    def _build_cache_control(self, full_path: str) -> str:
+        # CRA fingerprints everything under static/; index.html, the manifest and icons keep their names
+        relative = os.path.relpath(os.path.realpath(full_path), self.build_root).replace(os.sep, "/")
+        return IMMUTABLE_CACHE_CONTROL if relative.startswith("static/") else REVALIDATE_CACHE_CONTROL
+
+    async def get_response(self, path: str, scope) -> Response:
+        try:
+            return await super().get_response(path, scope)
+        except HTTPException as exc:
+            route = path.lstrip("/")
+            # Paths with an extension are missing files, not routes
+            if exc.status_code != 404 or route.startswith(self.reserved_prefixes) or "." in route.rsplit("/", 1)[-1]:
+                raise
+        return await super().get_response("index.html", scope)
+
+
+class APICompressionMiddleware(GZipMiddleware):
+    """gzip for API responses above a size threshold; static files carry precompressed sidecars"""
+
+    def __init__(self, app, prefix: str = "/api", exclude_paths: tuple = (),
+                 minimum_size: int = COMPRESSION_MIN_BYTES, compresslevel: int = COMPRESSION_LEVEL):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.prefix = prefix
+        # Streams that must be flushed event by event, such as Server-Sent Events
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(self.prefix) or path in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+def precompress_tree(root: Path) -> int:
+    """Write sidecars for every compressible file under a directory"""
+    count = 0
+    for path in root.rglob("*"):
+        if not path.is_file() or path.suffix in (".gz", ".br"):
+            continue
+        media_type = guess_type(str(path))[0] or "application/octet-stream"
+        if is_compressible(media_type):
+            count += len(precompress_file(path))
+    return count
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    for directory in sys.argv[1:]:
+        written = precompress_tree(Path(directory))
+        logger.info(f"Wrote {written} precompressed sidecars under {directory}")
@@ -0,0 +1,518 @@
+"""Content-addressed storage for gallery uploads.
+
+Uploads are streamed once into a scratch file while their SHA-256 is
+computed, derivatives are rendered next to it, and the files are then
+handed to a storage backend under a sharded layout such as
+``ab/cd/<sha256>.jpg``. The ``photo_blobs`` collection keeps one document
+per distinct blob with a reference count, so re-uploading the same bytes
+adds a reference instead of another stored copy. Releasing the last
+reference marks the document ``deleting_at`` before the files go, and
+uploads of the same bytes wait for that tombstone to disappear. The blob
+is keyed by the hash of the uploaded bytes, but what is stored is the
+metadata-free original written by the renderer, never the upload itself,
+and its file name is the hash of those stored bytes (the same as the
+blob's when nothing had to be stripped).
+
+``PHOTO_STORAGE`` selects the backend:
+
+* ``local`` (the default) keeps files under ``uploads/photos`` on this
+  container's disk, served by the ``/uploads`` static mount.
+* ``gridfs`` streams files into a MongoDB GridFS bucket in chunks, so every
+  replica sees every upload and redeploys onto fresh disk lose nothing.
+  ``GridFSFiles`` serves them chunk by chunk with ``Range`` support.
+
+Either way photo URLs are ``/uploads/photos/<path>``, so moving between
+backends (``python migrations.py photos_to_gridfs``) only rewrites
+``file_path``.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from mimetypes import guess_type
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from starlette.datastructures import Headers
+from starlette.responses import Response, StreamingResponse
+
+from profiling import phase
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+PHOTO_URL_PREFIX = "/uploads/photos"
+
+PHOTO_STORAGE = os.environ.get('PHOTO_STORAGE', 'local').lower()
+GRIDFS_BUCKET = os.environ.get('GRIDFS_BUCKET', 'photo_files')
+GRIDFS_CHUNK_SIZE = int(os.environ.get('GRIDFS_CHUNK_SIZE', str(255 * 1024)))
+
+# A blob tombstone older than this belongs to a release that died mid-delete
+BLOB_DELETE_TIMEOUT = 300
+BLOB_DELETE_POLL_SECONDS = 0.05
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured size limit"""
+
+
+def blob_relpath(digest: str, ext: str) -> str:
+    """Sharded relative path of a blob, e.g. ab/cd/abcd....jpg"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def sibling_relpath(relpath: str, name: str) -> str:
+    """Path of a derivative stored next to a blob"""
+    return relpath.rsplit("/", 1)[0] + "/" + name if "/" in relpath else name
+
+
+def photo_url(relpath: str) -> str:
+    return f"{PHOTO_URL_PREFIX}/{relpath}"
+
+
+class LocalStorage:
+    """Blobs as files under a sharded directory on local disk"""
+
+    name = "local"
+
+    def __init__(self, root: Path):
+        self.root = root
+        # Staging on the same filesystem makes save() a rename
+        self.scratch_dir = root / ".incoming"
+
+    def bind(self, db):
+        pass
+
+    def stored_path(self, relpath: str) -> str:
+        return str(self.root / relpath)
+
+    async def exists(self, relpath: str) -> bool:
+        return await asyncio.to_thread((self.root / relpath).exists)
+
+    async def save(self, relpath: str, source: Path):
+        """Move a staged file into place"""
+        target = self.root / relpath
+        await asyncio.to_thread(target.parent.mkdir, parents=True, exist_ok=True)
+        await asyncio.to_thread(os.replace, source, target)
+
+    async def fetch(self, relpath: str, dest: Path):
+        """Copy a stored file to a local path"""
+        await asyncio.to_thread(shutil.copyfile, self.root / relpath, dest)
+
+    async def delete(self, relpaths: list):
+        await asyncio.to_thread(lambda: [(self.root / path).unlink(missing_ok=True) for path in relpaths])
+
+
+class GridFSStorage:
+    """Blobs as GridFS files named by their relative path"""
+
+    name = "gridfs"
+
+    def __init__(self, bucket_name: str = GRIDFS_BUCKET, chunk_size: int = GRIDFS_CHUNK_SIZE):
+        self.bucket_name = bucket_name
+        self.chunk_size = chunk_size
+        self.scratch_dir = Path(tempfile.gettempdir()) / "photo-uploads"
+        self.bucket = None
+        self._files = None
+
+    def bind(self, db):
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=self.bucket_name, chunk_size_bytes=self.chunk_size)
+        self._files = db[f"{self.bucket_name}.files"]
+
+    def stored_path(self, relpath: str) -> str:
+        return f"gridfs://{self.bucket_name}/{relpath}"
+
+    async def exists(self, relpath: str) -> bool:
+        return await self._files.find_one({"filename": relpath}, {"_id": 1}) is not None
+
+    async def save(self, relpath: str, source: Path):
+        """Stream a staged file into GridFS chunk by chunk, then remove it
+
+        Like a rename on disk, this replaces whatever was stored under the
+        path: revisions completed before this one are deleted once it is
+        complete. Saves of the same path may run concurrently (duplicate
+        files rendered at once), so a revision completed later is never
+        touched and the path always keeps at least one whole file.
+        """
+        media_type = guess_type(relpath)[0] or "application/octet-stream"
+        grid_in = self.bucket.open_upload_stream(relpath, metadata={"content_type": media_type})
+        reader = await asyncio.to_thread(open, source, "rb")
+        try:
+            while chunk := await asyncio.to_thread(reader.read, self.chunk_size):
+                await grid_in.write(chunk)
+            await grid_in.close()
+        except BaseException:
+            await grid_in.abort()
+            raise
+        finally:
+            await asyncio.to_thread(reader.close)
+        source.unlink(missing_ok=True)
+        older = {"filename": relpath, "uploadDate": {"$lt": grid_in.upload_date}}
+        async for doc in self._files.find(older, {"_id": 1}):
+            await self.bucket.delete(doc["_id"])
+
+    async def delete(self, relpaths: list):
+        """Delete every revision stored under each path"""
+        async for doc in self._files.find({"filename": {"$in": list(relpaths)}}, {"_id": 1}):
+            await self.bucket.delete(doc["_id"])
+
+    async def fetch(self, relpath: str, dest: Path):
+        """Copy the latest revision stored under a path to a local file"""
+        grid_out = await self.open(relpath)
+        if grid_out is None:
+            raise FileNotFoundError(relpath)
+        writer = await asyncio.to_thread(open, dest, "wb")
+        try:
+            while chunk := await grid_out.readchunk():
+                await asyncio.to_thread(writer.write, chunk)
+        finally:
+            await asyncio.to_thread(writer.close)
+
+    async def open(self, relpath: str):
+        """Latest revision stored under a path, or None"""
+        doc = await self._files.find_one({"filename": relpath}, {"_id": 1}, sort=[("uploadDate", -1)])
+        if doc is None:
+            return None
+        return await self.bucket.open_download_stream(doc["_id"])
+
+
+def create_storage(upload_dir: Path):
+    if PHOTO_STORAGE == "gridfs":
+        return GridFSStorage()
+    if PHOTO_STORAGE != "local":
+        raise ValueError(f"Unknown PHOTO_STORAGE {PHOTO_STORAGE!r}")
+    return LocalStorage(upload_dir)
+
+
+def _byte_range(header: str, length: int):
+    """(start, end) inclusive for a single satisfiable range, None to send everything, or False if unsatisfiable"""
+    match = _RANGE.match(header.replace(" ", ""))
+    if match is None:
+        # Multiple or malformed ranges: fall back to the whole file
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(length - int(last), 0), length - 1
+    else:
+        start, end = int(first), min(int(last), length - 1) if last else length - 1
+    if start > end or start >= length:
+        return False
+    return start, end
+
+
+async def _stream(grid_out, start: int, end: int):
+    """Yield bytes start..end (inclusive) one GridFS chunk at a time"""
+    grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = await grid_out.readchunk()
+        if not chunk:
+            break
+        chunk = chunk[:remaining]
+        remaining -= len(chunk)
+        yield chunk
+
+
+class GridFSFiles:
+    """ASGI app serving a GridFS storage at a mount point, with ETags and Range requests"""
+
+    def __init__(self, storage: GridFSStorage, cache_control: str = IMMUTABLE_CACHE_CONTROL):
+        self.storage = storage
+        self.cache_control = cache_control
+
+    def _relpath(self, scope) -> str:
+        path, root_path = scope["path"], scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        return path.lstrip("/")
+
+    async def __call__(self, scope, receive, send):
+        relpath = self._relpath(scope)
+        if scope["method"] not in ("GET", "HEAD"):
+            response = Response("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+        elif not relpath or any(part.startswith(".") for part in relpath.split("/")):
+            response = Response("Not Found", status_code=404)
+        else:
+            response = await self._file_response(relpath, Headers(scope=scope), scope["method"] == "HEAD")
+        await response(scope, receive, send)
+
+    async def _file_response(self, relpath: str, request_headers: Headers, head: bool) -> Response:
+        grid_out = await self.storage.open(relpath)
+        if grid_out is None:
+            return Response("Not Found", status_code=404)
+
+        length = grid_out.length
+        headers = {
+            "etag": f'"{grid_out._id}"',
+            "cache-control": self.cache_control,
+            "accept-ranges": "bytes",
+            "last-modified": grid_out.upload_date.strftime("%a, %d %b %Y %H:%M:%S GMT"),
+        }
+        if headers["etag"] in [tag.strip() for tag in request_headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=headers)
+
+        media_type = (grid_out.metadata or {}).get("content_type") or guess_type(relpath)[0]
+        status_code, start, end = 200, 0, length - 1
+        range_header = request_headers.get("range")
+        if range_header and request_headers.get("if-range", headers["etag"]) == headers["etag"]:
+            byte_range = _byte_range(range_header, length)
+            if byte_range is False:
+                return Response(status_code=416, headers={**headers, "content-range": f"bytes */{length}"})
+            if byte_range is not None:
+                status_code, (start, end) = 206, byte_range
+                headers["content-range"] = f"bytes {start}-{end}/{length}"
+        headers["content-length"] = str(max(end - start + 1, 0))
+
+        if head or length == 0:
+            return Response(status_code=status_code, headers=headers, media_type=media_type)
+        return StreamingResponse(_stream(grid_out, start, end), status_code=status_code,
+                                 headers=headers, media_type=media_type)
+
+
+def _write_chunk(buffer, hasher, chunk: bytes):
+    # hashlib releases the GIL for large buffers, so both run well in a thread
+    hasher.update(chunk)
+    buffer.write(chunk)
+
+
+class ScratchFile:
+    """A scratch file hashed while it is written, refusing to grow past ``max_bytes``"""
+
+    def __init__(self, path: Path, buffer, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._buffer = buffer
+        self._hasher = hashlib.sha256()
+
+    @classmethod
+    async def create(cls, root: Path, max_bytes: int):
+        root.mkdir(parents=True, exist_ok=True)
+        path = root / f"{uuid.uuid4().hex}.part"
+        return cls(path, await asyncio.to_thread(open, path, "wb"), max_bytes)
+
+    async def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLargeError(f"File exceeds {self.max_bytes // (1024 * 1024)}MB limit")
+        await asyncio.to_thread(_write_chunk, self._buffer, self._hasher, chunk)
+
+    async def close(self) -> str:
+        """Finish writing and return the SHA-256 of the content"""
+        await asyncio.to_thread(self._buffer.close)
+        return self._hasher.hexdigest()
+
+    async def discard(self):
+        await asyncio.to_thread(self._buffer.close)
+        self.path.unlink(missing_ok=True)
+
+
+async def stream_to_temp(upload, root: Path, max_bytes: int):
+    """Stream an UploadFile to a temporary file, returning (path, sha256, size)"""
+    scratch = await ScratchFile.create(root, max_bytes)
+    try:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            await scratch.write(chunk)
+    except BaseException:
+        await scratch.discard()
+        raise
+    return scratch.path, await scratch.close(), scratch.size
+
+
+async def store_upload(blobs, storage, upload, ext: str, max_bytes: int, render):
+    """Store an upload under its content hash and take a reference to the blob
+
+    ``render(src_path, dest_dir, stem)`` produces the derivatives and the
+    metadata-free original (named by its ``original`` key) of a blob seen
+    for the first time; if it raises, the reference is released again.
+    Returns the blob document with ``rendered`` filled in.
+    """
+    with phase("file_io"):
+        temp_path, digest, size = await stream_to_temp(upload, storage.scratch_dir, max_bytes)
+    return await store_staged(blobs, storage, temp_path, digest, size, ext, render)
+
+
+async def store_staged(blobs, storage, temp_path: Path, digest: str, size: int, ext: str, render):
+    """Like ``store_upload`` for a file already staged in the scratch directory, which is removed"""
+    work_dir = temp_path.with_suffix("")
+    try:
+        blob = await _reference_blob(blobs, storage, digest, ext, size)
+
+        # Render derivatives off the event loop, once per blob
+        original = None
+        if blob["rendered"] is None:
+            work_dir.mkdir()
+            rendered = await _render(blobs, storage, digest, render, temp_path, work_dir)
+            original = work_dir / rendered.pop("original")
+            with phase("file_io"):
+                for variant in rendered["variants"].values():
+                    await storage.save(sibling_relpath(blob["path"], variant["file"]), work_dir / variant["file"])
+                path = await original_relpath(blob["path"], original)
+            await save_rendered(blobs, digest, rendered, path)
+            blob["rendered"], blob["path"] = rendered, path
+
+        with phase("file_io"):
+            needs_original = blob["refcount"] == 1 or not await storage.exists(blob["path"])
+        if needs_original:
+            if original is None:
+                # Rendered earlier but the original went missing; the upload itself still carries its EXIF.
+                # Nothing can have cached the missing file, so it is restored under its recorded path.
+                work_dir.mkdir(exist_ok=True)
+                original = work_dir / (await _render(blobs, storage, digest, render, temp_path, work_dir))["original"]
+            with phase("file_io"):
+                await storage.save(blob["path"], original)
+        else:
+            logger.info(f"Deduplicated upload {digest} (refcount {blob['refcount']})")
+        return blob
+    finally:
+        temp_path.unlink(missing_ok=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+async def _reference_blob(blobs, storage, digest: str, ext: str, size: int) -> dict:
+    """Take a reference to a blob, creating its document if needed
+
+    A blob being deleted keeps its document as a tombstone until its files
+    are gone, so this waits for that rather than writing files the deletion
+    would then remove.
+    """
+    while True:
+        now = datetime.utcnow()
+        try:
+            return await blobs.find_one_and_update(
+                {"_id": digest, "deleting_at": None},
+                {
+                    "$inc": {"refcount": 1},
+                    "$set": {"last_referenced_at": now},
+                    "$setOnInsert": {
+                        "path": blob_relpath(digest, ext), "size": size, "rendered": None, "created_at": now
+                    },
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            tombstone = await blobs.find_one({"_id": digest})
+            if tombstone is None or tombstone.get("deleting_at") is None:
+                # Deleted meanwhile, or a concurrent upsert of the same bytes won the insert
+                continue
+            if tombstone["deleting_at"] < now - timedelta(seconds=BLOB_DELETE_TIMEOUT):
+                # The release that claimed it died before finishing
+                await _delete_blob(blobs, tombstone, storage)
+            else:
+                await asyncio.sleep(BLOB_DELETE_POLL_SECONDS)
+
+
+async def _render(blobs, storage, digest: str, render, temp_path: Path, work_dir: Path) -> dict:
+    """Render a staged upload, releasing the reference just taken if it is not an image"""
+    try:
+        with phase("render"):
+            return await render(temp_path, work_dir, digest)
+    except Exception:
+        await release_blob(blobs, digest, storage)
+        raise
+
+
+async def save_rendered(blobs, digest: str, rendered: dict, path: str):
+    """Remember the derivatives and stored original of a blob so duplicates skip re-rendering"""
+    await blobs.update_one({"_id": digest}, {"$set": {"rendered": rendered, "path": path}})
+
+
+def _hash_file(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as source:
+        while chunk := source.read(UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+async def original_relpath(blob_path: str, original: Path) -> str:
+    """Path of a stored original next to its blob, named by the hash of the stored bytes
+
+    Originals are served as immutable with their file name as ETag, so a
+    re-encoded original must never take the name of the upload it came from.
+    """
+    digest = await asyncio.to_thread(_hash_file, original)
+    return sibling_relpath(blob_path, digest + Path(blob_path).suffix)
+
+
+async def release_blob(blobs, digest: str, storage):
+    """Drop one reference to a blob and delete its files once nothing uses it"""
+    if not digest:
+        return
+    blob = await blobs.find_one_and_update(
+        {"_id": digest, "deleting_at": None},
+        {"$inc": {"refcount": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if blob is None or blob["refcount"] > 0:
+        return
+
+    # Tombstone the document first; new references wait until the files are gone
+    blob = await blobs.find_one_and_update(
+        {"_id": digest, "refcount": {"$lte": 0}, "deleting_at": None},
+        {"$set": {"deleting_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if blob is not None:
+        await _delete_blob(blobs, blob, storage)
+
+
+async def _delete_blob(blobs, blob: dict, storage):
+    """Delete the files of a tombstoned blob, then its document"""
+    rendered = blob.get("rendered") or {}
+    paths = [blob["path"]] + [
+        sibling_relpath(blob["path"], v["file"]) for v in rendered.get("variants", {}).values()
+    ]
+    await storage.delete(paths)
+    await blobs.delete_one({"_id": blob["_id"], "deleting_at": blob["deleting_at"]})
+    logger.info(f"Removed unreferenced blob {blob['_id']}")
+
+
+async def migrate_photos_to_gridfs(db, upload_dir: Path) -> dict:
+    """Move every local upload into GridFS and point photo documents at it"""
+    storage = GridFSStorage()
+    storage.bind(db)
+    moved = 0
+    for path in sorted(upload_dir.rglob("*")):
+        relpath = path.relative_to(upload_dir).as_posix()
+        if not path.is_file() or any(part.startswith(".") for part in relpath.split("/")):
+            continue
+        if not await storage.exists(relpath):
+            # save() consumes its source, so upload a copy and remove the original afterwards
+            staged = path.with_name(f".{path.name}.migrating")
+            await asyncio.to_thread(shutil.copyfile, path, staged)
+            await storage.save(relpath, staged)
+            moved += 1
+        await asyncio.to_thread(path.unlink)
+    logger.info(f"Moved {moved} files from {upload_dir} into GridFS bucket {storage.bucket_name}")
+
+    rewritten = {}
+    for collection_name in ("school_photos", "photos"):
+        collection, count = db[collection_name], 0
+        async for photo in collection.find({"file_path": {"$not": {"$regex": "^gridfs://"}}}, {"id": 1, "file_url": 1}):
+            url = photo.get("file_url") or ""
+            if not url.startswith(PHOTO_URL_PREFIX + "/"):
+                logger.warning(f"Skipping {collection_name} {photo.get('id')}: unexpected file_url {url!r}")
+                continue
+            relpath = url[len(PHOTO_URL_PREFIX) + 1:]
+            await collection.update_one(
+                {"_id": photo["_id"]},
+                {"$set": {"file_path": storage.stored_path(relpath), "file_url": photo_url(relpath)}}
+            )
+            count += 1
+        rewritten[collection_name] = count
+        logger.info(f"Pointed {count} {collection_name} documents at GridFS")
+    return {"moved": moved, "rewritten": rewritten}
@@ -0,0 +1,18 @@
+import axios from 'axios';
+
+// Largest page the list endpoints serve (MAX_PAGE_SIZE in backend/pagination.py)
+const PAGE_SIZE = 1000;
+
+// Fetch every item of a cursor-paginated list endpoint by following next_cursor
+export async function fetchAllPages(url, key, params = {}) {
+  const items = [];
+  let after = null;
+  do {
+    const response = await axios.get(url, {
+      params: { ...params, limit: PAGE_SIZE, ...(after ? { after } : {}) }
+    });
+    items.push(...(response.data[key] || []));
+    after = response.data.next_cursor || null;
+  } while (after);
+  return items;
+}
@@ -10,6 +10,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '.
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '../components/ui/tabs';
 import { toast } from 'sonner';
 import axios from 'axios';
+import { fetchAllPages } from '../lib/pagination';
 import { schoolInfo } from '../mock';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -53,6 +54,28 @@ const AdminDashboard = () => {
     fetchDashboardData();
   }, [navigate]);
 
+  // Live updates for new submissions and status changes
+  useEffect(() => {
+    const source = new EventSource(`${API}/admin/feed`);
+    const prepend = (setItems) => (event) => {
+      const doc = JSON.parse(event.data);
+      setItems((items) => (items.some((item) => item.id === doc.id) ? items : [doc, ...items]));
+    };
+    const updateStatus = (setItems) => (event) => {
+      const { id, status } = JSON.parse(event.data);
+      setItems((items) => items.map((item) => (item.id === id ? { ...item, status } : item)));
+    };
+
+    source.addEventListener('enquiry.created', prepend(setEnquiries));
+    source.addEventListener('message.created', prepend(setMessages));
+    source.addEventListener('enquiry.status', updateStatus(setEnquiries));
+    source.addEventListener('message.status', updateStatus(setMessages));
+    // Bulk imports and missed events are simplest to handle by reloading
+    source.addEventListener('enquiry.imported', () => fetchDashboardData());
+    source.addEventListener('reset', () => fetchDashboardData());
+    return () => source.close();
+  }, []);
+
   const imageCategories = {
     gallery: [
       { value: 'classroom', label: 'Classrooms' },
@@ -80,14 +103,14 @@ const AdminDashboard = () => {
 
   const fetchDashboardData = async () => {
     try {
-      const [photosRes, enquiriesRes, messagesRes] = await Promise.all([
-        axios.get(`${API}/photos`),
-        axios.get(`${API}/admissions/enquiries`),
-        axios.get(`${API}/contact/messages`)
+      const [allPhotos, allEnquiries, allMessages] = await Promise.all([
+        fetchAllPages(`${API}/photos`, 'photos'),
+        fetchAllPages(`${API}/admissions/enquiries`, 'enquiries'),
+        fetchAllPages(`${API}/contact/messages`, 'messages')
       ]);
-      setPhotos(photosRes.data.photos || []);
-      setEnquiries(enquiriesRes.data.enquiries || []);
-      setMessages(messagesRes.data.messages || []);
+      setPhotos(allPhotos);
+      setEnquiries(allEnquiries);
+      setMessages(allMessages);
     } catch (error) {
       console.error('Error fetching data:', error);
     }
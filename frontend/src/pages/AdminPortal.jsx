@@ -9,6 +9,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '.
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '../components/ui/tabs';
 import { toast } from 'sonner';
 import axios from 'axios';
+import { fetchAllPages } from '../lib/pagination';
 import { schoolInfo } from '../mock';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -43,14 +44,14 @@ const AdminDashboard = () => {
 
   const fetchDashboardData = async () => {
     try {
-      const [photosRes, enquiriesRes, messagesRes] = await Promise.all([
-        axios.get(`${API}/photos`),
-        axios.get(`${API}/admissions/enquiries`),
-        axios.get(`${API}/contact/messages`)
+      const [allPhotos, allEnquiries, allMessages] = await Promise.all([
+        fetchAllPages(`${API}/photos`, 'photos'),
+        fetchAllPages(`${API}/admissions/enquiries`, 'enquiries'),
+        fetchAllPages(`${API}/contact/messages`, 'messages')
       ]);
-      setPhotos(photosRes.data.photos || []);
-      setEnquiries(enquiriesRes.data.enquiries || []);
-      setMessages(messagesRes.data.messages || []);
+      setPhotos(allPhotos);
+      setEnquiries(allEnquiries);
+      setMessages(allMessages);
     } catch (error) {
       console.error('Error fetching data:', error);
     }
@@ -8,9 +8,16 @@ import axios from 'axios';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+const photoSrcSet = (photo) => {
+  const variants = Object.values(photo.variants || {});
+  if (variants.length === 0) return undefined;
+  return variants.map((variant) => `${BACKEND_URL}${variant.url} ${variant.width}w`).join(', ');
+};
+
 const PhotoGallery = () => {
   const [photos, setPhotos] = useState([]);
   const [loading, setLoading] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
   const [selectedCategory, setSelectedCategory] = useState('all');
 
   const categories = [
@@ -27,12 +34,16 @@ const PhotoGallery = () => {
     fetchPhotos();
   }, [selectedCategory]);
 
-  const fetchPhotos = async () => {
+  const fetchPhotos = async (after = null) => {
     try {
       setLoading(true);
-      const url = selectedCategory === 'all' ? `${API}/photos` : `${API}/photos?category=${selectedCategory}`;
-      const response = await axios.get(url);
-      setPhotos(response.data.photos || []);
+      const params = {};
+      if (selectedCategory !== 'all') params.category = selectedCategory;
+      if (after) params.after = after;
+      const response = await axios.get(`${API}/photos`, { params });
+      const page = response.data.photos || [];
+      setPhotos(after ? (prev) => [...prev, ...page] : page);
+      setNextCursor(response.data.next_cursor || null);
     } catch (error) {
       console.error('Error fetching photos:', error);
       toast.error('Failed to load photos');
@@ -65,7 +76,7 @@ const PhotoGallery = () => {
         </div>
 
         {/* Photos Grid */}
-        {loading ? (
+        {loading && photos.length === 0 ? (
           <div className="text-center py-12">
             <p className="text-gray-500">Loading photos...</p>
           </div>
@@ -81,9 +92,14 @@ const PhotoGallery = () => {
                 <CardContent className="p-0">
                   <div className="relative aspect-square">
                     <img
-                      src={`${BACKEND_URL}${photo.file_url}`}
+                      src={`${BACKEND_URL}${photo.variants?.medium?.url || photo.file_url}`}
+                      srcSet={photoSrcSet(photo)}
+                      sizes="(min-width: 1024px) 25vw, (min-width: 768px) 33vw, 100vw"
                       alt={photo.title}
+                      loading="lazy"
+                      decoding="async"
                       className="w-full h-full object-cover"
+                      style={photo.placeholder ? { backgroundImage: `url(${photo.placeholder})`, backgroundSize: 'cover' } : undefined}
                     />
                   </div>
                   <div className="p-4">
@@ -100,6 +116,18 @@ const PhotoGallery = () => {
             ))}
           </div>
         )}
+
+        {nextCursor && (
+          <div className="text-center mt-8">
+            <button
+              onClick={() => fetchPhotos(nextCursor)}
+              disabled={loading}
+              className="px-6 py-2 bg-blue-600 text-white rounded-lg hover:bg-blue-700 disabled:opacity-50"
+            >
+              {loading ? 'Loading...' : 'Load more'}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
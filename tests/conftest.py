@@ -0,0 +1,41 @@
+"""Shared fixtures: backend modules on the path and an in-memory MongoDB.
+
+Run from the repository root with ``python -m pytest`` (dependencies are in
+``tests/requirements.txt``).
+"""
+import os
+import sys
+from pathlib import Path
+
+import mongomock.collection
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+# Read by the backend modules at import time
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test")
+os.environ.setdefault("INDEX_CHECK", "off")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+def _ignore_sort(method):
+    def wrapper(self, *args, sort=None, **kwargs):
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+# PyMongo 4.11 added ``sort`` to bulk updates and mongomock does not accept it yet
+_bulk = mongomock.collection.BulkOperationBuilder
+_bulk.add_update = _ignore_sort(_bulk.add_update)
+_bulk.add_replace = _ignore_sort(_bulk.add_replace)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient()["test"]
@@ -0,0 +1,98 @@
+import pytest
+
+from batch_upload import BatchTooLargeError, BatchUploadError, PhotoBatchReceiver
+from images import sniff_image_type
+from storage import LocalStorage
+
+pytestmark = pytest.mark.anyio
+
+ALLOWED_TYPES = {"image/jpeg": ".jpg", "image/png": ".png"}
+JPEG = b"\xff\xd8\xff\xe0" + b"jpeg data " * 10
+PNG = b"\x89PNG\r\n\x1a\n" + b"png data " * 10
+BOUNDARY = "batchboundary"
+
+
+async def render(src_path, dest_dir, stem):
+    (dest_dir / f"{stem}_original").write_bytes(src_path.read_bytes())
+    return {"original": f"{stem}_original", "width": 1, "height": 1, "variants": {}, "placeholder": ""}
+
+
+class FakeRequest:
+    def __init__(self, body: bytes, chunk_size: int = 7, content_type: str = f"multipart/form-data; boundary={BOUNDARY}"):
+        self.headers = {"content-type": content_type}
+        self.body = body
+        self.chunk_size = chunk_size
+
+    async def stream(self):
+        for start in range(0, len(self.body), self.chunk_size):
+            yield self.body[start:start + self.chunk_size]
+
+
+def multipart(fields: dict, files: list) -> bytes:
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode() + value.encode())
+    for filename, data in files:
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode() + data
+        )
+    return b"\r\n".join(parts) + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+@pytest.fixture
+def receiver(db, tmp_path):
+    local = LocalStorage(tmp_path)
+    local.scratch_dir.mkdir()
+
+    def receiver(max_bytes: int = 1024, max_files: int = 10):
+        return PhotoBatchReceiver(db.photo_blobs, local, ALLOWED_TYPES, max_bytes, render, max_files=max_files)
+
+    return receiver
+
+
+async def test_stores_images_sniffed_from_their_content(db, receiver):
+    body = multipart({"category": "sports"}, [("a.png", JPEG), ("b", PNG)])
+    fields, files = await receiver().receive(FakeRequest(body))
+
+    assert fields == {"category": "sports"}
+    assert [item.error for item in files] == [None, None]
+    assert [item.blob["path"][-4:] for item in files] == [".jpg", ".png"]
+    assert await db.photo_blobs.count_documents({}) == 2
+
+
+async def test_rejects_files_that_are_not_images(receiver):
+    _, files = await receiver().receive(FakeRequest(multipart({}, [("notes.jpg", b"plain text file"), ("a.jpg", JPEG)])))
+    assert files[0].error == "Not a JPG, PNG or WebP image"
+    assert files[0].blob is None
+    assert files[1].error is None
+
+
+async def test_rejects_oversized_files_and_keeps_the_rest(receiver, tmp_path):
+    _, files = await receiver(max_bytes=64).receive(FakeRequest(multipart({}, [("big.jpg", JPEG), ("tiny.png", PNG[:40])])))
+    assert files[0].error.startswith("File exceeds")
+    assert files[1].error is None
+    assert list((tmp_path / ".incoming").iterdir()) == []
+
+
+async def test_files_beyond_the_limit_are_rejected(receiver):
+    _, files = await receiver(max_files=2).receive(FakeRequest(multipart({}, [("a.jpg", JPEG), ("b.png", PNG), ("c.jpg", JPEG)])))
+    assert [item.error for item in files] == [None, None, "A batch holds at most 2 files"]
+
+
+async def test_body_over_the_batch_limit_releases_stored_files(db, receiver):
+    body = multipart({}, [("a.jpg", JPEG), ("b.png", PNG)]) + b"\0" * 1024
+    with pytest.raises(BatchTooLargeError):
+        await receiver(max_bytes=128, max_files=1).receive(FakeRequest(body))
+    assert await db.photo_blobs.count_documents({}) == 0
+
+
+async def test_requires_a_multipart_body(receiver):
+    with pytest.raises(BatchUploadError):
+        await receiver().receive(FakeRequest(b"{}", content_type="application/json"))
+
+def test_sniff_image_type():
+    assert sniff_image_type(b"\xff\xd8\xff\xe0\x00\x10JFIF") == "image/jpeg"
+    assert sniff_image_type(b"\x89PNG\r\n\x1a\n\x00\x00\x00\r") == "image/png"
+    assert sniff_image_type(b"RIFF\x00\x00\x00\x00WEBP") == "image/webp"
+    assert sniff_image_type(b"GIF89a\x00\x00\x00\x00\x00\x00") is None
@@ -0,0 +1,88 @@
+import pytest
+from starlette.requests import Request
+
+import cache
+from cache import ResponseCache, cached_json
+
+pytestmark = pytest.mark.anyio
+
+
+def make_request(path: str = "/api/photos", query: str = "limit=50", etag: str = None) -> Request:
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query.encode(), "headers": headers})
+
+
+@pytest.fixture
+def response_cache(db, monkeypatch):
+    shared = ResponseCache(version_poll=0)
+    shared.bind(db.cache_versions)
+    monkeypatch.setattr(cache, "response_cache", shared)
+    return shared
+
+
+@pytest.fixture
+def builds():
+    calls = []
+
+    async def build():
+        calls.append(1)
+        return {"photos": [{"id": str(len(calls))}]}
+
+    build.calls = calls
+    return build
+
+
+async def test_second_request_is_served_from_the_cache(response_cache, builds):
+    first = await cached_json("photos", make_request(), builds)
+    second = await cached_json("photos", make_request(), builds)
+
+    assert first.headers["x-cache"] == "MISS"
+    assert second.headers["x-cache"] == "HIT"
+    assert second.body == first.body
+    assert len(builds.calls) == 1
+
+
+async def test_matching_etag_is_not_modified_without_building(response_cache, builds):
+    etag = (await cached_json("photos", make_request(), builds)).headers["etag"]
+    response = await cached_json("photos", make_request(etag=etag), builds)
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert len(builds.calls) == 1
+
+
+async def test_etag_differs_per_query(response_cache, builds):
+    first = await cached_json("photos", make_request(query="limit=50"), builds)
+    other = await cached_json("photos", make_request(query="category=sports&limit=50"), builds)
+    assert first.headers["etag"] != other.headers["etag"]
+
+
+async def test_invalidate_changes_the_etag_and_rebuilds(response_cache, builds):
+    before = await cached_json("photos", make_request(), builds)
+    await response_cache.invalidate("photos")
+    after = await cached_json("photos", make_request(etag=before.headers["etag"]), builds)
+
+    assert after.status_code == 200
+    assert after.headers["x-cache"] == "MISS"
+    assert after.headers["etag"] != before.headers["etag"]
+    assert len(builds.calls) == 2
+
+
+async def test_invalidate_leaves_other_namespaces_cached(response_cache, builds):
+    events = await cached_json("events", make_request(path="/api/events"), builds)
+    await response_cache.invalidate("photos")
+    again = await cached_json("events", make_request(path="/api/events", etag=events.headers["etag"]), builds)
+    assert again.status_code == 304
+
+
+async def test_invalidation_reaches_other_workers(db, response_cache, builds):
+    other_worker = ResponseCache(version_poll=0)
+    other_worker.bind(db.cache_versions)
+    version = await other_worker.version("photos")
+    other_worker.store("photos", "/api/photos?limit=50", version, b"stale")
+
+    await response_cache.invalidate("photos")
+
+    current = await other_worker.version("photos")
+    assert current == version + 1
+    assert other_worker.lookup("photos", "/api/photos?limit=50", current) is None
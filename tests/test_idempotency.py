@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from idempotency import IdempotencyStore
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def creates():
+    calls = []
+
+    async def create():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"success": True, "id": str(len(calls))}
+
+    create.calls = calls
+    return create
+
+
+async def test_repeat_replays_the_first_result(creates):
+    store = IdempotencyStore()
+    first = await store.run("enquiry:key:a", creates)
+    second = await store.run("enquiry:key:a", creates)
+
+    assert first == ({"success": True, "id": "1"}, False)
+    assert second == ({"success": True, "id": "1"}, True)
+    assert len(creates.calls) == 1
+
+
+async def test_concurrent_repeats_wait_for_the_first(creates):
+    store = IdempotencyStore()
+    results = await asyncio.gather(*(store.run("enquiry:key:a", creates) for _ in range(5)))
+
+    assert len(creates.calls) == 1
+    assert [replayed for _, replayed in results].count(False) == 1
+
+
+async def test_other_workers_replay_the_stored_result(db, creates):
+    first_worker, other_worker = IdempotencyStore(), IdempotencyStore()
+    first_worker.bind(db.idempotency_keys)
+    other_worker.bind(db.idempotency_keys)
+
+    result, _ = await first_worker.run("enquiry:key:a", creates)
+    assert await other_worker.run("enquiry:key:a", creates) == (result, True)
+    assert len(creates.calls) == 1
+
+
+async def test_failed_request_can_be_retried(db, creates):
+    store = IdempotencyStore()
+    store.bind(db.idempotency_keys)
+
+    async def failing():
+        raise RuntimeError("database unavailable")
+
+    with pytest.raises(RuntimeError):
+        await store.run("enquiry:key:a", failing)
+    assert await store.run("enquiry:key:a", creates) == ({"success": True, "id": "1"}, False)
+
+
+async def test_expired_results_run_again(creates):
+    store = IdempotencyStore(window=0)
+    await store.run("enquiry:key:a", creates)
+    assert (await store.run("enquiry:key:a", creates))[1] is False
+    assert len(creates.calls) == 2
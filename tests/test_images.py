@@ -0,0 +1,49 @@
+from PIL import Image, ImageCms
+
+from images import render_variants
+
+SRGB = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+
+
+def write_jpeg(path, **options):
+    Image.new("RGB", (400, 200), "red").save(path, "JPEG", **options)
+    return path
+
+
+def test_original_is_rotated_and_stripped_of_exif(tmp_path):
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 degrees
+    exif[0x010F] = "Camera maker"
+    exif.get_ifd(0x8825)[2] = (12.0, 30.0, 0.0)  # GPS latitude
+    src = write_jpeg(tmp_path / "upload", exif=exif, icc_profile=SRGB)
+
+    rendered = render_variants(str(src), str(tmp_path), "blob")
+
+    with Image.open(tmp_path / rendered["original"]) as original:
+        assert original.format == "JPEG"
+        assert original.size == (200, 400)
+        assert not original.getexif()
+        assert original.info["icc_profile"] == SRGB
+    assert (rendered["width"], rendered["height"]) == (200, 400)
+
+
+def test_original_without_metadata_is_stored_as_uploaded(tmp_path):
+    src = write_jpeg(tmp_path / "upload", icc_profile=SRGB)
+    rendered = render_variants(str(src), str(tmp_path), "blob")
+    assert (tmp_path / rendered["original"]).read_bytes() == src.read_bytes()
+
+
+def test_variants_are_webp_without_metadata(tmp_path):
+    exif = Image.Exif()
+    exif[0x010F] = "Camera maker"
+    src = write_jpeg(tmp_path / "upload", exif=exif)
+
+    rendered = render_variants(str(src), str(tmp_path), "blob")
+
+    assert set(rendered["variants"]) == {"thumb", "medium", "large"}
+    with Image.open(tmp_path / rendered["variants"]["thumb"]["file"]) as thumb:
+        assert thumb.format == "WEBP"
+        assert max(thumb.size) == 320
+        assert not thumb.getexif()
+    assert rendered["placeholder"].startswith("data:image/webp;base64,")
+
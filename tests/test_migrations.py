@@ -0,0 +1,57 @@
+import hashlib
+
+import pytest
+from PIL import Image
+
+import migrations
+from storage import blob_relpath, photo_url
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(migrations, "UPLOAD_DIR", tmp_path)
+    return tmp_path
+
+
+async def add_blob(db, upload_dir, name: str, **save_options) -> dict:
+    """A blob stored the way uploads were before originals were stripped"""
+    upload = upload_dir / "upload.jpg"
+    Image.new("RGB", (20, 10)).save(upload, "JPEG", **save_options)
+    digest = hashlib.sha256(upload.read_bytes()).hexdigest()
+    path = blob_relpath(digest, ".jpg")
+    (upload_dir / path).parent.mkdir(parents=True, exist_ok=True)
+    upload.rename(upload_dir / path)
+    await db.photo_blobs.insert_one({"_id": digest, "path": path, "refcount": 1, "deleting_at": None})
+    await db.school_photos.insert_one({
+        "id": name, "content_hash": digest, "file_path": str(upload_dir / path), "file_url": photo_url(path),
+    })
+    return {"_id": digest, "path": path}
+
+
+async def test_strip_photo_metadata_moves_originals_to_a_new_url(db, upload_dir):
+    exif = Image.Exif()
+    exif[0x010F] = "Camera maker"
+    blob = await add_blob(db, upload_dir, "with-exif", exif=exif)
+
+    assert await migrations.strip_photo_metadata(db) == 1
+
+    stored = await db.photo_blobs.find_one({"_id": blob["_id"]})
+    photo = await db.school_photos.find_one({"id": "with-exif"})
+    data = (upload_dir / stored["path"]).read_bytes()
+    assert stored["path"] != blob["path"]
+    assert stored["path"].endswith(hashlib.sha256(data).hexdigest() + ".jpg")
+    assert photo["file_url"] == photo_url(stored["path"])
+    assert not (upload_dir / blob["path"]).exists()
+    with Image.open(upload_dir / stored["path"]) as original:
+        assert not original.getexif()
+    assert (await db.cache_versions.find_one({"_id": "photos"}))["version"] == 1
+
+
+async def test_strip_photo_metadata_leaves_clean_originals(db, upload_dir):
+    blob = await add_blob(db, upload_dir, "clean")
+
+    assert await migrations.strip_photo_metadata(db) == 0
+    assert (await db.photo_blobs.find_one({"_id": blob["_id"]}))["path"] == blob["path"]
+    assert (upload_dir / blob["path"]).exists()
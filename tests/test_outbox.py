@@ -0,0 +1,138 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import outbox
+
+pytestmark = pytest.mark.anyio
+
+
+async def wait_for(condition, timeout: float = 5):
+    async def poll():
+        while not await condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+@pytest.fixture
+async def start(db, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_BACKOFF_SECONDS", 0)
+
+    async def start(deliver):
+        await outbox.start_outbox(db.email_outbox, deliver, workers=1)
+
+    yield start
+    await outbox.stop_outbox()
+
+
+async def test_delivers_queued_email(db, start):
+    sent = []
+
+    async def deliver(to, subject, text, html):
+        sent.append((to, subject, text, html))
+        return True
+
+    await start(deliver)
+    job_id = await outbox.enqueue_email("parent@example.com", "Hello", "Body", "<p>Body</p>", kind="ack")
+
+    async def delivered():
+        return (await db.email_outbox.find_one({"id": job_id}))["status"] == outbox.STATUS_SENT
+    await wait_for(delivered)
+
+    job = await db.email_outbox.find_one({"id": job_id})
+    assert sent == [("parent@example.com", "Hello", "Body", "<p>Body</p>")]
+    assert job["attempts"] == 1
+    assert "locked_until" not in job
+
+
+async def test_retries_until_delivered(db, start):
+    attempts = []
+
+    async def deliver(to, subject, text, html):
+        attempts.append(to)
+        if len(attempts) < 3:
+            raise ConnectionError("provider unavailable")
+        return True
+
+    await start(deliver)
+    job_id = await outbox.enqueue_email("parent@example.com", "Hello", "Body")
+
+    async def delivered():
+        return (await db.email_outbox.find_one({"id": job_id}))["status"] == outbox.STATUS_SENT
+    await wait_for(delivered)
+
+    job = await db.email_outbox.find_one({"id": job_id})
+    assert job["attempts"] == 3
+    assert job["last_error"] is None
+
+
+async def test_dead_letters_after_max_attempts_and_retries_dead(db, start, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+    failing = True
+
+    async def deliver(to, subject, text, html):
+        return not failing
+
+    await start(deliver)
+    job_id = await outbox.enqueue_email("parent@example.com", "Hello", "Body")
+
+    async def dead():
+        return (await db.email_outbox.find_one({"id": job_id}))["status"] == outbox.STATUS_DEAD
+    await wait_for(dead)
+
+    stats = await outbox.outbox_stats()
+    assert stats["counts"][outbox.STATUS_DEAD] == 1
+    assert stats["dead"][0]["attempts"] == 2
+    assert stats["dead"][0]["last_error"] == "Email provider reported a failed delivery"
+
+    failing = False
+    assert await outbox.retry_dead() == 1
+
+    async def delivered():
+        return (await db.email_outbox.find_one({"id": job_id}))["status"] == outbox.STATUS_SENT
+    await wait_for(delivered)
+
+
+async def test_reclaims_expired_lease(db, start):
+    sent = []
+
+    async def deliver(to, subject, text, html):
+        sent.append(to)
+        return True
+
+    # Left leased by a worker that died mid-delivery
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    await db.email_outbox.insert_one({
+        "id": "stale", "kind": "generic", "to": "parent@example.com", "subject": "Hello", "text": "Body",
+        "html": None, "status": outbox.STATUS_SENDING, "attempts": 1, "last_error": None,
+        "created_at": expired, "updated_at": expired, "next_attempt_at": expired, "locked_until": expired,
+    })
+    await start(deliver)
+
+    async def delivered():
+        return (await db.email_outbox.find_one({"id": "stale"}))["status"] == outbox.STATUS_SENT
+    await wait_for(delivered)
+
+    assert sent == ["parent@example.com"]
+    assert (await db.email_outbox.find_one({"id": "stale"}))["attempts"] == 2
+
+
+async def test_skipped_delivery_is_not_retried(db, start):
+    attempts = []
+
+    async def deliver(to, subject, text, html):
+        attempts.append(to)
+        return outbox.DELIVERY_SKIPPED
+
+    await start(deliver)
+    job_id = await outbox.enqueue_email("parent@example.com", "Hello", "Body")
+
+    async def skipped():
+        return (await db.email_outbox.find_one({"id": job_id}))["status"] == outbox.STATUS_SKIPPED
+    await wait_for(skipped)
+
+    stats = await outbox.outbox_stats()
+    assert attempts == ["parent@example.com"]
+    assert stats["counts"][outbox.STATUS_SKIPPED] == 1
+    assert stats["dead"] == []
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor, fetch_page
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2024, 1, 1, 9, 0)
+
+
+async def seed(collection) -> list:
+    """Ids in created_at order; older rows carry ISO string timestamps, one pair ties"""
+    docs = []
+    for i in range(4):
+        docs.append({"id": f"legacy-{i}", "created_at": (START + timedelta(days=i)).isoformat()})
+    for i in range(5):
+        docs.append({"id": f"current-{i}", "created_at": START + timedelta(days=10 + i)})
+    docs.append({"id": "current-4b", "created_at": START + timedelta(days=14)})
+    await collection.insert_many([dict(doc) for doc in docs])
+    return [doc["id"] for doc in docs]
+
+
+async def collect(collection, direction: int, limit: int, sort_field: str = "created_at") -> list:
+    ids, after = [], None
+    while True:
+        docs, after = await fetch_page(collection, {}, sort_field, direction, limit, after)
+        ids += [doc["id"] for doc in docs]
+        if after is None:
+            return ids
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 100])
+async def test_newest_first_crosses_from_dates_to_strings(db, limit):
+    ids = await seed(db.messages)
+    assert await collect(db.messages, -1, limit) == sorted(ids[4:], reverse=True) + ids[3::-1]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 100])
+async def test_oldest_first_crosses_from_strings_to_dates(db, limit):
+    ids = await seed(db.messages)
+    assert await collect(db.messages, 1, limit) == ids[:4] + sorted(ids[4:])
+
+
+async def test_last_page_has_no_cursor(db):
+    await seed(db.messages)
+    docs, after = await fetch_page(db.messages, {}, "created_at", -1, 10)
+    assert len(docs) == 10
+    assert after is None
+
+
+@pytest.mark.parametrize("value", [START, START.isoformat(), 3, None])
+def test_cursor_round_trip_keeps_the_sort_value_type(value):
+    assert decode_cursor(encode_cursor({"id": "a", "created_at": value}, "created_at")) == (value, "a")
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "e30"])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+async def seed_with_nulls(collection) -> list:
+    """Ids in starts_at order: unmigrated rows without a start sort first"""
+    docs = [{"id": "null-a", "starts_at": None}, {"id": "null-b"}, {"id": "null-c", "starts_at": None}]
+    docs += [{"id": f"dated-{i}", "starts_at": START + timedelta(days=i)} for i in range(3)]
+    await collection.insert_many([dict(doc) for doc in docs])
+    return [doc["id"] for doc in docs]
+
+
+
+@pytest.mark.parametrize("limit", [1, 2, 4])
+async def test_pages_through_null_sort_values(db, limit):
+    ids = await seed_with_nulls(db.events)
+    assert await collect(db.events, 1, limit, "starts_at") == ids
+    assert await collect(db.events, -1, limit, "starts_at") == ids[::-1]
@@ -0,0 +1,60 @@
+import pytest
+
+import ratelimit
+from ratelimit import MemoryTokenBuckets
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+async def test_burst_then_refill(clock):
+    buckets = MemoryTokenBuckets()
+    for _ in range(3):
+        assert (await buckets.take("ip:1", burst=3, per_second=0.5))[0]
+
+    allowed, retry_after = await buckets.take("ip:1", burst=3, per_second=0.5)
+    assert not allowed
+    assert retry_after == pytest.approx(2)
+
+    clock[0] += 2
+    assert (await buckets.take("ip:1", burst=3, per_second=0.5))[0]
+    assert not (await buckets.take("ip:1", burst=3, per_second=0.5))[0]
+
+
+async def test_refill_is_capped_at_the_burst(clock):
+    buckets = MemoryTokenBuckets()
+    await buckets.take("ip:1", burst=2, per_second=1)
+    clock[0] += 3600
+    results = [(await buckets.take("ip:1", burst=2, per_second=1))[0] for _ in range(3)]
+    assert results == [True, True, False]
+
+
+async def test_keys_have_separate_buckets(clock):
+    buckets = MemoryTokenBuckets()
+    assert (await buckets.take("ip:1", burst=1, per_second=0.1))[0]
+    assert (await buckets.take("ip:2", burst=1, per_second=0.1))[0]
+    assert not (await buckets.take("ip:1", burst=1, per_second=0.1))[0]
+
+
+async def test_least_recent_keys_are_evicted(clock):
+    buckets = MemoryTokenBuckets(max_keys=2)
+    for key in ("a", "b", "c"):
+        await buckets.take(key, burst=1, per_second=0.1)
+    # "a" was forgotten, so it starts again with a full bucket
+    assert (await buckets.take("a", burst=1, per_second=0.1))[0]
+    assert not (await buckets.take("c", burst=1, per_second=0.1))[0]
+
+
+async def test_enforce_rate_limit_raises_429(monkeypatch):
+    monkeypatch.setattr(ratelimit, "_buckets", MemoryTokenBuckets())
+    await ratelimit.enforce_rate_limit("email:a@example.com", burst=1, per_hour=1)
+    with pytest.raises(ratelimit.HTTPException) as raised:
+        await ratelimit.enforce_rate_limit("email:a@example.com", burst=1, per_hour=1)
+    assert raised.value.status_code == 429
+    assert int(raised.value.headers["Retry-After"]) > 0
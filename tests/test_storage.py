@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+import storage
+from storage import LocalStorage, ScratchFile, release_blob, sibling_relpath, store_staged
+
+pytestmark = pytest.mark.anyio
+
+
+async def render(src_path: Path, dest_dir: Path, stem: str) -> dict:
+    (dest_dir / f"{stem}_thumb.webp").write_bytes(b"thumb")
+    (dest_dir / f"{stem}_original").write_bytes(b"stripped " + src_path.read_bytes())
+    return {
+        "original": f"{stem}_original",
+        "width": 1,
+        "height": 1,
+        "variants": {"thumb": {"file": f"{stem}_thumb.webp", "width": 1, "height": 1}},
+        "placeholder": "",
+    }
+
+
+@pytest.fixture
+def local_storage(tmp_path):
+    local = LocalStorage(tmp_path)
+    local.scratch_dir.mkdir()
+    return local
+
+
+async def store(db, local_storage, data: bytes, render=render) -> dict:
+    scratch = await ScratchFile.create(local_storage.scratch_dir, 1024)
+    await scratch.write(data)
+    digest = await scratch.close()
+    return await store_staged(db.photo_blobs, local_storage, scratch.path, digest, scratch.size, ".jpg", render)
+
+
+def stored_files(root: Path) -> list:
+    return sorted(path.relative_to(root).as_posix() for path in root.rglob("*") if path.is_file())
+
+
+async def test_duplicate_uploads_share_one_blob(db, local_storage, tmp_path):
+    first = await store(db, local_storage, b"photo")
+    second = await store(db, local_storage, b"photo")
+
+    assert second["_id"] == first["_id"]
+    assert second["refcount"] == 2
+    assert "original" not in second["rendered"]
+    assert stored_files(tmp_path) == sorted([first["path"], sibling_relpath(first["path"], f"{first['_id']}_thumb.webp")])
+    # The renderer's copy is stored, not the upload, and named by its own hash
+    assert (tmp_path / first["path"]).read_bytes() == b"stripped photo"
+    assert first["path"].endswith(hashlib.sha256(b"stripped photo").hexdigest() + ".jpg")
+    assert (await db.photo_blobs.find_one({"_id": first["_id"]}))["path"] == first["path"]
+
+
+async def test_files_are_deleted_with_the_last_reference(db, local_storage, tmp_path):
+    blob = await store(db, local_storage, b"photo")
+    await store(db, local_storage, b"photo")
+
+    await release_blob(db.photo_blobs, blob["_id"], local_storage)
+    assert (await db.photo_blobs.find_one({"_id": blob["_id"]}))["refcount"] == 1
+    assert len(stored_files(tmp_path)) == 2
+
+    await release_blob(db.photo_blobs, blob["_id"], local_storage)
+    assert await db.photo_blobs.count_documents({}) == 0
+    assert stored_files(tmp_path) == []
+
+
+async def test_failed_render_releases_the_reference(db, local_storage, tmp_path):
+    async def broken(src_path, dest_dir, stem):
+        raise ValueError("not an image")
+
+    with pytest.raises(ValueError):
+        await store(db, local_storage, b"photo", render=broken)
+    assert await db.photo_blobs.count_documents({}) == 0
+    assert stored_files(tmp_path) == []
+
+
+async def test_upload_waits_for_a_deletion_in_progress(db, local_storage, tmp_path, monkeypatch):
+    blob = await store(db, local_storage, b"photo")
+    deleting = asyncio.Event()
+    delete = local_storage.delete
+
+    async def slow_delete(paths):
+        deleting.set()
+        await asyncio.sleep(0.1)
+        await delete(paths)
+
+    monkeypatch.setattr(local_storage, "delete", slow_delete)
+    release = asyncio.create_task(release_blob(db.photo_blobs, blob["_id"], local_storage))
+    await deleting.wait()
+    again = await store(db, local_storage, b"photo")
+    await release
+
+    assert again["refcount"] == 1
+    assert (tmp_path / again["path"]).exists()
+    assert (await db.photo_blobs.find_one({"_id": blob["_id"]}))["deleting_at"] is None
+
+
+async def test_upload_finishes_an_abandoned_deletion(db, local_storage, tmp_path):
+    blob = await store(db, local_storage, b"photo")
+    await db.photo_blobs.update_one(
+        {"_id": blob["_id"]},
+        {"$set": {"refcount": 0, "deleting_at": datetime.utcnow() - timedelta(seconds=storage.BLOB_DELETE_TIMEOUT + 1)}}
+    )
+
+    again = await store(db, local_storage, b"photo")
+    assert again["refcount"] == 1
+    assert (tmp_path / again["path"]).read_bytes() == b"stripped photo"
@@ -0,0 +1,48 @@
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import server
+from storage import LocalStorage
+
+
+async def render(src_path, dest_dir, stem):
+    (dest_dir / f"{stem}_original").write_bytes(src_path.read_bytes())
+    return {"original": f"{stem}_original", "width": 1, "height": 1, "variants": {}, "placeholder": ""}
+
+
+@pytest.fixture
+def client(db, tmp_path, monkeypatch):
+    storage = LocalStorage(tmp_path)
+    storage.scratch_dir.mkdir()
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "photo_storage", storage)
+    monkeypatch.setattr(server, "generate_variants", render)
+    return TestClient(server.app)
+
+
+def png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def upload(client, data: bytes, content_type: str):
+    return client.post(
+        "/api/photos/upload",
+        files={"file": ("photo.jpg", data, content_type)},
+        data={"title": "Sports day", "category": "sports"},
+    )
+
+
+def test_stored_type_comes_from_the_content(client):
+    response = upload(client, png_bytes(), "image/jpeg")
+    assert response.status_code == 200
+    assert response.json()["url"].endswith(".png")
+
+
+def test_rejects_non_images_whatever_their_content_type(client):
+    response = upload(client, b"<html>not an image</html>", "image/png")
+    assert response.status_code == 400